@@ -0,0 +1,122 @@
+# Compare thread-per-CPC and asyncio acquisition on fake streaming ports
+#   python benchmarks/bench_acquisition.py --ports 3 10 25 50 --duration 10
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from cpcfnc import CPCAsync, CPCSerial, CPCSimulator
+from cpcfnc.CPCSerial import open_serial
+from fakeserial import FakeSerial, make_configs
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run_mode(mode, num_ports, duration, source="fake"):
+    configs = make_configs(num_ports)
+    queues = [queue.Queue() for _ in range(num_ports)]
+    stop_event = threading.Event()
+
+    # Fake in-process ports or pty simulated CPCs opened through pyserial
+    simulator = None
+    serial_factory = FakeSerial
+    if source == "pty":
+        for config in configs:
+            config["start_commands"] = ["log,1"]
+        simulator = CPCSimulator.CPCSimulator(configs)
+        for config, port in zip(configs, simulator.ports):
+            config["serial_port"] = port
+        simulator.start()
+        serial_factory = open_serial
+
+    if mode == "async":
+        workers = [
+            CPCAsync.CPCAsync(configs, queues, stop_event, serial_factory=serial_factory)
+        ]
+    else:
+        workers = [
+            CPCSerial.CPCSerial(c, q, stop_event, None, serial_factory=serial_factory)
+            for c, q in zip(configs, queues)
+        ]
+
+    cpu_start = time.process_time()
+    wall_start = time.monotonic()
+    for worker in workers:
+        worker.start()
+    time.sleep(0.2)
+    threads = threading.active_count()
+
+    # Drain the queues like App.check_queue and measure put latency
+    latencies = []
+    records = 0
+    empty = 0
+    try:
+        while time.monotonic() - wall_start < duration:
+            for data_queue in queues:
+                while True:
+                    try:
+                        data_point = data_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    # Read timeouts produce records without instrument data
+                    if not data_point["instrument_datetime"]:
+                        empty += 1
+                        continue
+                    if source == "fake":
+                        sent = float(data_point["instrument_datetime"])
+                        latencies.append(data_point["datetime"].timestamp() - sent)
+                    records += 1
+            time.sleep(0.05)
+    finally:
+        stop_event.set()
+    for worker in workers:
+        worker.thread.join(timeout=5)
+    if simulator is not None:
+        simulator.stop()
+    wall = time.monotonic() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    return {
+        "mode": mode,
+        "ports": num_ports,
+        "threads": threads,
+        "records_per_s": records / wall,
+        "empty": empty,
+        "cpu_pct": 100 * cpu / wall,
+        "p50_ms": 1000 * percentile(latencies, 50),
+        "p99_ms": 1000 * percentile(latencies, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ports", type=int, nargs="+", default=[3, 10, 25, 50])
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--source", choices=["fake", "pty"], default="fake")
+    args = parser.parse_args()
+
+    print(
+        f"{'mode':>6} {'ports':>5} {'threads':>7} {'rec/s':>8} "
+        f"{'empty':>6} {'cpu %':>6} {'p50 ms':>8} {'p99 ms':>8}"
+    )
+    for num_ports in args.ports:
+        for mode in ["thread", "async"]:
+            r = run_mode(mode, num_ports, args.duration, args.source)
+            print(
+                f"{r['mode']:>6} {r['ports']:>5} {r['threads']:>7} "
+                f"{r['records_per_s']:>8.1f} {r['empty']:>6} {r['cpu_pct']:>6.1f} "
+                f"{r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# Per-record cost of the latency metrics. Runs the record path of the thread
+# engine and check_queue in one thread, parse, queue put, drain, row assembly
+# and the writer's bookkeeping, once without metrics and once with the stage
+# timestamps and histogram adds of Metrics, and reports the difference. The
+# CSV formatting itself is left out, it is the same either way.
+#   python benchmarks/bench_metrics.py --ports 3 --ticks 20000
+import argparse
+from datetime import datetime, timedelta
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from cpcfnc import Metrics, RecordQueue, RowAssembler
+from cpcfnc.RecordSchema import RecordSchema
+from fakeserial import make_configs
+
+
+def run(configs, ticks, records, metrics):
+    schemas = [RecordSchema(config) for config in configs]
+    names = [config["cpc_name"] for config in configs]
+    queues = [RecordQueue.RecordQueue() for _ in configs]
+    assembler = RowAssembler.RowAssembler(
+        [config["cpc_header"] for config in configs],
+        lateness=0,
+        track=metrics is not None,
+    )
+    stages = [metrics.stages(name) for name in names] if metrics else None
+    values = ["0"] + [f"{random.uniform(0, 1e4):.2f}" for _ in range(19)]
+    now = datetime(2024, 1, 1)
+
+    start = time.perf_counter()
+    for tick in range(ticks):
+        stamp = now + timedelta(seconds=tick)
+        for index, schema in enumerate(schemas):
+            # CPCSerial.record_serial_data
+            read_time = time.perf_counter() if metrics else None
+            for _ in range(records):
+                record = schema.parse(values, stamp, read_time=read_time)
+                if metrics is None:
+                    queues[index].put(record)
+                    continue
+                put_time = record.put_time = time.perf_counter()
+                queues[index].put(record)
+                stages[index]["parse"].add(put_time - read_time)
+                stages[index]["put"].add(time.perf_counter() - put_time)
+
+        # Pipeline.check_queue and CSVWriter.run
+        rows = []
+        for index, data_queue in enumerate(queues):
+            data_points = data_queue.drain()
+            if metrics is not None:
+                metrics.drained(names[index], data_points)
+            rows.extend(assembler.add(index, data_points))
+        rows.extend(assembler.emit(stamp.timestamp() + 1))
+        emitted = assembler.emitted_records()
+        if emitted and metrics is not None:
+            metrics.written(emitted)
+    return (time.perf_counter() - start) / (ticks * records * len(configs))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ports", type=int, default=3)
+    parser.add_argument("--ticks", type=int, default=20000)
+    parser.add_argument("--records", type=int, default=1, help="per CPC per tick")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    configs = make_configs(args.ports)
+    names = [config["cpc_name"] for config in configs]
+    print(
+        f"{args.ports} CPCs, {args.ticks} ticks, {args.records} records per CPC "
+        f"per tick, best of {args.repeat}"
+    )
+    best = {}
+    for mode in ("off", "on"):
+        times = []
+        for _ in range(args.repeat):
+            metrics = Metrics.Metrics(names) if mode == "on" else None
+            times.append(run(configs, args.ticks, args.records, metrics))
+        best[mode] = min(times)
+        print(f"metrics {mode:>3}: {1e6 * best[mode]:6.2f} us per record")
+    print(f"overhead  : {1e6 * (best['on'] - best['off']):6.2f} us per record")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# Main thread time of the System Overview with N CPCs of 22 fields on a real
+# Tk root: the old update, which walked the widget tree, parsed every
+# label's text and reconfigured every label for every record, against the
+# field -> label map that only pushes changed values. Each update shows one
+# record per CPC in which concentration and a few fields changed, and
+# includes the redraw Tk does when idle. Needs a display (or Xvfb).
+#   python benchmarks/bench_overview.py --ports 3 10 15 --updates 200
+import argparse
+import os
+import random
+import sys
+import time
+import tkinter as tk
+from tkinter import ttk
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from cpcfnc.Histogram import Histogram
+from fakeserial import make_configs
+
+
+def build(root, configs):
+    # Same layout as App.init_cpc_frames, returns the label map
+    tab = ttk.Frame(root)
+    tab.pack(expand=1, fill="both")
+    label_maps = []
+    for i, config in enumerate(configs):
+        frame = ttk.LabelFrame(tab, text=config["cpc_name"], padding=10)
+        frame.grid(row=i // 3, column=i % 3, sticky="ew", padx=10, pady=10)
+        labels = {}
+        for key in config["cpc_header"]:
+            if key != "datetime":
+                labels[key] = ttk.Label(frame, text=f"{key}: N/A")
+                labels[key].grid()
+        label_maps.append(labels)
+    return tab, label_maps
+
+
+def old_update(tab, index, data):
+    frame = tab.winfo_children()[index]
+    for label in frame.winfo_children():
+        key = label.cget("text").split(":")[0]
+        if key in data:
+            label.config(text=f"{key}: {data[key]}")
+
+
+def new_update(labels, shown, data):
+    for key, label in labels.items():
+        text = f"{key}: {data[key]}"
+        if text != shown[key]:
+            shown[key] = text
+            label.config(text=text)
+
+
+def records(configs, updates, changing):
+    # One record per CPC per update, changing fields get a new value each time
+    header = configs[0]["cpc_header"]
+    fixed = {key: f"{random.uniform(0, 100):.2f}" for key in header}
+    for update in range(updates):
+        batch = []
+        for config in configs:
+            record = dict(fixed, **{"cpc name": config["cpc_name"]})
+            record["datetime"] = update
+            for key in ["concentration"] + header[4 : 3 + changing]:
+                record[key] = f"{random.uniform(0, 1e4):.2f}"
+            batch.append(record)
+        yield batch
+
+
+def run(root, configs, updates, changing, label_map):
+    tab, label_maps = build(root, configs)
+    shown = [{key: label.cget("text") for key, label in m.items()} for m in label_maps]
+    root.update()
+    update_time = Histogram()
+    for batch in records(configs, updates, changing):
+        start = time.perf_counter()
+        for index, data in enumerate(batch):
+            if label_map:
+                new_update(label_maps[index], shown[index], data)
+            else:
+                old_update(tab, index, data)
+        root.update_idletasks()
+        update_time.add(time.perf_counter() - start)
+    tab.destroy()
+    return update_time.snapshot()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ports", type=int, nargs="+", default=[3, 10, 15])
+    parser.add_argument("--updates", type=int, default=200)
+    parser.add_argument("--changing", type=int, default=4, help="fields per record")
+    args = parser.parse_args()
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        sys.exit(f"Tk needs a display: {e}")
+
+    print(f"{args.updates} updates, {args.changing} changing fields per record")
+    print(f"{'ports':>6} {'mode':>10} {'mean ms':>8} {'p99 ms':>8}")
+    for ports in args.ports:
+        configs = make_configs(ports)
+        for label_map in (False, True):
+            stats = run(root, configs, args.updates, args.changing, label_map)
+            mode = "label map" if label_map else "walk"
+            print(
+                f"{ports:>6} {mode:>10} {1000 * stats['mean']:>8.2f} "
+                f"{1000 * stats['p99']:>8.2f}"
+            )
+    root.destroy()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# Frame render time of the live plot with many CPCs on screen, the old
+# clear-and-rebuild update against LivePlot's in place artists and blitting,
+# and blitting min/max buckets of window / points seconds for long ranges.
+# Runs on the Agg canvas, a Tk canvas adds the copy to the screen.
+#   python benchmarks/bench_plot.py --ports 3 10 15 --frames 120
+#   python benchmarks/bench_plot.py --ports 3 --window 604800 --frames 10
+import argparse
+from datetime import datetime, timedelta
+import os
+import random
+import sys
+import time
+
+import matplotlib
+
+matplotlib.use("Agg")
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import matplotlib.dates as mdates
+from matplotlib.figure import Figure
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from cpcfnc import LivePlot, PlotBuffer
+from cpcfnc.Histogram import Histogram
+
+
+def fill(buffers, now, window):
+    start = mdates.date2num(now - timedelta(seconds=window))
+    for buffer in buffers.values():
+        for second in range(window):
+            add(buffer, start + second / 86400, random.lognormvariate(8, 0.5))
+
+
+def add(buffer, time, value):
+    if isinstance(buffer, PlotBuffer.MinMaxBuffer):
+        buffer.add(time, value)
+    else:
+        buffer.append(time, value)
+
+
+def rebuild(ax, buffers, now, window):
+    # What update_plot did before: clear and redraw everything every second
+    window_start = now - timedelta(seconds=window)
+    ax.clear()
+    ax.set_xlabel("Time")
+    ax.set_ylabel("Particle Count, particles/cm³")
+    max_val = []
+    for name, buffer in buffers.items():
+        times, values = buffer.window(mdates.date2num(window_start))
+        ax.scatter(times, values, label=name, s=10)
+        max_val.append(values.max())
+    ax.set_xlim([window_start, now])
+    ax.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M:%S"))
+    ax.set_yscale("log")
+    ax.set_ylim([1, max(max_val) * 1.1])
+    for label in ax.get_xticklabels():
+        label.set_rotation(45)
+        label.set_horizontalalignment("right")
+    ax.legend(loc="upper center", bbox_to_anchor=(0.5, 1.1), ncol=3, fancybox=True)
+
+
+def run(ports, frames, window, mode, points):
+    figure = Figure(figsize=(7, 7), dpi=100)
+    canvas = FigureCanvasAgg(figure)
+    names = [f"CPC{i + 1}" for i in range(ports)]
+    if mode == "minmax":
+        width = window / points / 86400
+        buffers = {
+            name: PlotBuffer.MinMaxBuffer(width, int(points * 1.1) + 10)
+            for name in names
+        }
+    else:
+        buffers = {
+            name: PlotBuffer.PlotBuffer(int(window * 1.1) + 10) for name in names
+        }
+    now = datetime(2024, 1, 1, 12)
+    fill(buffers, now, window)
+    if mode == "rebuild":
+        ax = figure.add_subplot(1, 1, 1)
+    else:
+        ranges = mode == "minmax"
+        plot = LivePlot.LivePlot(figure, canvas, names, window, ranges=ranges)
+
+    render_time = Histogram()
+    for _ in range(frames):
+        now += timedelta(seconds=1)
+        for buffer in buffers.values():
+            add(buffer, mdates.date2num(now), random.lognormvariate(8, 0.5))
+        start = time.perf_counter()
+        if mode == "rebuild":
+            rebuild(ax, buffers, now, window)
+            canvas.draw()
+        else:
+            plot_start = mdates.date2num(now - timedelta(seconds=window))
+            series = {name: b.window(plot_start) for name, b in buffers.items()}
+            plot.update(now, series)
+        render_time.add(time.perf_counter() - start)
+    return render_time.snapshot(), frames if mode == "rebuild" else plot.full_draws
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ports", type=int, nargs="+", default=[3, 10, 15])
+    parser.add_argument("--frames", type=int, default=120)
+    parser.add_argument("--window", type=int, default=600, help="seconds")
+    parser.add_argument("--points", type=int, default=1000, help="min/max buckets")
+    parser.add_argument("--modes", nargs="+", default=["rebuild", "blit", "minmax"])
+    args = parser.parse_args()
+
+    print(f"{args.frames} frames, {args.window} s window at 1 point/s per CPC")
+    print(f"{'ports':>6} {'mode':>12} {'mean ms':>8} {'p99 ms':>8} {'full draws':>11}")
+    for ports in args.ports:
+        for mode in args.modes:
+            stats, full_draws = run(ports, args.frames, args.window, mode, args.points)
+            print(
+                f"{ports:>6} {mode:>12} {1000 * stats['mean']:>8.1f} "
+                f"{1000 * stats['p99']:>8.1f} {full_draws:>11}"
+            )
+
+
+if __name__ == "__main__":
+    main()
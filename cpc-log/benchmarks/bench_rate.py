@@ -0,0 +1,175 @@
+# Sustained high rate sampling: N streaming CPCs at --rate Hz each, drained
+# and written to CSV in batches once per update interval like App.check_queue
+#   python benchmarks/bench_rate.py --ports 3 10 30 --rate 10 --duration 20
+import argparse
+import csv
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from cpcfnc import (
+    CPCAsync,
+    CPCSerial,
+    CPCShard,
+    RecordQueue,
+    RowAssembler,
+    SampleClock,
+)
+from cpcfnc.Histogram import Histogram
+from fakeserial import FakeSerial, make_configs
+
+
+class RateSerial(FakeSerial):
+    # Module level so sharded worker processes can create it
+    period = 1.0
+
+    def __init__(self, config, timeout=None):
+        super().__init__(config, timeout, period=RateSerial.period)
+
+
+def run_mode(mode, num_ports, rate, duration, update_interval, plot_max_rate):
+    configs = make_configs(num_ports)
+    for config in configs:
+        config["sample_rate"] = rate
+    # Rows binned at the sample period like App.check_queue with row_bin_width
+    assembler = RowAssembler.RowAssembler(
+        [config["cpc_header"] for config in configs], bin_width=1 / rate
+    )
+    queues = [
+        RecordQueue.RecordQueue(600, "drop_oldest") for _ in range(num_ports)
+    ]
+    stop_event = threading.Event()
+    clock = SampleClock.SampleClock(update_interval)
+
+    if mode == "sharded":
+        engines = [
+            CPCShard.CPCShard(configs, queues, stop_event, serial_factory=RateSerial)
+        ]
+    elif mode == "async":
+        engines = [
+            CPCAsync.CPCAsync(
+                configs, queues, stop_event, serial_factory=RateSerial, clock=clock
+            )
+        ]
+    else:
+        engines = [
+            CPCSerial.CPCSerial(
+                c, q, stop_event, None, serial_factory=RateSerial, clock=clock
+            )
+            for c, q in zip(configs, queues)
+        ]
+    for engine in engines:
+        engine.start()
+
+    # Let the ports connect and drop the startup backlog
+    time.sleep(1)
+    for data_queue in queues:
+        data_queue.drain()
+
+    check_time = Histogram()
+    records = 0
+    rows = 0
+    plotted = 0
+    plot_bins = [None] * num_ports
+    with tempfile.TemporaryFile("w+", newline="") as data_file:
+        start = time.monotonic()
+        try:
+            while time.monotonic() - start < duration:
+                time.sleep(clock.next_delay("writer", phase=update_interval / 2))
+                clock.arrive("writer")
+                check_start = time.perf_counter()
+                batches = [data_queue.drain() for data_queue in queues]
+                new_rows = []
+                for i, points in enumerate(batches):
+                    records += len(points)
+                    new_rows.extend(assembler.add(i, points))
+                    # Display decimation, one point per plot bin
+                    for point in points:
+                        plot_bin = math.floor(
+                            point["datetime"].timestamp() * plot_max_rate
+                        )
+                        if plot_bin != plot_bins[i]:
+                            plot_bins[i] = plot_bin
+                            plotted += 1
+                new_rows.extend(assembler.emit(time.time()))
+                csv.writer(data_file).writerows(new_rows)
+                rows += len(new_rows)
+                check_time.add(time.perf_counter() - check_start)
+        finally:
+            stop_event.set()
+        elapsed = time.monotonic() - start
+        file_size = data_file.tell()
+    for engine in engines:
+        engine.thread.join(timeout=10)
+
+    lateness = [
+        stats["lateness"]["p99"]
+        for name, stats in clock.stats().items()
+        if name != "writer"
+    ]
+    return {
+        "mode": mode,
+        "ports": num_ports,
+        "expected_per_s": num_ports * rate,
+        "records_per_s": records / elapsed,
+        "rows_per_s": rows / elapsed,
+        "plot_points_per_s": plotted / elapsed,
+        "dropped": sum(q.stats()["dropped"] for q in queues),
+        "late": assembler.late,
+        "merged": assembler.merged,
+        "max_depth": max(q.stats()["max_depth"] for q in queues),
+        "check_p99_ms": 1000 * check_time.percentile(99),
+        "tick_late_p99_ms": 1000 * max(lateness) if lateness else math.nan,
+        "mb_per_hour": file_size / elapsed * 3600 / 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ports", type=int, nargs="+", default=[3, 10, 30])
+    parser.add_argument("--rate", type=float, default=10, help="records/s per port")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--update-interval", type=float, default=1)
+    parser.add_argument("--plot-max-rate", type=float, default=1)
+    parser.add_argument("--modes", nargs="+", default=["thread", "async"])
+    args = parser.parse_args()
+    RateSerial.period = 1 / args.rate
+
+    print(
+        f"{args.rate} Hz per port, writer every {args.update_interval} s, "
+        f"plot at {args.plot_max_rate} Hz (p99 check time and tick lateness, "
+        "streaming async/sharded ports do not tick)"
+    )
+    print(
+        f"{'mode':>8} {'ports':>5} {'expect':>7} {'rec/s':>8} {'rows/s':>7} "
+        f"{'plot/s':>7} {'dropped':>7} {'late':>5} {'merged':>6} {'depth':>5} "
+        f"{'check ms':>8} "
+        f"{'late ms':>7} {'MB/h':>6}"
+    )
+    for num_ports in args.ports:
+        for mode in args.modes:
+            r = run_mode(
+                mode,
+                num_ports,
+                args.rate,
+                args.duration,
+                args.update_interval,
+                args.plot_max_rate,
+            )
+            print(
+                f"{r['mode']:>8} {r['ports']:>5} {r['expected_per_s']:>7.0f} "
+                f"{r['records_per_s']:>8.1f} {r['rows_per_s']:>7.1f} "
+                f"{r['plot_points_per_s']:>7.1f} {r['dropped']:>7} {r['late']:>5} "
+                f"{r['merged']:>6} "
+                f"{r['max_depth']:>5} {r['check_p99_ms']:>8.1f} "
+                f"{r['tick_late_p99_ms']:>7.1f} {r['mb_per_hour']:>6.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# Write a month of synthetic daily MANY_*.csv files and load them with plain
+# pd.read_csv and with cpcfnc.CSVReader, all columns and concentration only
+#   python benchmarks/bench_reader.py --days 30 --ports 3 --workers 4
+from datetime import datetime, timedelta
+import argparse
+import csv
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from cpcfnc import CSVReader
+from fakeserial import make_configs
+
+
+def write_day(directory, day, configs, period):
+    # One file per day like the CSV writer, the last CPC misses every tenth row
+    folder = os.path.join(directory, day.strftime("%Y-%m-%d"))
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"MANY_{day.strftime('%Y%m%d_%H%M%S')}.csv")
+    with open(path, "w", newline="") as data_file:
+        data_writer = csv.writer(data_file, delimiter=",")
+        data_writer.writerow(sum((config["cpc_header"] for config in configs), []))
+        width = len(configs[0]["cpc_header"])
+        for second in range(0, 86400, period):
+            timestamp = day + timedelta(seconds=second)
+            row = []
+            for index, config in enumerate(configs):
+                if index == len(configs) - 1 and second % (10 * period) == 0:
+                    row.extend(["nan"] * width)
+                    continue
+                row.extend([config["cpc_name"], timestamp, "0"])
+                row.extend(f"{random.uniform(0, 1e4):.2f}" for _ in range(width - 3))
+            data_writer.writerow(row)
+
+
+def memory_mb(frames):
+    return sum(frame.memory_usage(deep=True).sum() for frame in frames) / 1e6
+
+
+def object_columns(frames):
+    return sum((frame.dtypes == object).sum() for frame in frames)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--ports", type=int, default=3)
+    parser.add_argument("--period", type=int, default=1, help="seconds per row")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    configs = make_configs(args.ports)
+    directory = tempfile.mkdtemp(prefix="bench_reader_")
+    start = datetime(2024, 1, 1)
+    end = start + timedelta(days=args.days)
+    for day in range(args.days):
+        write_day(directory, start + timedelta(days=day), configs, args.period)
+    paths = CSVReader.files_between(directory, start, end)
+    size = sum(os.path.getsize(path) for path in paths) / 1e6
+    print(f"{args.days} days, {args.ports} CPCs, {size:.0f} MB of CSV")
+    print(f"{'reader':>26} {'s':>7} {'MB in memory':>13} {'object cols':>12}")
+
+    def report(label, seconds, frames):
+        print(
+            f"{label:>26} {seconds:>7.2f} {memory_mb(frames):>13.0f} "
+            f"{object_columns(frames):>12}"
+        )
+
+    # Whole files, duplicate names become "datetime.1", "concentration.2"...
+    read_start = time.perf_counter()
+    frame = pd.concat([pd.read_csv(path) for path in paths], ignore_index=True)
+    report("pd.read_csv", time.perf_counter() - read_start, [frame])
+    del frame
+
+    read_start = time.perf_counter()
+    frames = CSVReader.read_range(directory, start, end, configs)
+    report("CSVReader", time.perf_counter() - read_start, frames.values())
+    del frames
+
+    if args.workers > 1:
+        read_start = time.perf_counter()
+        frames = CSVReader.read_range(
+            directory, start, end, configs, workers=args.workers
+        )
+        label = f"CSVReader {args.workers} workers"
+        report(label, time.perf_counter() - read_start, frames.values())
+        del frames
+
+    # Concentration of every CPC
+    width = len(configs[0]["cpc_header"])
+    usecols = [i * width + k for i in range(args.ports) for k in (0, 1, 3)]
+    read_start = time.perf_counter()
+    frame = pd.concat(
+        [pd.read_csv(path, usecols=usecols) for path in paths], ignore_index=True
+    )
+    report("pd.read_csv usecols", time.perf_counter() - read_start, [frame])
+    del frame
+
+    read_start = time.perf_counter()
+    frames = CSVReader.read_range(directory, start, end, configs, ["concentration"])
+    report("CSVReader concentration", time.perf_counter() - read_start, frames.values())
+    shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# Cost of the live server on the publishing side with 0 to N local
+# /stream clients. Each tick publishes one batch per CPC like check_queue;
+# half the clients follow one CPC's concentration, half every field of
+# every CPC. Reports the time publish() takes and checks every client got
+# every event it subscribed to.
+#   python benchmarks/bench_server.py --ports 3 --clients 0 1 10 50
+import argparse
+from datetime import datetime, timedelta
+import http.client
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from cpcfnc import LiveServer
+from cpcfnc.Histogram import Histogram
+from cpcfnc.RecordSchema import RecordSchema
+from fakeserial import make_configs
+
+
+def client(address, path, expected, received, ready):
+    connection = http.client.HTTPConnection(*address, timeout=30)
+    connection.request("GET", path)
+    response = connection.getresponse()
+    ready.release()
+    count = 0
+    while count < expected:
+        line = response.readline()
+        if not line:
+            break
+        if line.startswith(b"id: "):
+            count += 1
+    received.append(count)
+    connection.close()
+
+
+def stamps(start, tick, records):
+    return [start + timedelta(seconds=tick + k / records) for k in range(records)]
+
+
+def run(configs, clients, ticks, rate, records):
+    schemas = [RecordSchema(config) for config in configs]
+    live = LiveServer.LiveServer(configs, port=0)
+    live.start()
+
+    # Every client is connected before the first batch
+    received = []
+    ready = threading.Semaphore(0)
+    threads = []
+    for n in range(clients):
+        if n % 2:
+            path = f"/stream?cpc={configs[0]['cpc_name']}&fields=concentration"
+            expected = ticks
+        else:
+            path = "/stream"
+            expected = ticks * len(configs)
+        thread = threading.Thread(
+            target=client, args=(live.address, path, expected, received, ready)
+        )
+        thread.start()
+        threads.append(thread)
+    for _ in range(clients):
+        ready.acquire()
+    while live.clients < clients:
+        time.sleep(0.01)
+
+    values = [f"{random.uniform(0, 1e4):.2f}" for _ in range(19)]
+    now = datetime(2024, 1, 1)
+    publish_time = Histogram()
+    start = time.perf_counter()
+    for tick in range(ticks):
+        for index, schema in enumerate(schemas):
+            batch = [
+                schema.parse(["0"] + values, stamp)
+                for stamp in stamps(now, tick, records)
+            ]
+            put_start = time.perf_counter()
+            live.publish(index, batch)
+            publish_time.add(time.perf_counter() - put_start)
+        time.sleep(max(0.0, start + (tick + 1) / rate - time.perf_counter()))
+
+    for thread in threads:
+        thread.join(30)
+    live.close()
+    expected = sum(ticks * (1 if n % 2 else len(configs)) for n in range(clients))
+    return publish_time.snapshot(), sum(received), expected
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ports", type=int, default=3)
+    parser.add_argument("--clients", type=int, nargs="+", default=[0, 1, 10, 50])
+    parser.add_argument("--ticks", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=20, help="ticks per second")
+    parser.add_argument("--records", type=int, default=1, help="per CPC per tick")
+    args = parser.parse_args()
+
+    configs = make_configs(args.ports)
+    print(
+        f"{args.ports} CPCs, {args.ticks} ticks at {args.rate:g}/s, "
+        f"{args.records} records per batch"
+    )
+    print(f"{'clients':>8} {'mean us':>8} {'p99 us':>8} {'max us':>8} {'events':>14}")
+    for clients in args.clients:
+        stats, received, expected = run(
+            configs, clients, args.ticks, args.rate, args.records
+        )
+        print(
+            f"{clients:>8} {1e6 * stats['mean']:>8.1f} {1e6 * stats['p99']:>8.1f} "
+            f"{1e6 * stats['max']:>8.1f} {f'{received}/{expected}':>14}"
+        )
+
+
+if __name__ == "__main__":
+    main()
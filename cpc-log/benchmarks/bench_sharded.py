@@ -0,0 +1,142 @@
+# Compare threaded and multi-process sharded acquisition while the main
+# process is busy, as it is with plot redraws in run_many
+#   python benchmarks/bench_sharded.py --ports 30 --rate 10 --gui-load 0.05
+import argparse
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from cpcfnc import CPCAsync, CPCSerial, CPCShard
+from fakeserial import FakeSerial, make_configs
+
+
+class RateSerial(FakeSerial):
+    # Module level so worker processes can create it
+    period = 1.0
+
+    def __init__(self, config, timeout=None):
+        super().__init__(config, timeout, period=RateSerial.period)
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def gui_load(stop_event, busy):
+    # Hold the GIL in bursts like a matplotlib redraw on the Tk thread. A
+    # single C call (sorting) is used because a Python loop would hand the GIL
+    # over every switch interval, which an Agg redraw does not do.
+    values = [random.random() for _ in range(100000)]
+    start = time.perf_counter()
+    sorted(values)
+    size = max(1, int(len(values) * busy / (time.perf_counter() - start)))
+    values = [random.random() for _ in range(size)]
+    while not stop_event.is_set():
+        sorted(values)
+        time.sleep(0.1)
+
+
+def run_mode(mode, num_ports, duration, busy, workers):
+    configs = make_configs(num_ports)
+    queues = [queue.Queue() for _ in range(num_ports)]
+    stop_event = threading.Event()
+
+    if mode == "sharded":
+        engines = [
+            CPCShard.CPCShard(
+                configs,
+                queues,
+                stop_event,
+                num_workers=workers,
+                pump_interval=0.02,
+                serial_factory=RateSerial,
+            )
+        ]
+    elif mode == "async":
+        engines = [
+            CPCAsync.CPCAsync(configs, queues, stop_event, serial_factory=RateSerial)
+        ]
+    else:
+        engines = [
+            CPCSerial.CPCSerial(c, q, stop_event, None, serial_factory=RateSerial)
+            for c, q in zip(configs, queues)
+        ]
+        for engine in engines:
+            engine.clock.period = RateSerial.period
+
+    load = threading.Thread(target=gui_load, args=(stop_event, busy), daemon=True)
+    for engine in engines:
+        engine.start()
+    load.start()
+
+    # Discard records queued while the workers started up
+    time.sleep(1)
+    for data_queue in queues:
+        while not data_queue.empty():
+            data_queue.get_nowait()
+
+    # Latency from the line leaving the instrument to being parsed
+    # (acquisition) and to reaching the consumer (delivery)
+    acquired = []
+    latencies = []
+    start = time.monotonic()
+    try:
+        while time.monotonic() - start < duration:
+            for data_queue in queues:
+                while True:
+                    try:
+                        data_point = data_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    try:
+                        sent = float(data_point["instrument_datetime"])
+                    except ValueError:
+                        continue
+                    acquired.append(data_point["datetime"].timestamp() - sent)
+                    latencies.append(time.time() - sent)
+            time.sleep(0.02)
+    finally:
+        stop_event.set()
+    for engine in engines:
+        engine.thread.join(timeout=10)
+
+    return {
+        "mode": mode,
+        "records_per_s": len(latencies) / duration,
+        "p50_ms": 1000 * percentile(latencies, 50),
+        "p99_ms": 1000 * percentile(latencies, 99),
+        "p999_ms": 1000 * percentile(latencies, 99.9),
+        "acquire_p99_ms": 1000 * percentile(acquired, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ports", type=int, default=30)
+    parser.add_argument("--rate", type=float, default=10, help="records/s per port")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--gui-load", type=float, default=0.05, help="GIL held s per burst")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    RateSerial.period = 1 / args.rate
+
+    print(f"{args.ports} ports at {args.rate} Hz, {args.gui_load} s GUI bursts")
+    print(f"{'mode':>8} {'rec/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'p99.9 ms':>9} {'acq p99':>8}")
+    for mode in ["thread", "async", "sharded"]:
+        r = run_mode(mode, args.ports, args.duration, args.gui_load, args.workers)
+        print(
+            f"{r['mode']:>8} {r['records_per_s']:>8.1f} {r['p50_ms']:>8.1f} "
+            f"{r['p99_ms']:>8.1f} {r['p999_ms']:>9.1f} {r['acquire_p99_ms']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
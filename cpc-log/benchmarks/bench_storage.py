@@ -0,0 +1,103 @@
+# Write the same synthetic data as the wide MANY_*.csv file and as per-CPC
+# Parquet files, then time loading one hour of one CPC's concentration
+#   python benchmarks/bench_storage.py --ports 3 --hours 24
+import argparse
+from datetime import datetime, timedelta
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from cpcfnc import CSVWriter, ParquetLogger, RowAssembler
+from cpcfnc.RecordSchema import RecordSchema
+from fakeserial import make_configs
+
+
+def folder_size(directory, suffix):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(directory)
+        for name in names
+        if name.endswith(suffix)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ports", type=int, default=3)
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--cpc", type=int, default=2, help="CPC to read back")
+    args = parser.parse_args()
+
+    configs = make_configs(args.ports)
+    schemas = [RecordSchema(config) for config in configs]
+    headers = [config["cpc_header"] for config in configs]
+    start = datetime(2024, 1, 1)
+    seconds = int(args.hours * 3600)
+    directory = tempfile.mkdtemp(prefix="bench_storage_")
+
+    # One record per CPC per second, as run_many logs them
+    csv_writer = CSVWriter.CSVWriter(sum(headers, []), directory)
+    assembler = RowAssembler.RowAssembler(headers)
+    parquet = ParquetLogger.ParquetLogger(configs, directory, flush_interval=1)
+    csv_writer.start()
+    parquet.start()
+    write_start = time.perf_counter()
+    for block in range(0, seconds, 600):
+        rows = []
+        for index, schema in enumerate(schemas):
+            records = []
+            for second in range(block, min(block + 600, seconds)):
+                values = [f"{random.uniform(0, 1e4):.2f}" for _ in range(19)]
+                timestamp = start + timedelta(seconds=second, microseconds=index)
+                records.append(schema.parse(["0"] + values, timestamp))
+            rows.extend(assembler.add(index, records))
+            parquet.write_records(index, records)
+        csv_writer.write_rows(rows + assembler.emit(float("inf")))
+    csv_writer.close()
+    parquet.close()
+    write_time = time.perf_counter() - write_start
+
+    # Read back one hour from the middle of the data
+    name = configs[args.cpc - 1]["cpc_name"]
+    range_start = start + timedelta(seconds=seconds // 2)
+    range_end = range_start + timedelta(hours=1)
+
+    read_start = time.perf_counter()
+    csv_path = csv_writer.csv_filepath
+    frame = pd.read_csv(csv_path, header=0)
+    offset = sum(len(header) for header in headers[: args.cpc - 1])
+    times = pd.to_datetime(frame.iloc[:, offset + 1])
+    concentration = frame.iloc[:, offset + 3][
+        (times >= range_start) & (times < range_end)
+    ]
+    csv_time = time.perf_counter() - read_start
+
+    read_start = time.perf_counter()
+    table = ParquetLogger.read_range(
+        directory, name, range_start, range_end, ["concentration"]
+    )
+    parquet_time = time.perf_counter() - read_start
+
+    print(f"{args.ports} CPCs, {args.hours} h at 1 Hz")
+    print(f"write both formats: {write_time:.1f} s")
+    print(f"{'format':>8} {'MB':>8} {'read 1 h ms':>12} {'rows':>6}")
+    print(
+        f"{'csv':>8} {folder_size(directory, '.csv') / 1e6:>8.1f} "
+        f"{1000 * csv_time:>12.1f} {len(concentration):>6}"
+    )
+    print(
+        f"{'parquet':>8} {folder_size(directory, '.parquet') / 1e6:>8.1f} "
+        f"{1000 * parquet_time:>12.1f} {table.num_rows:>6}"
+    )
+    shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# Fill the SQLite store with days of 1 Hz data for N CPCs through the store
+# thread, then time range queries at random points
+#   python benchmarks/bench_store.py --ports 3 --days 30
+import argparse
+from datetime import datetime, timedelta
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from cpcfnc import SQLiteStore
+from cpcfnc.Histogram import Histogram
+from cpcfnc.RecordSchema import RecordSchema
+from fakeserial import make_configs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ports", type=int, default=3)
+    parser.add_argument("--days", type=float, default=7)
+    parser.add_argument("--hours", type=float, default=2, help="query range")
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    configs = make_configs(args.ports)
+    schemas = [RecordSchema(config) for config in configs]
+    directory = tempfile.mkdtemp(prefix="bench_store_")
+    path = os.path.join(directory, "cpc_log.sqlite")
+    start = datetime(2024, 1, 1)
+    seconds = int(args.days * 86400)
+
+    # Hand over one hour per CPC at a time, like check_queue batches
+    store = SQLiteStore.SQLiteStore(configs, path, flush_interval=1)
+    store.start()
+    put_time = Histogram()
+    write_start = time.perf_counter()
+    values = [f"{random.uniform(0, 1e4):.2f}" for _ in range(19)]
+    for block in range(0, seconds, 3600):
+        for index, schema in enumerate(schemas):
+            records = [
+                schema.parse(["0"] + values, start + timedelta(seconds=second))
+                for second in range(block, min(block + 3600, seconds))
+            ]
+            put_start = time.perf_counter()
+            store.write_records(index, records)
+            put_time.add(time.perf_counter() - put_start)
+    store.close()
+    write_time = time.perf_counter() - write_start
+    rows = store.stats()["rows"]
+
+    # Random ranges of one column and of every column
+    timings = {"concentration": Histogram(), "all": Histogram()}
+    returned = 0
+    for _ in range(args.queries):
+        offset = random.uniform(0, max(seconds - args.hours * 3600, 0))
+        range_start = start + timedelta(seconds=offset)
+        range_end = range_start + timedelta(hours=args.hours)
+        name = random.choice(configs)["cpc_name"]
+        for label, columns in [("concentration", ["concentration"]), ("all", None)]:
+            query_start = time.perf_counter()
+            _, result = SQLiteStore.query(path, name, range_start, range_end, columns)
+            timings[label].add(time.perf_counter() - query_start)
+            returned += len(result)
+
+    print(f"{args.ports} CPCs x {args.days} days at 1 Hz: {rows} rows")
+    print(
+        f"write {rows / write_time:.0f} rows/s through the store thread, "
+        f"{os.path.getsize(path) / 1e6:.0f} MB, "
+        f"p99 write_records call {1e6 * put_time.percentile(99):.0f} us"
+    )
+    print(f"{args.hours} h range queries, {returned // (2 * args.queries)} rows each")
+    for label, histogram in timings.items():
+        snapshot = histogram.snapshot()
+        print(
+            f"{label:>14}: p50 {1000 * snapshot['p50']:.1f} ms, "
+            f"p99 {1000 * snapshot['p99']:.1f} ms"
+        )
+    shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# In-process stand-in for serial.Serial used by the benchmarks. Each port
+# streams one MAGIC style record per period and embeds the wall clock time
+# the record was "sent" in the instrument_datetime field.
+import random
+import threading
+import time
+
+
+class FakeSerial:
+    def __init__(self, config, timeout=None, period=1.0):
+        self.config = config
+        self.timeout = config["serial_timeout"] if timeout is None else timeout
+        self.period = period
+
+        # Stagger ports so records do not all arrive at the same instant
+        self.next_emit = time.monotonic() + random.random() * period
+        self.buffer = bytearray()
+        self.lock = threading.Lock()
+        self.columns = len(config["cpc_header"]) - 3
+
+    def make_line(self, wall_time):
+        values = [f"{random.uniform(0, 1e4):.2f}" for _ in range(self.columns)]
+        return (f"{wall_time:.6f},{values[0]}," + ",".join(values[1:]) + "\r\n").encode()
+
+    def fill(self):
+        # Append every record that is due by now
+        now = time.monotonic()
+        with self.lock:
+            while self.next_emit <= now:
+                wall_time = time.time() - (now - self.next_emit)
+                self.buffer += self.make_line(wall_time)
+                self.next_emit += self.period
+
+    @property
+    def in_waiting(self):
+        self.fill()
+        return len(self.buffer)
+
+    def read(self, size=1):
+        # Like pyserial, wait up to the timeout when nothing is buffered
+        deadline = time.monotonic() + (self.timeout or 0)
+        self.fill()
+        while not self.buffer and time.monotonic() < deadline:
+            time.sleep(max(min(deadline, self.next_emit) - time.monotonic(), 0.001))
+            self.fill()
+        with self.lock:
+            data = bytes(self.buffer[:size])
+            del self.buffer[:size]
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def readline(self):
+        # Block until a full line is available or the timeout expires
+        deadline = time.monotonic() + (self.timeout or 0)
+        while True:
+            self.fill()
+            with self.lock:
+                end = self.buffer.find(b"\n")
+                if end >= 0:
+                    data = bytes(self.buffer[: end + 1])
+                    del self.buffer[: end + 1]
+                    return data
+            if time.monotonic() >= deadline:
+                return b""
+            time.sleep(max(min(deadline, self.next_emit) - time.monotonic(), 0.001))
+
+    def write(self, data):
+        return len(data)
+
+    def flushInput(self):
+        with self.lock:
+            self.buffer.clear()
+
+    reset_input_buffer = flushInput
+
+    def close(self):
+        pass
+
+
+def make_configs(num_ports, serial_commands=None):
+    # Streaming MAGIC style configs with fake port names
+    header = ["cpc name", "datetime", "instrument_datetime", "concentration"]
+    header += [f"field_{i}" for i in range(18)]
+    configs = []
+    for i in range(num_ports):
+        configs.append(
+            {
+                "cpc_name": f"CPC{i + 1}",
+                "serial_port": f"FAKE{i + 1}",
+                "serial_baud": 115200,
+                "serial_bytesize": 8,
+                "serial_parity": "N",
+                "serial_timeout": 0.5,
+                "start_commands": [],
+                "set_time": False,
+                "default_flow": True,
+                "cpc_flowrate": 0,
+                "serial_commands": serial_commands or [],
+                "cpc_header": header,
+            }
+        )
+    return configs
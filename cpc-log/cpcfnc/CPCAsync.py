@@ -0,0 +1,230 @@
+# Import libraries
+import asyncio
+from collections import deque
+import random
+import threading
+import time
+
+from cpcfnc.CPCPort import CPCPort
+from cpcfnc.CPCSerial import open_serial, startup_messages
+from cpcfnc.PortSupervisor import PortStale
+from cpcfnc.SampleClock import SampleClock
+
+
+class CPCAsync:
+    # One event loop thread that owns every configured CPC port
+    def __init__(
+        self,
+        configs,
+        data_queues,
+        stop_event,
+        poll_interval=0.01,
+        test=False,
+        serial_factory=open_serial,
+        clock=None,
+        raw_log=None,
+        metrics=None,
+    ):
+        self.stop_event = stop_event
+        self.poll_interval = poll_interval
+        self.clock = clock or SampleClock()
+        self.metrics = metrics
+        self.ports = [
+            CPCAsyncPort(config, data_queue, self, test, serial_factory, raw_log)
+            for config, data_queue in zip(configs, data_queues)
+        ]
+        self.thread = threading.Thread(target=self.run_loop, name="cpc-async")
+
+    def start(self):
+        self.thread.start()
+
+    def status(self):
+        return {port.process_name: port.supervisor.stats() for port in self.ports}
+
+    def run_loop(self):
+        asyncio.run(self.main())
+
+    async def main(self):
+        tasks = [asyncio.create_task(port.run()) for port in self.ports]
+
+        # Wait for the stop event without blocking the loop
+        while not self.stop_event.is_set():
+            await asyncio.sleep(0.1)
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for port in self.ports:
+            port.close_port()
+            if port.raw_log is not None:
+                port.raw_log.close()
+
+
+class CPCAsyncPort(CPCPort):
+    def __init__(self, config, data_queue, engine, test, serial_factory, raw_log):
+        super().__init__(config, engine.clock, raw_log, engine.metrics)
+        self.data_queue = data_queue
+        self.engine = engine
+        self.test = test
+        self.serial_factory = serial_factory
+        self.lines = deque()
+
+    async def run(self):
+        # Each port keeps its own connect/run/backoff cycle, a failing CPC
+        # only ever sleeps its own coroutine
+        while True:
+            if not self.test and self.ser is None:
+                if not await self.connect():
+                    continue
+            try:
+                if self.config["serial_commands"] or self.test:
+                    await self.poll_commands()
+                else:
+                    await self.read_stream()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await self.handle_failure(e)
+
+    async def connect(self):
+        # Setup CPC serial connection, reads never block the loop
+        try:
+            self.ser = self.serial_factory(self.config, timeout=0)
+            self.capture_port()
+            self.ser.reset_input_buffer()
+            await self.send_startup_commands()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await self.handle_failure(e)
+            return False
+        self.supervisor.connected()
+        return True
+
+    async def handle_failure(self, error):
+        self.close_port()
+        await asyncio.sleep(self.supervisor.failed(error))
+
+    async def send_startup_commands(self):
+        for message in startup_messages(self.config):
+            self.ser.write(message)
+            await asyncio.sleep(0.1)
+            self.ser.reset_input_buffer()
+        self.framer.discard()
+        self.lines.clear()
+
+    async def read_stream(self):
+        # Streaming instruments (log,1) push one record per line, a wakeup
+        # hands back every complete record that arrived since the last one.
+        # Puts never block the loop, a full queue applies its drop policy.
+        # Arrivals are timed against the clock grid for the jitter stats.
+        stale_timeout = self.supervisor.stale_timeout or None
+        while True:
+            if self.supervisor.restart_due():
+                await self.send_startup_commands()
+            try:
+                lines = await asyncio.wait_for(self.read_records(), stale_timeout)
+            except asyncio.TimeoutError:
+                raise PortStale(f"no data for {stale_timeout} s") from None
+            self.supervisor.record_received()
+            self.clock.arrived(self.process_name, period=self.period)
+            read_time = time.perf_counter()
+            for line in lines:
+                responses = line.split(",")
+                record = self.schema.parse(responses, read_time=read_time)
+                self.put(record, read_time)
+
+    async def poll_commands(self):
+        clock = self.clock
+        while True:
+            if not self.test and self.supervisor.restart_due():
+                await self.send_startup_commands()
+            if self.pipeline is not None and not self.test:
+                responses = await self.poll_pipeline()
+                timeouts = self.pipeline.cycle_timeouts
+                if self.metrics is not None and timeouts:
+                    self.metrics.timeout(self.process_name, timeouts)
+            else:
+                responses = await self.poll_each()
+
+            # A port that stops answering is treated as dead
+            if any(responses):
+                self.supervisor.record_received()
+            elif self.supervisor.is_stale():
+                raise PortStale(f"no data for {self.supervisor.stale_timeout} s")
+
+            read_time = time.perf_counter()
+            record = self.schema.parse(responses, read_time=read_time)
+            self.put(record, read_time)
+
+            # Wait for the next shared clock tick
+            await asyncio.sleep(clock.next_delay(self.process_name, period=self.period))
+            clock.arrive(self.process_name)
+
+    def put(self, record, read_time):
+        put_time = record.put_time = time.perf_counter()
+        self.data_queue.put(record, block=False)
+        if self.stages is not None:
+            self.stages["parse"].add(put_time - read_time)
+            self.stages["put"].add(time.perf_counter() - put_time)
+
+    async def poll_each(self):
+        # Send one command and wait for its reply before sending the next
+        responses = []
+        for command in self.config["serial_commands"] or [None]:
+            # GUI testing code here
+            if self.test:
+                responses.append(random.randint(0, 1000))
+                continue
+
+            # Drop late replies from a previous timeout
+            self.lines.clear()
+            self.framer.discard(self.ser)
+            self.ser.write((command + "\r").encode())
+            try:
+                response = await asyncio.wait_for(
+                    self.readline(), self.config["serial_timeout"]
+                )
+            except asyncio.TimeoutError:
+                response = ""
+                if self.metrics is not None:
+                    self.metrics.timeout(self.process_name)
+            responses.extend(response.split(","))
+        return responses
+
+    async def poll_pipeline(self):
+        # Queue the command batch and match replies in order without blocking
+        pipeline = self.pipeline
+        now = time.monotonic()
+        pipeline.begin(now)
+        self.lines.clear()
+        self.framer.discard(self.ser)
+        while not pipeline.done():
+            writes = pipeline.due_writes(now)
+            if writes:
+                self.ser.write(b"".join(writes))
+            self.framer.read_from(self.ser, block=False)
+            records = self.framer.records()
+            now = time.monotonic()
+            pipeline.feed(records, now)
+            pipeline.expire(now)
+            if not records and not pipeline.done():
+                wait = min(self.engine.poll_interval, pipeline.deadline() - now)
+                await asyncio.sleep(max(wait, 0))
+        return pipeline.finish(time.monotonic())
+
+    async def read_records(self):
+        # Poll the port without blocking until at least one record is framed
+        while True:
+            self.framer.read_from(self.ser, block=False)
+            records = self.framer.records()
+            if records:
+                return records
+            await asyncio.sleep(self.engine.poll_interval)
+
+    async def readline(self):
+        # Return the next complete line for command/response polling
+        if not self.lines:
+            self.lines.extend(await self.read_records())
+        return self.lines.popleft()
+
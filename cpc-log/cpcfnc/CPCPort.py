@@ -0,0 +1,56 @@
+# Per-port state shared by the thread engine (CPCSerial) and the async engine
+# (CPCAsyncPort): line framer, record schema, port supervisor, raw capture
+# ring, command pipeline and the metrics stages of one CPC. The engines only
+# differ in how they wait for the port.
+from cpcfnc.CommandPipeline import CommandPipeline
+from cpcfnc.LineFramer import LineFramer
+from cpcfnc.PortSupervisor import PortSupervisor
+from cpcfnc import RawLog
+from cpcfnc.RecordSchema import RecordSchema
+from cpcfnc.SampleClock import SampleClock, sample_period
+
+
+class CPCPort:
+    def __init__(self, config, clock=None, raw_log=None, metrics=None):
+        self.config = config
+        self.process_name = self.config["cpc_name"]
+        self.ser = None
+        self.framer = LineFramer()
+        self.schema = RecordSchema(self.config)
+        self.supervisor = PortSupervisor(self.config)
+
+        # Raw lines and commands go to the capture ring before parsing
+        self.raw_log = RawLog.open_for(self.config, raw_log)
+        if self.raw_log is not None:
+            self.framer.capture = self.raw_log.capture()
+
+        # Tick grid shared with the other CPCs and the writer, sample_rate
+        # CPCs tick faster on the same grid
+        self.clock = clock or SampleClock()
+        self.period = sample_period(self.config)
+
+        # Queue the whole command batch instead of one command per reply
+        self.pipeline = None
+        if self.config["serial_commands"] and self.config.get("pipeline_commands"):
+            self.pipeline = CommandPipeline(
+                self.config, update_time=self.period or self.clock.period
+            )
+
+        # Parse and put latency histograms of this CPC, None when off
+        self.metrics = metrics
+        self.stages = None
+        if self.metrics is not None:
+            self.stages = self.metrics.stages(self.process_name)
+
+    def capture_port(self):
+        # Log every command written to the port in the capture ring
+        if self.raw_log is not None:
+            self.ser = RawLog.CapturedSerial(self.ser, self.raw_log)
+
+    def close_port(self):
+        if self.ser is not None:
+            try:
+                self.ser.close()
+            except Exception:
+                pass
+        self.ser = None
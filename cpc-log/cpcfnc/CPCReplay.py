@@ -0,0 +1,183 @@
+# Replay of recorded data in place of the serial ports. MANY_*.csv files, and
+# raw_log captures when there are any, are parsed back into typed records and
+# put on the same data queues the acquisition engines fill, in time order and
+# at the recorded pace times speed, or as fast as the queues take them with
+# speed 0. With restamp the records carry the replay time instead of the
+# recorded one, so the plot and the writers treat them as live data.
+import csv
+from datetime import datetime
+import glob
+import heapq
+import itertools
+import os
+import threading
+import time
+
+from cpcfnc import RawLog
+from cpcfnc.RecordSchema import RecordSchema, to_datetime
+
+
+def expand(patterns, directory="."):
+    # Files matching the glob patterns, relative ones are looked up under
+    # directory. MANY_<date>_<time>.csv names sort oldest first.
+    paths = set()
+    for pattern in patterns:
+        paths.update(glob.glob(os.path.join(directory, pattern), recursive=True))
+    return sorted(paths, key=lambda path: (os.path.basename(path), path))
+
+
+class CPCReplay:
+    def __init__(
+        self,
+        configs,
+        data_queues,
+        stop_event,
+        files=(),
+        raw_dir=None,
+        speed=1.0,
+        restamp=False,
+    ):
+        self.configs = configs
+        self.data_queues = data_queues
+        self.stop_event = stop_event
+        self.files = list(files)
+        self.speed = speed
+        self.restamp = restamp
+        self.schemas = [RecordSchema(config) for config in configs]
+        self.indexes = {schema.name: i for i, schema in enumerate(self.schemas)}
+
+        # A CPC with a raw capture is replayed from it instead of the CSV
+        self.rings = {}
+        if raw_dir:
+            for index, schema in enumerate(self.schemas):
+                path = RawLog.ring_path(raw_dir, schema.name)
+                if os.path.exists(path):
+                    self.rings[index] = path
+
+        self.thread = threading.Thread(target=self.run, name="cpc-replay")
+        self.state = "idle"
+        self.current_file = None
+
+        # Epoch seconds of the newest record put on a queue, the consumer
+        # closes time bins against it instead of the wall clock
+        self.position = None
+
+        # Counters
+        self.records = [0] * len(configs)
+        self.rows = 0
+        self.unknown = 0
+        self.bad_rows = 0
+        self.started = None
+        self.finished = None
+
+    def start(self):
+        self.thread.start()
+
+    def csv_records(self, path):
+        # (epoch, CPC index, record) for each CPC group of every row. The
+        # wide header is split at each "cpc name" column and a group goes to
+        # the configured CPC named in it, NaN padded groups are skipped.
+        self.current_file = path
+        with open(path, "r", newline="") as data_file:
+            reader = csv.reader(data_file, delimiter=",", escapechar="\\")
+            header = next(reader, None) or []
+            starts = [i for i, field in enumerate(header) if field == "cpc name"]
+            if not starts:
+                print(f"Replay: no cpc name column in {path}, skipped")
+                return
+            groups = list(zip(starts, starts[1:] + [len(header)]))
+            for row in reader:
+                self.rows += 1
+                for start, end in groups:
+                    if start + 1 >= len(row):
+                        self.bad_rows += 1
+                        continue
+                    index = self.indexes.get(row[start])
+                    if index is None:
+                        if row[start] not in ("", "nan"):
+                            self.unknown += 1
+                        continue
+                    if index in self.rings:
+                        continue
+                    timestamp = to_datetime(row[start + 1])
+                    if timestamp is None:
+                        self.bad_rows += 1
+                        continue
+                    record = self.schemas[index].parse(row[start + 2 : end], timestamp)
+                    yield timestamp.timestamp(), index, record
+
+    def ring_records(self, index, path):
+        for record in RawLog.decode(path, self.configs[index]):
+            yield record["datetime"].timestamp(), index, record
+
+    def sources(self):
+        # CSV files one after the other, merged by time with the raw captures
+        streams = [
+            itertools.chain.from_iterable(self.csv_records(p) for p in self.files)
+        ]
+        streams.extend(self.ring_records(i, p) for i, p in self.rings.items())
+        return heapq.merge(*streams, key=lambda item: item[0])
+
+    def run(self):
+        self.state = "replaying"
+        self.started = time.monotonic()
+        wall_start = time.time()
+        first = None
+        try:
+            for epoch, index, record in self.sources():
+                if self.stop_event.is_set():
+                    break
+                if first is None:
+                    first = epoch
+
+                # Recorded spacing divided by speed, no waiting with speed 0
+                if self.speed:
+                    offset = (epoch - first) / self.speed
+                    delay = self.started + offset - time.monotonic()
+                    if delay > 0.001 and self.stop_event.wait(delay):
+                        break
+                if self.restamp:
+                    epoch = wall_start + offset if self.speed else time.time()
+                    record["datetime"] = datetime.fromtimestamp(epoch)
+
+                self.data_queues[index].put(record)
+                self.records[index] += 1
+                self.position = epoch
+        except (OSError, ValueError) as e:
+            print(f"Replay failed in {self.current_file}: {type(e).__name__}: {e}")
+        self.finished = time.monotonic()
+        self.state = "stopped" if self.stop_event.is_set() else "finished"
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+    def status(self):
+        status = {}
+        for index, schema in enumerate(self.schemas):
+            status[schema.name] = {
+                "state": self.state,
+                "source": self.rings.get(index, "csv"),
+                "records": self.records[index],
+            }
+        return status
+
+    def stats(self):
+        records = sum(self.records)
+        elapsed = self.elapsed()
+        return {
+            "state": self.state,
+            "files": len(self.files),
+            "rings": len(self.rings),
+            "current_file": self.current_file,
+            "rows_read": self.rows,
+            "records": records,
+            "unknown_cpcs": self.unknown,
+            "bad_rows": self.bad_rows,
+            "elapsed": elapsed,
+            "records_per_second": records / elapsed if elapsed else 0.0,
+            "position": (
+                datetime.fromtimestamp(self.position) if self.position else None
+            ),
+        }
@@ -2,144 +2,192 @@
 from datetime import datetime
 import threading
 import time
-import traceback
 
 import serial
 import random
 
-class CPCSerial:
-    def __init__(self, config, data_queue, stop_event, stop_barrier, test=False):
-        self.config = config
+from cpcfnc.CPCPort import CPCPort
+from cpcfnc.PortSupervisor import PortStale
+
+class CPCSerial(CPCPort):
+    def __init__(
+        self,
+        config,
+        data_queue,
+        stop_event,
+        stop_barrier,
+        test=False,
+        serial_factory=None,
+        clock=None,
+        raw_log=None,
+        metrics=None,
+    ):
+        super().__init__(config, clock, raw_log, metrics)
         self.data_queue = data_queue
         self.stop_event = stop_event
         self.stop_barrier = stop_barrier
 
-        self.process_name = self.config["cpc_name"]
         self.thread = threading.Thread(target=self.record_serial_data)
         
         # GUI testing code here
         self.test = test
 
+        # Benchmarks and simulators can swap in their own port objects
+        self.serial_factory = serial_factory or open_serial
+
     def start(self):
         self.thread.start()
 
     def serial_startup(self):
-        self.ser = serial.Serial(
-            port=self.config["serial_port"],
-            baudrate=self.config["serial_baud"],
-            bytesize=self.config["serial_bytesize"],
-            parity=self.config["serial_parity"],
-            timeout=self.config["serial_timeout"],
-        )
+        self.ser = self.serial_factory(self.config)
+        self.capture_port()
         self.ser.flushInput()
+        self.framer.discard()
 
-    def serial_startup_commands(self):
-        if self.config["start_commands"]:
-            for start_command in self.config["start_commands"]:
-                self.ser.write((start_command + "\r\n").encode())
-                time.sleep(0.1)
-                self.ser.flushInput()
-        if self.config["set_time"]:
-            date_strings= ["%y/%m/%d","%H:%M:%S"]
-            for date_string in date_strings:
-                self.ser.write((f"rtc,{datetime.now().strftime(date_string)}\r\n").encode())
-                time.sleep(0.1)
-                self.ser.flushInput()
+    def read_records(self):
+        # Wait up to serial_timeout for at least one record, return them all
+        deadline = time.monotonic() + self.config["serial_timeout"]
+        records = self.framer.records()
+        while not records and time.monotonic() < deadline:
+            self.framer.read_from(self.ser)
+            records = self.framer.records()
+        return records
 
-    def record_serial_data(self):
-        if self.test == False:
-            # Setup CPC serial connection
+    def serial_startup_commands(self):
+        for message in startup_messages(self.config):
+            self.ser.write(message)
+            time.sleep(0.1)
+            self.ser.flushInput()
+        self.framer.discard()
+
+    def connect(self):
+        # Open the port and replay startup commands, False while backing off
+        try:
             self.serial_startup()
-
-            # Send startup commands
             self.serial_startup_commands()
+        except Exception as e:
+            self.handle_failure(e)
+            return False
+        self.supervisor.connected()
+        return True
+
+    def handle_failure(self, error):
+        # Drop the dead port and wait out the backoff without blocking others
+        self.close_port()
+        delay = self.supervisor.failed(error)
+        self.stop_event.wait(delay)
 
-        curr_time = time.monotonic()
+    def status(self):
+        return {self.process_name: self.supervisor.stats()}
 
+    def record_serial_data(self):
         # Loop until stop event is set
         while not self.stop_event.is_set():
+            if self.test == False and self.ser is None:
+                # Setup CPC serial connection and send startup commands
+                if not self.connect():
+                    continue
+
             try:
                 # Send startup commands if CPC restarts often
-                if self.process_name == "3025_Jim's":
-                    if time.monotonic() % 60 < 1:
-                        self.serial_startup_commands()
-                
-                # Store responses in a list
-                responses = []
-
-                if self.config["serial_commands"]:
+                if self.test == False and self.supervisor.restart_due():
+                    self.serial_startup_commands()
+
+                # Store one list of responses per record
+                records = []
+
+                if self.pipeline is not None and not self.test:
+                    records.append(self.pipeline.poll(self.ser, self.framer))
+                    if self.metrics is not None and self.pipeline.cycle_timeouts:
+                        self.metrics.timeout(
+                            self.process_name, self.pipeline.cycle_timeouts
+                        )
+                elif self.config["serial_commands"]:
+                    responses = []
                     for command in self.config["serial_commands"]:
                         # GUI testing code here
                         if self.test:
                             responses.append(random.randint(0,1000))
                             continue
 
-                        # Send command to serial port
+                        # Send command to serial port, dropping stale bytes
+                        # once the capture ring has them
+                        self.framer.discard(self.ser)
                         self.ser.write((command + "\r").encode())
 
                         # Read response from serial port
-                        response = self.ser.readline().decode().rstrip()
+                        replies = self.read_records()
+                        if not replies and self.metrics is not None:
+                            self.metrics.timeout(self.process_name)
+                        response = replies[0] if replies else ""
                         response = response.split(",")
 
                         # Append response to the list
                         responses.extend(response)
+                    records.append(responses)
                 else:
 
                     # GUI testing code here
                     if self.test:
-                        responses.append(1)
-                        continue
-
-                    # Read response from serial port
-                    response = self.ser.readline().decode().rstrip()
-                    response = response.split(",")
-
-                    # Append response to the list
-                    responses = response
-
-                # Create dictionary with responses
-                responses = [self.process_name, datetime.now()] + responses
-                serial_output = dict(zip(self.config["cpc_header"], responses))
-
-                # Modify concentration
-                if not self.config["default_flow"]:
-                    try:
-                        calc_conc = (
-                        float(serial_output["1 second counts"])
-                        / self.config["cpc_flowrate"]
-                        )
-                        serial_output["concentration"] = "{:.2f}".format(calc_conc)
-                    except ValueError:
-                        serial_output["concentration"] = ""
-                        
-                # Share CPC data with other threads
-                self.data_queue.put(serial_output)
-
-                # Schedule the next update
-                curr_time = sched_update(self.process_name, curr_time)
+                        records.append([1])
+                    else:
+                        # Every complete record that arrived since the last
+                        # update, partial records wait for the next read
+                        for response in self.read_records():
+                            records.append(response.split(","))
+
+                # A port that stops answering is treated as dead
+                if any(any(responses) for responses in records):
+                    self.supervisor.record_received()
+                elif self.supervisor.is_stale():
+                    raise PortStale(
+                        f"no data for {self.supervisor.stale_timeout} s"
+                    )
+
+                read_time = time.perf_counter()
+                for responses in records:
+                    # Parse responses into a typed record
+                    serial_output = self.schema.parse(responses, read_time=read_time)
+
+                    # Share CPC data with other threads
+                    put_time = serial_output.put_time = time.perf_counter()
+                    self.data_queue.put(serial_output)
+                    if self.stages is not None:
+                        self.stages["parse"].add(put_time - read_time)
+                        self.stages["put"].add(time.perf_counter() - put_time)
 
             except Exception as e:
-                print(f"Error: {self.process_name}")
-                print(traceback.format_exc())
-
-
-def sched_update(process_name, curr_time, update_time=1):
-    # Calculate sleep time based on seconds till next update
-    next_time = curr_time + update_time - time.monotonic()
-
-    # Set sleep time to 0 if program is behind
-    if next_time < 0:
-        # Skip loops if the program is behind
-        missed_loops = abs(next_time) / update_time
-        if missed_loops > 1:
-            curr_time = curr_time + update_time * int(missed_loops)
-        next_time = 0
-        print(f"Slow: {process_name}" + str(datetime.now()))
-
-    # Sleep
-    time.sleep(next_time)
-
-    # Update current time for next interval
-    curr_time = curr_time + update_time
-    return curr_time
-    
+                self.handle_failure(e)
+                continue
+
+            # Wait for the next shared clock tick
+            self.clock.wait(self.process_name, self.stop_event, period=self.period)
+
+        self.close_port()
+        if self.raw_log is not None:
+            self.raw_log.close()
+
+
+def open_serial(config, timeout=None):
+    # Blocking reads use serial_timeout, the async engine passes timeout=0
+    if timeout is None:
+        timeout = config["serial_timeout"]
+    return serial.Serial(
+        port=config["serial_port"],
+        baudrate=config["serial_baud"],
+        bytesize=config["serial_bytesize"],
+        parity=config["serial_parity"],
+        timeout=timeout,
+    )
+
+
+def startup_messages(config):
+    # Encoded start commands and clock set messages, generated lazily so the
+    # time is read right before each message is sent
+    if config["start_commands"]:
+        for start_command in config["start_commands"]:
+            yield (start_command + "\r\n").encode()
+    if config["set_time"]:
+        date_strings = ["%y/%m/%d", "%H:%M:%S"]
+        for date_string in date_strings:
+            yield (f"rtc,{datetime.now().strftime(date_string)}\r\n").encode()
@@ -0,0 +1,361 @@
+# Multi-process sharded acquisition. The cpcN entries are split across worker
+# processes, each running the async engine for its shard. Records are written
+# as fixed size rows into one shared memory ring per CPC, and a pump thread in
+# the main process moves them onto the usual data queues, so GUI and writer
+# load in the main process never delays serial reads. Workers tick on the
+# same wall clock aligned grid as the main process and send their port
+# supervisor, clock and timeout counters back over a pipe every
+# status_interval seconds. Rows carry the read and put times, so the parse,
+# queue and write metrics work as in the other modes. A worker that dies is
+# restarted with the same capped exponential backoff as a failing port, the
+# backoff resets once the new worker reports in.
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import threading
+import time
+
+import numpy as np
+
+from cpcfnc.PortSupervisor import PortSupervisor
+from cpcfnc.RecordSchema import RecordSchema
+from cpcfnc.SampleClock import SampleClock
+
+HEADER_BYTES = 64
+
+
+class WorkerExited(Exception):
+    pass
+
+
+def attach_memory(name):
+    # Workers share the main process' resource tracker, which already knows
+    # the segment; the main process owns it and unlinks it on shutdown
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+class SharedRing:
+    # Single producer, single consumer ring of structured rows. The producer
+    # writes a row and then bumps the write counter; the consumer re-checks
+    # the counter after copying to detect rows overwritten mid-read.
+    def __init__(self, schema, capacity, name=None):
+        self.schema = schema
+        self.dtype = schema.numpy_dtype()
+        self.capacity = capacity
+        size = HEADER_BYTES + capacity * self.dtype.itemsize
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=size)
+            self.owner = True
+        else:
+            self.memory = attach_memory(name)
+            self.owner = False
+        self.name = self.memory.name
+        self.counter = np.ndarray((1,), dtype=np.uint64, buffer=self.memory.buf)
+        self.rows = np.ndarray(
+            (capacity,), dtype=self.dtype, buffer=self.memory.buf, offset=HEADER_BYTES
+        )
+        if self.owner:
+            self.counter[0] = 0
+
+        # Consumer side position and loss accounting
+        self.read_count = 0
+        self.dropped = 0
+
+    def put(self, record, block=True, timeout=None):
+        # Same call shape as queue.Queue.put so the engines can use it
+        write_count = int(self.counter[0])
+        self.schema.fill_row(self.rows, write_count % self.capacity, record)
+        self.counter[0] = write_count + 1
+
+    def read(self):
+        # Copy every row written since the last read
+        write_count = int(self.counter[0])
+        if write_count - self.read_count > self.capacity:
+            self.dropped += write_count - self.read_count - self.capacity
+            self.read_count = write_count - self.capacity
+        if write_count == self.read_count:
+            return self.rows[:0]
+        indexes = np.arange(self.read_count, write_count) % self.capacity
+        rows = self.rows[indexes]
+
+        # Rows the producer lapped (or is writing) while we copied may be torn
+        lapped = int(self.counter[0]) + 1 - self.capacity - self.read_count
+        if lapped > 0:
+            self.dropped += lapped
+            rows = rows[lapped:]
+        self.read_count = write_count
+        return rows
+
+    def close(self):
+        self.counter = None
+        self.rows = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+def shard_worker(
+    configs,
+    ring_names,
+    capacity,
+    stop_event,
+    poll_interval,
+    serial_factory,
+    raw_log,
+    clock_period,
+    count_timeouts,
+    status_pipe,
+    status_interval,
+):
+    # Worker process: the async engine writes straight into the shared rings
+    from cpcfnc import CPCAsync, Metrics
+    from cpcfnc.CPCSerial import open_serial
+
+    rings = [
+        SharedRing(RecordSchema(config), capacity, name)
+        for config, name in zip(configs, ring_names)
+    ]
+    names = [config["cpc_name"] for config in configs]
+    clock = SampleClock(clock_period)
+    metrics = Metrics.Metrics(names) if count_timeouts else None
+    engine = CPCAsync.CPCAsync(
+        configs,
+        rings,
+        stop_event,
+        poll_interval=poll_interval,
+        serial_factory=serial_factory or open_serial,
+        clock=clock,
+        raw_log=raw_log,
+        metrics=metrics,
+    )
+
+    def send_status():
+        status = engine.status()
+        for name, ring in zip(names, rings):
+            status[name]["clock"] = clock.stats(name).get(name)
+            status[name]["truncated"] = sum(ring.schema.truncated.values())
+            if metrics is not None:
+                status[name]["timeouts"] = metrics.timeouts[name]
+        try:
+            status_pipe.send(status)
+        except OSError:
+            pass
+
+    engine.start()
+    try:
+        while not stop_event.wait(status_interval):
+            send_status()
+        engine.thread.join()
+        send_status()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        status_pipe.close()
+        for ring in rings:
+            ring.close()
+
+
+class CPCShard:
+    def __init__(
+        self,
+        configs,
+        data_queues,
+        stop_event,
+        num_workers=2,
+        ring_size=4096,
+        poll_interval=0.01,
+        pump_interval=0.05,
+        serial_factory=None,
+        raw_log=None,
+        clock=None,
+        metrics=None,
+        status_interval=1.0,
+        restart_backoff_min=1.0,
+        restart_backoff_max=60.0,
+    ):
+        self.configs = configs
+        self.data_queues = data_queues
+        self.stop_event = stop_event
+        self.ring_size = ring_size
+        self.poll_interval = poll_interval
+        self.pump_interval = pump_interval
+        self.serial_factory = serial_factory
+        self.raw_log = raw_log
+        self.clock_period = clock.period if clock is not None else 1.0
+        self.metrics = metrics
+        self.status_interval = status_interval
+
+        self.schemas = [RecordSchema(config) for config in configs]
+        self.rings = [SharedRing(schema, ring_size) for schema in self.schemas]
+
+        # Round robin CPCs over the workers
+        num_workers = max(1, min(num_workers, len(configs)))
+        self.shards = [
+            list(range(i, len(configs), num_workers)) for i in range(num_workers)
+        ]
+        self.worker_stop = mp.Event()
+        self.processes = [None] * num_workers
+        self.restarts = [0] * num_workers
+        self.restart_at = [None] * num_workers
+        self.supervisors = [
+            PortSupervisor(
+                {
+                    "cpc_name": f"acquisition worker {i}",
+                    "reconnect_backoff_min": restart_backoff_min,
+                    "reconnect_backoff_max": restart_backoff_max,
+                }
+            )
+            for i in range(num_workers)
+        ]
+
+        # Latest worker report per CPC and the pipe each worker reports on
+        self.pipes = [None] * num_workers
+        self.port_status = {}
+        self.timeouts = {}
+        self.stages = None
+        if self.metrics is not None:
+            self.stages = [self.metrics.stages(s.name) for s in self.schemas]
+
+        self.thread = threading.Thread(target=self.pump, name="cpc-shard-pump")
+
+    def start(self):
+        for shard_index in range(len(self.shards)):
+            self.start_worker(shard_index)
+        self.thread.start()
+
+    def start_worker(self, shard_index):
+        indexes = self.shards[shard_index]
+        receiver, sender = mp.Pipe(duplex=False)
+        process = mp.Process(
+            target=shard_worker,
+            args=(
+                [self.configs[i] for i in indexes],
+                [self.rings[i].name for i in indexes],
+                self.ring_size,
+                self.worker_stop,
+                self.poll_interval,
+                self.serial_factory,
+                self.raw_log,
+                self.clock_period,
+                self.metrics is not None,
+                sender,
+                self.status_interval,
+            ),
+            name=f"cpc-shard-{shard_index}",
+            daemon=True,
+        )
+        process.start()
+        sender.close()
+        if self.pipes[shard_index] is not None:
+            self.pipes[shard_index].close()
+        self.processes[shard_index] = process
+        self.pipes[shard_index] = receiver
+        for i in indexes:
+            self.timeouts[self.configs[i]["cpc_name"]] = 0
+
+    def pump(self):
+        # Move rows from the rings onto the data queues until stopped
+        while not self.stop_event.wait(self.pump_interval):
+            self.pump_once()
+            self.read_status()
+            self.supervise()
+
+        self.worker_stop.set()
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self.pump_once()
+        self.read_status()
+        for pipe in self.pipes:
+            pipe.close()
+        for ring in self.rings:
+            ring.close()
+
+    def supervise(self, now=None):
+        # Restart dead workers once their backoff ran out, a worker that
+        # dies on startup is not respawned every pump_interval
+        now = time.monotonic() if now is None else now
+        for shard_index, process in enumerate(self.processes):
+            restart_at = self.restart_at[shard_index]
+            if restart_at is not None:
+                if now >= restart_at:
+                    print(f"Restarting acquisition worker {shard_index}")
+                    self.restart_at[shard_index] = None
+                    self.restarts[shard_index] += 1
+                    self.start_worker(shard_index)
+            elif not process.is_alive():
+                self.read_status()
+                error = WorkerExited(f"exit code {process.exitcode}")
+                delay = self.supervisors[shard_index].failed(error, now)
+                self.restart_at[shard_index] = now + delay
+
+    def pump_once(self):
+        # Queue full handling follows the queue's policy, never blocking the
+        # pump for the other CPCs
+        for index, (ring, schema, data_queue) in enumerate(
+            zip(self.rings, self.schemas, self.data_queues)
+        ):
+            for row in ring.read():
+                record = schema.from_row(row)
+                if self.stages is None:
+                    data_queue.put(record, block=False)
+                    continue
+                put_time = time.perf_counter()
+                data_queue.put(record, block=False)
+                stages = self.stages[index]
+                if record.read_time is not None and record.put_time is not None:
+                    stages["parse"].add(record.put_time - record.read_time)
+                stages["put"].add(time.perf_counter() - put_time)
+
+    def read_status(self):
+        # Keep the newest report of each worker, timeouts go to the metrics
+        for shard_index, pipe in enumerate(self.pipes):
+            try:
+                while pipe.poll():
+                    self.update_status(pipe.recv())
+                    supervisor = self.supervisors[shard_index]
+                    if supervisor.state != "running":
+                        supervisor.connected()
+            except (EOFError, OSError):
+                pass
+
+    def update_status(self, status):
+        for name, port_status in status.items():
+            self.port_status[name] = port_status
+            timeouts = port_status.pop("timeouts", None)
+            if timeouts is None or self.metrics is None:
+                continue
+            # A restarted worker counts from zero again
+            last = self.timeouts.get(name, 0)
+            added = timeouts - last if timeouts >= last else timeouts
+            if added:
+                self.metrics.timeout(name, added)
+            self.timeouts[name] = timeouts
+
+    def status(self):
+        # The worker's port supervisor counters plus the ring accounting
+        status = {}
+        for shard_index, indexes in enumerate(self.shards):
+            process = self.processes[shard_index]
+            alive = process is not None and process.is_alive()
+            for i in indexes:
+                name = self.configs[i]["cpc_name"]
+                cpc_status = dict(self.port_status.get(name) or {})
+                if self.restart_at[shard_index] is not None:
+                    cpc_status["state"] = "backoff"
+                elif not alive:
+                    cpc_status["state"] = "stopped"
+                cpc_status.setdefault("state", "starting")
+                cpc_status.update(
+                    {
+                        "worker": shard_index,
+                        "worker_restarts": self.restarts[shard_index],
+                        "records": self.rings[i].read_count,
+                        "ring_dropped": self.rings[i].dropped,
+                    }
+                )
+                status[name] = cpc_status
+        return status
@@ -0,0 +1,228 @@
+# Pseudo-terminal CPC simulator for offline testing (Linux/macOS only). Each
+# simulated instrument owns a pty pair, the slave side is opened by pyserial
+# like a real COM port. Streaming instruments emulate the MAGIC/ADI format
+# after "log,N", command instruments answer the TSI 3025 R* commands.
+from datetime import datetime
+import heapq
+import os
+import random
+import selectors
+import threading
+import time
+import tty
+
+# 3025 replies, in the order of the example config's serial_commands
+TSI3025_REPLIES = {
+    "RD": lambda: f"{random.lognormvariate(8, 0.5):.1f}",
+    "R1": lambda: f"{random.gauss(10.0, 0.05):.1f}",
+    "R2": lambda: f"{random.gauss(37.0, 0.05):.1f}",
+    "R3": lambda: f"{random.gauss(39.0, 0.05):.1f}",
+    "R4": lambda: f"{random.gauss(300, 1):.0f}",
+    "R5": lambda: "READY",
+    "R6": lambda: f"{random.gauss(1.20, 0.01):.2f}",
+    "R7": lambda: f"{random.gauss(0.35, 0.01):.2f}",
+    "RE": lambda: f"{random.randint(120, 140)}",
+    "RB": lambda: f"{random.randint(0, 20000)}",
+    "R0": lambda: "FULL",
+}
+
+DEFAULT_PROFILE = {
+    "period": None,  # seconds between streamed records, None follows log,N
+    "reply_delay": 0.01,  # seconds before a command reply is sent
+    "jitter": 0.0,  # random extra delay on every record/reply, seconds
+    "drop_rate": 0.0,  # fraction of records/replies never sent
+    "garble_rate": 0.0,  # fraction with a corrupted byte
+    "split_rate": 0.0,  # fraction sent in two writes with a pause between
+    "split_pause": 0.05,
+}
+
+
+class SimulatedCPC:
+    def __init__(self, config, profile):
+        self.config = config
+        self.profile = profile
+        self.name = config["cpc_name"]
+        self.command_mode = bool(config["serial_commands"])
+
+        # Raw pty pair, the slave path replaces serial_port
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.slave_fd)
+        os.set_blocking(self.master_fd, False)
+        self.port = os.ttyname(self.slave_fd)
+
+        self.rx = bytearray()
+        self.busy_until = 0.0
+        self.holding = False
+        self.held = bytearray()
+        self.period = None
+        self.next_stream = None
+        self.records_sent = 0
+        self.dropped = 0
+        self.overflows = 0
+
+        # Streaming fields after instrument_datetime and concentration
+        self.stream_fields = max(len(config["cpc_header"]) - 4, 0)
+        self.serial_number = f"SIM{random.randint(1000, 9999)}"
+
+    def handle_input(self, now, schedule):
+        try:
+            data = os.read(self.master_fd, 4096)
+        except (BlockingIOError, OSError):
+            return
+        self.rx += data.replace(b"\n", b"\r")
+        while b"\r" in self.rx:
+            line, _, rest = self.rx.partition(b"\r")
+            self.rx = bytearray(rest)
+            command = line.decode("ascii", "replace").strip()
+            if command:
+                self.handle_command(command, now, schedule)
+
+    def handle_command(self, command, now, schedule):
+        if command.startswith("log,"):
+            # Start (or stop with log,0) streaming one record per N seconds
+            try:
+                period = float(command.split(",")[1])
+            except ValueError:
+                period = 1.0
+            self.period = (self.profile["period"] or period) if period > 0 else None
+            if self.period:
+                self.next_stream = now + self.period
+                schedule(self.next_stream, self)
+            return
+        if command in TSI3025_REPLIES:
+            # Commands are answered one after another
+            reply = TSI3025_REPLIES[command]()
+            self.busy_until = max(now, self.busy_until) + self.profile["reply_delay"]
+            schedule(self.busy_until, self, reply)
+            return
+        # rtc, psld and 3025 set commands are accepted silently
+
+    def stream_record(self):
+        concentration = random.lognormvariate(8, 0.5)
+        values = [f"{random.gauss(25, 2):.2f}" for _ in range(self.stream_fields)]
+        if values:
+            values[-1] = self.serial_number
+        instrument_datetime = datetime.now().strftime("%Y/%m/%d %H:%M:%S")
+        return ",".join([instrument_datetime, f"{concentration:.2f}"] + values)
+
+    def send(self, text, schedule, now):
+        profile = self.profile
+        if random.random() < profile["drop_rate"]:
+            self.dropped += 1
+            return
+        data = bytearray((text + "\r\n").encode())
+        if random.random() < profile["garble_rate"] and len(data) > 2:
+            data[random.randrange(len(data) - 2)] = random.randrange(33, 127)
+        if self.holding:
+            # The tail of a split record has not been sent yet
+            self.held += data
+        elif random.random() < profile["split_rate"] and len(data) > 2:
+            cut = random.randrange(1, len(data) - 1)
+            self.write(data[:cut])
+            self.holding = True
+            self.held = data[cut:]
+            schedule(now + profile["split_pause"], self, None, True)
+        else:
+            self.write(data)
+        self.records_sent += 1
+
+    def release(self):
+        # Send the held tail and anything queued behind it
+        self.holding = False
+        self.write(bytes(self.held))
+        self.held = bytearray()
+
+    def write(self, data):
+        try:
+            os.write(self.master_fd, data)
+        except BlockingIOError:
+            # Nobody is reading the port, the pty buffer is full
+            self.overflows += 1
+
+    def close(self):
+        for fd in (self.master_fd, self.slave_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+class CPCSimulator:
+    def __init__(self, configs, profile=None):
+        self.profile = dict(DEFAULT_PROFILE)
+        self.profile.update(profile or {})
+        self.instruments = [SimulatedCPC(config, self.profile) for config in configs]
+        self.ports = [instrument.port for instrument in self.instruments]
+
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="cpc-simulator", daemon=True)
+        self.events = []
+        self.counter = 0
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join(timeout=2)
+        for instrument in self.instruments:
+            instrument.close()
+
+    def schedule(self, when, instrument, reply=None, release=False):
+        when += random.random() * self.profile["jitter"]
+        self.counter += 1
+        heapq.heappush(self.events, (when, self.counter, instrument, reply, release))
+
+    def run(self):
+        selector = selectors.DefaultSelector()
+        for instrument in self.instruments:
+            selector.register(instrument.master_fd, selectors.EVENT_READ, instrument)
+
+        while not self.stop_event.is_set():
+            now = time.monotonic()
+            timeout = 0.1
+            if self.events:
+                timeout = min(max(self.events[0][0] - now, 0), timeout)
+            for key, _ in selector.select(timeout):
+                key.data.handle_input(time.monotonic(), self.schedule)
+
+            # Send every record or reply that is due
+            now = time.monotonic()
+            while self.events and self.events[0][0] <= now:
+                _, _, instrument, reply, release = heapq.heappop(self.events)
+                if release:
+                    instrument.release()
+                elif reply is not None:
+                    instrument.send(reply, self.schedule, now)
+                elif instrument.period and instrument.next_stream <= now + 1e-6:
+                    instrument.send(instrument.stream_record(), self.schedule, now)
+                    instrument.next_stream += instrument.period
+                    self.schedule(instrument.next_stream, instrument)
+        selector.close()
+
+    def stats(self):
+        return {
+            instrument.name: {
+                "records_sent": instrument.records_sent,
+                "dropped": instrument.dropped,
+                "overflows": instrument.overflows,
+            }
+            for instrument in self.instruments
+        }
+
+
+def simulated_configs(config):
+    # Expand the "simulator" block of config.yml. With num_cpcs set, cpc1 is
+    # cloned that many times, otherwise every configured cpcN is simulated.
+    sim = config.get("simulator") or {}
+    num_sim = sim.get("num_cpcs") or 0
+    if num_sim:
+        template = config["cpc1"]
+        configs = []
+        for i in range(num_sim):
+            cpc_config = dict(template)
+            cpc_config["cpc_name"] = f"{template['cpc_name']}_{i + 1}"
+            configs.append(cpc_config)
+    else:
+        configs = [dict(config[f"cpc{i}"]) for i in range(1, config["num_cpcs"] + 1)]
+    return configs, sim.get("profile") or {}
@@ -0,0 +1,216 @@
+# Reader for the wide MANY_*.csv files. Every CPC's cpc_header starts with
+# "cpc name", so the header row is split at those columns and each group is
+# read with fixed dtypes (float64, Int64, datetime64 and string or category,
+# never object) into one DataFrame per instrument, keyed by the name in its
+# "cpc name" column. Files from days with other CPCs or another num_cpcs read
+# the same way, configs only supply cpc_dtypes and are optional. Files are
+# parsed in chunks with pyarrow's CSV reader when it is installed, otherwise
+# with the pandas C parser, and in worker processes with workers > 1.
+#   frames = CSVReader.read_range(data_dir, start, end, configs, ["concentration"])
+#   frames["Outdoor"]
+from concurrent.futures import ProcessPoolExecutor
+import csv
+from datetime import timedelta
+import glob
+import os
+
+import pandas as pd
+
+from cpcfnc.RecordSchema import RecordSchema
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+
+if pa is not None:
+    STR_DTYPE = pd.StringDtype("pyarrow")
+    ARROW_TYPES = {
+        "float": pa.float64(),
+        "int": pa.int64(),
+        "str": pa.string(),
+        "datetime": pa.timestamp("us"),
+    }
+    PANDAS_TYPES = {pa.string(): STR_DTYPE, pa.int64(): pd.Int64Dtype()}
+else:
+    STR_DTYPE = "category"
+PANDAS_DTYPES = {"float": "float64", "int": "Int64", "str": STR_DTYPE}
+
+# Padding written for a CPC that missed a row
+NULL_VALUES = ["", "nan", "NaN"]
+
+
+def read_header(path):
+    with open(path, "r", newline="") as data_file:
+        return next(csv.reader(data_file, delimiter=",", escapechar="\\"), [])
+
+
+def groups(header):
+    # (first, last + 1) column of each CPC in the wide header
+    starts = [i for i, field in enumerate(header) if field == "cpc name"]
+    return list(zip(starts, starts[1:] + [len(header)]))
+
+
+def group_fields(header, configs=None, columns=None):
+    # {first column: [(position, name, dtype)]} of the columns to read for
+    # each CPC, cpc_dtypes declared in any config win
+    overrides = {}
+    for config in configs or []:
+        overrides.update(config.get("cpc_dtypes") or {})
+    fields = {}
+    for start, end in groups(header):
+        names = header[start:end]
+        schema = RecordSchema(
+            {"cpc_name": "", "cpc_header": names, "cpc_dtypes": overrides}
+        )
+        fields[start] = [
+            (start + k, name, dtype)
+            for k, (name, dtype) in enumerate(zip(names, schema.dtypes))
+            if k < 2 or columns is None or name in columns
+        ]
+    return fields
+
+
+def iter_chunks(path, configs=None, columns=None, chunksize=20000):
+    # Yield {instrument: DataFrame} for every chunk of about chunksize rows
+    header = read_header(path)
+    fields = group_fields(header, configs, columns)
+    if not fields:
+        raise ValueError(f"{path} has no cpc name column")
+    if pa is not None:
+        return arrow_chunks(path, header, fields, chunksize)
+    return pandas_chunks(path, header, fields, chunksize)
+
+
+def arrow_chunks(path, header, fields, chunksize):
+    # Columns are read by position, the repeated names would clash
+    positions = [str(i) for i in range(len(header))]
+    types = {
+        positions[position]: ARROW_TYPES[dtype]
+        for group in fields.values()
+        for position, _, dtype in group
+    }
+    reader = pa_csv.open_csv(
+        path,
+        read_options=pa_csv.ReadOptions(
+            skip_rows=1,
+            column_names=positions,
+            block_size=max(chunksize * len(header) * 8, 1 << 20),
+        ),
+        parse_options=pa_csv.ParseOptions(escape_char="\\"),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=list(types),
+            column_types=types,
+            null_values=NULL_VALUES,
+            strings_can_be_null=True,
+        ),
+    )
+    for batch in reader:
+        frames = {}
+        for start, group in fields.items():
+            name_column = batch.column(positions[start])
+            for name in pc.unique(name_column).drop_null().to_pylist():
+                rows = batch.filter(pc.equal(name_column, name))
+                rows = rows.select([positions[p] for p, _, _ in group])
+                frames[name] = (
+                    rows.rename_columns([field for _, field, _ in group])
+                    .to_pandas(types_mapper=PANDAS_TYPES.get)
+                )
+        yield frames
+
+
+def pandas_chunks(path, header, fields, chunksize):
+    dtypes = {
+        position: "str" if dtype == "str" else "float64"
+        for group in fields.values()
+        for position, _, dtype in group
+        if dtype != "datetime"
+    }
+    reader = pd.read_csv(
+        path,
+        header=None,
+        skiprows=1,
+        names=range(len(header)),
+        usecols=[p for group in fields.values() for p, _, _ in group],
+        dtype=dtypes,
+        na_values=NULL_VALUES,
+        escapechar="\\",
+        chunksize=chunksize,
+    )
+    for chunk in reader:
+        frames = {}
+        for start, group in fields.items():
+            name_column = chunk[start]
+            for name in name_column.dropna().unique():
+                frames[name] = typed_frame(chunk[name_column == name], group)
+        yield frames
+
+
+def typed_frame(rows, group):
+    # One instrument's columns with its header names and fixed dtypes
+    data = {}
+    for position, name, dtype in group:
+        values = rows[position]
+        if dtype == "datetime":
+            data[name] = pd.to_datetime(values, format="ISO8601")
+        else:
+            data[name] = values.astype(PANDAS_DTYPES[dtype])
+    return pd.DataFrame(data).reset_index(drop=True)
+
+
+def read_file(path, configs=None, columns=None, chunksize=20000):
+    # {instrument: DataFrame} for one whole file
+    parts = {}
+    for frames in iter_chunks(path, configs, columns, chunksize):
+        for name, frame in frames.items():
+            parts.setdefault(name, []).append(frame)
+    return {name: concat(frames) for name, frames in parts.items()}
+
+
+def concat(frames):
+    # Category columns only stay categories when every frame agrees
+    frame = pd.concat(frames, ignore_index=True)
+    for name, dtype in frames[0].dtypes.items():
+        if str(dtype) == "category" and str(frame[name].dtype) != "category":
+            frame[name] = frame[name].astype("category")
+    return frame
+
+
+def files_between(directory, start, end):
+    # MANY_*.csv files in the dated folders from start's day to end's day
+    paths = []
+    day = start.date()
+    while day <= end.date():
+        pattern = os.path.join(directory, day.strftime("%Y-%m-%d"), "MANY_*.csv")
+        paths.extend(sorted(glob.glob(pattern)))
+        day += timedelta(days=1)
+    return paths
+
+
+def read_range(directory, start, end, configs=None, columns=None, workers=1):
+    # {instrument: DataFrame} of the rows read in [start, end)
+    paths = files_between(directory, start, end)
+    if workers > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(
+                pool.map(
+                    read_file,
+                    paths,
+                    [configs] * len(paths),
+                    [columns] * len(paths),
+                )
+            )
+    else:
+        results = [read_file(path, configs, columns) for path in paths]
+
+    parts = {}
+    for frames in results:
+        for name, frame in frames.items():
+            in_range = (frame["datetime"] >= start) & (frame["datetime"] < end)
+            parts.setdefault(name, []).append(frame[in_range])
+    return {
+        name: concat(frames).sort_values("datetime", ignore_index=True)
+        for name, frames in parts.items()
+    }
@@ -0,0 +1,233 @@
+# CSV writer thread for the MANY_*.csv log. The GUI hands over batches of
+# rows and returns straight away. The writer keeps the file open, buffers
+# rows and writes them every flush_interval seconds or flush_bytes bytes, and
+# fsyncs at most every fsync_interval seconds, on rollover and on close. A new
+# dated folder and file are started by the first row stamped on a new day, so
+# rows go to the file of the day they were recorded, not the day they were
+# written; late rows for an earlier day stay in the current file. When the
+# new file cannot be created the rows stay buffered until it can.
+import csv
+from datetime import datetime
+import io
+import os
+import queue
+import threading
+import time
+
+from cpcfnc.Histogram import Histogram
+
+
+class CSVWriter:
+    def __init__(
+        self,
+        header,
+        directory,
+        flush_interval=5.0,
+        flush_bytes=1 << 16,
+        fsync_interval=60.0,
+        max_buffer_bytes=1 << 26,
+        metrics=None,
+    ):
+        self.header = header
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.fsync_interval = fsync_interval
+        self.max_buffer_bytes = max_buffer_bytes
+        self.metrics = metrics
+
+        self.batches = queue.Queue()
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer, delimiter=",", escapechar="\\")
+        self.file = None
+        self.current_date = None
+        self.file_time = None
+        self.csv_filepath = None
+        self.time_columns = [i for i, name in enumerate(header) if name == "datetime"]
+        self.thread = threading.Thread(target=self.run, name="csv-writer")
+
+        # Counters
+        self.rows = 0
+        self.bytes_written = 0
+        self.flushes = 0
+        self.fsyncs = 0
+        self.files = 0
+        self.errors = 0
+        self.dropped_bytes = 0
+        self.last_error = ""
+        self.write_time = Histogram()
+        self.fsync_time = Histogram()
+
+    def start(self):
+        self.thread.start()
+
+    def write_rows(self, rows, records=None):
+        # Called from the GUI thread, never touches the file. records are the
+        # ones in rows, their write latency goes to the metrics
+        self.batches.put((rows, records))
+
+    def close(self, timeout=None):
+        # Write everything queued, fsync and close the file
+        self.batches.put(None)
+        self.thread.join(timeout)
+
+    def run(self):
+        next_flush = time.monotonic() + self.flush_interval
+        next_fsync = time.monotonic() + self.fsync_interval
+        while True:
+            try:
+                batch = self.batches.get(timeout=max(next_flush - time.monotonic(), 0))
+            except queue.Empty:
+                batch = ([], None)
+            if batch is None:
+                break
+            rows, records = batch
+            if rows:
+                self.write_batch(rows)
+                if records and self.metrics is not None:
+                    self.metrics.written(records)
+
+            now = time.monotonic()
+            if now >= next_flush or self.buffer.tell() >= self.flush_bytes:
+                self.flush()
+                next_flush = now + self.flush_interval
+            if now >= next_fsync:
+                self.fsync()
+                next_fsync = now + self.fsync_interval
+
+        self.flush()
+        self.fsync()
+        self.close_file()
+
+    def write_batch(self, rows):
+        # Buffer rows, starting the next day's file at the first row past
+        # midnight
+        start = 0
+        for index, row in enumerate(rows):
+            stamp = self.row_time(row)
+            if stamp is None:
+                continue
+            date = stamp.strftime("%Y-%m-%d")
+            if self.current_date is None or date > self.current_date:
+                self.writer.writerows(rows[start:index])
+                start = index
+                self.rollover(stamp)
+        self.writer.writerows(rows[start:])
+        self.rows += len(rows)
+
+    def row_time(self, row):
+        # Timestamp of the first CPC with a record in the row
+        for index in self.time_columns:
+            if index < len(row) and isinstance(row[index], datetime):
+                return row[index]
+        return None
+
+    def rollover(self, stamp):
+        # Rows buffered so far belong to the old day's file
+        if self.csv_filepath is not None:
+            self.flush()
+            self.fsync()
+            self.close_file()
+        self.current_date = stamp.strftime("%Y-%m-%d")
+        self.file_time = stamp
+        self.csv_filepath = None
+        self.open_file()
+
+    def open_file(self):
+        # Create the current day's file, rows stay buffered if that fails and
+        # the next flush tries again
+        try:
+            self.csv_filepath = self.create_file(self.file_time, self.current_date)
+        except OSError as e:
+            self.write_failed(e, self.buffer.tell())
+            return False
+        return True
+
+    def create_file(self, now, date):
+        # Create subfolder for current date
+        subfolder_path = os.path.join(self.directory, date)
+        os.makedirs(subfolder_path, exist_ok=True)
+
+        # Create CSV file and write the header
+        csv_filename = f"MANY_{now.strftime('%Y%m%d_%H%M%S')}.csv"
+        csv_filepath = os.path.join(subfolder_path, csv_filename)
+        with open(csv_filepath, mode="w", newline="") as data_file:
+            data_writer = csv.writer(data_file, delimiter=",")
+            data_writer.writerow(self.header)
+        self.files += 1
+        return csv_filepath
+
+    def flush(self):
+        # One write per flush, rows stay buffered while the drive is away
+        data = self.buffer.getvalue()
+        if not data or self.current_date is None:
+            return
+        if self.csv_filepath is None and not self.open_file():
+            return
+        start = time.perf_counter()
+        try:
+            if self.file is None:
+                self.file = open(self.csv_filepath, mode="a", newline="")
+            self.file.write(data)
+            self.file.flush()
+        except OSError as e:
+            self.write_failed(e, len(data))
+            return
+        self.write_time.add(time.perf_counter() - start)
+        self.bytes_written += len(data)
+        self.flushes += 1
+        self.buffer.seek(0)
+        self.buffer.truncate()
+
+    def write_failed(self, error, size):
+        self.errors += 1
+        self.last_error = f"{type(error).__name__}: {error}"
+        target = self.csv_filepath or f"the {self.current_date} CSV file"
+        print(f"Error writing {target}: {self.last_error}")
+        self.close_file()
+
+        # Keep the newest rows when the buffer grows past its limit
+        if size > self.max_buffer_bytes:
+            data = self.buffer.getvalue()
+            cut = data.find("\n", size - self.max_buffer_bytes) + 1
+            self.dropped_bytes += cut
+            self.buffer.seek(0)
+            self.buffer.truncate()
+            self.buffer.write(data[cut:])
+
+    def fsync(self):
+        if self.file is None:
+            return
+        start = time.perf_counter()
+        try:
+            os.fsync(self.file.fileno())
+        except OSError as e:
+            self.write_failed(e, 0)
+            return
+        self.fsync_time.add(time.perf_counter() - start)
+        self.fsyncs += 1
+
+    def close_file(self):
+        if self.file is not None:
+            try:
+                self.file.close()
+            except OSError:
+                pass
+        self.file = None
+
+    def stats(self):
+        return {
+            "file": self.csv_filepath,
+            "rows": self.rows,
+            "bytes_written": self.bytes_written,
+            "buffered_bytes": self.buffer.tell(),
+            "queued_batches": self.batches.qsize(),
+            "flushes": self.flushes,
+            "fsyncs": self.fsyncs,
+            "files": self.files,
+            "errors": self.errors,
+            "dropped_bytes": self.dropped_bytes,
+            "last_error": self.last_error,
+            "write_time": self.write_time.snapshot(),
+            "fsync_time": self.fsync_time.snapshot(),
+        }
@@ -0,0 +1,155 @@
+# Pipelined command/response polling. Instead of write, wait, write, wait, the
+# whole command batch is queued to the instrument (up to pipeline_depth
+# commands in flight) and replies are matched to commands in send order.
+# Replies carry nothing that names their command, so once one goes missing
+# every later reply of the batch would land in the wrong column. When a
+# command times out with others in flight the whole batch is thrown away,
+# late replies are drained for one timeout and the batch is polled again one
+# command at a time, like the unpipelined path. Those cycles are counted as
+# misaligned_cycles.
+import time
+
+
+class CommandPipeline:
+    def __init__(self, config, update_time=1):
+        self.commands = list(config["serial_commands"])
+        self.encoded = [(command + "\r").encode() for command in self.commands]
+        self.update_time = update_time
+
+        # Per-command timeouts fall back to serial_timeout
+        timeouts = config.get("command_timeouts") or {}
+        self.timeouts = [
+            timeouts.get(command, config["serial_timeout"])
+            for command in self.commands
+        ]
+
+        # Commands in flight at once, 0 sends the whole batch
+        self.depth = config.get("pipeline_depth") or len(self.commands)
+        self.settle_time = max(self.timeouts, default=0)
+
+        # Cycle statistics
+        self.cycles = 0
+        self.timeouts_total = 0
+        self.last_cycle_time = 0.0
+        self.max_cycle_time = 0.0
+        self.sum_cycle_time = 0.0
+        self.misaligned_cycles = 0
+        self.discarded_replies = 0
+
+    def begin(self, now):
+        self.replies = [None] * len(self.commands)
+        self.sent_times = []
+        self.received = 0
+        self.cycle_start = now
+        self.cycle_timeouts = 0
+        self.last_reply_time = now
+        self.cycle_depth = self.depth
+        self.settle_until = None
+
+    def settling(self, now):
+        return self.settle_until is not None and now < self.settle_until
+
+    def due_writes(self, now):
+        # Commands that can be sent without exceeding the pipeline depth
+        writes = []
+        if self.settling(now):
+            return writes
+        sent = len(self.sent_times)
+        while sent < len(self.commands) and sent - self.received < self.cycle_depth:
+            writes.append(self.encoded[sent])
+            self.sent_times.append(now)
+            sent += 1
+        return writes
+
+    def feed(self, records, now):
+        # Replies come back in the order the commands were sent, anything
+        # while settling or with no command outstanding is a late reply
+        for record in records:
+            if self.settling(now) or self.received >= len(self.sent_times):
+                self.discarded_replies += 1
+                continue
+            self.replies[self.received] = record
+            self.received += 1
+            self.last_reply_time = now
+
+    def expire(self, now):
+        # Give up on the oldest outstanding command once its timeout passes
+        expired = False
+        while self.received < len(self.sent_times) and now >= self.deadline():
+            if self.cycle_depth > 1 and len(self.commands) > 1:
+                self.resync(now)
+                return True
+            self.replies[self.received] = ""
+            self.received += 1
+            self.cycle_timeouts += 1
+            self.last_reply_time = now
+            expired = True
+        return expired
+
+    def resync(self, now):
+        # Some reply of the batch is missing and there is no telling which,
+        # so none of them can be trusted. Poll again one command at a time
+        # once the late replies had a chance to arrive.
+        self.misaligned_cycles += 1
+        self.cycle_timeouts += 1
+        self.replies = [None] * len(self.commands)
+        self.sent_times = []
+        self.received = 0
+        self.cycle_depth = 1
+        self.settle_until = now + self.settle_time
+        self.last_reply_time = self.settle_until
+
+    def deadline(self):
+        # The instrument answers in order, so a command's timeout starts once
+        # it was sent and the previous command was answered. With nothing
+        # outstanding it is when the next command can go out.
+        index = self.received
+        if index >= len(self.sent_times):
+            return self.settle_until or self.last_reply_time
+        start = max(self.sent_times[index], self.last_reply_time)
+        return start + self.timeouts[index]
+
+    def done(self):
+        return self.received >= len(self.commands)
+
+    def finish(self, now):
+        # Record how much of the update interval this cycle used
+        cycle_time = now - self.cycle_start
+        self.cycles += 1
+        self.timeouts_total += self.cycle_timeouts
+        self.last_cycle_time = cycle_time
+        self.max_cycle_time = max(self.max_cycle_time, cycle_time)
+        self.sum_cycle_time += cycle_time
+
+        responses = []
+        for reply in self.replies:
+            responses.extend(reply.split(","))
+        return responses
+
+    def poll(self, ser, framer):
+        # Blocking driver used by the threaded CPCSerial
+        now = time.monotonic()
+        self.begin(now)
+        framer.discard(ser)
+        while not self.done():
+            writes = self.due_writes(now)
+            if writes:
+                ser.write(b"".join(writes))
+            framer.read_from(ser)
+            now = time.monotonic()
+            self.feed(framer.records(), now)
+            self.expire(now)
+        return self.finish(time.monotonic())
+
+    def stats(self):
+        mean_cycle_time = self.sum_cycle_time / self.cycles if self.cycles else 0.0
+        return {
+            "cycles": self.cycles,
+            "timeouts": self.timeouts_total,
+            "misaligned_cycles": self.misaligned_cycles,
+            "discarded_replies": self.discarded_replies,
+            "last_cycle_time": self.last_cycle_time,
+            "mean_cycle_time": mean_cycle_time,
+            "max_cycle_time": self.max_cycle_time,
+            "last_cycle_used": self.last_cycle_time / self.update_time,
+        }
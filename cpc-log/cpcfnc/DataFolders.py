@@ -0,0 +1,11 @@
+# Layout of the per-instrument files under data_dir, shared by the Parquet
+# logger and the rollups without loading pyarrow:
+#   data_dir/YYYY-MM-DD/<instrument>/
+import re
+
+DATE_FOLDER = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def instrument_folder(name):
+    # CPC names become folder and file names
+    return re.sub(r"[^\w.-]", "_", name.strip()) or "CPC"
@@ -0,0 +1,61 @@
+# Fixed size, log spaced histogram for timing statistics. Adding a value is a
+# log and a list increment, so it is cheap enough for per-record use.
+import math
+
+
+class Histogram:
+    def __init__(self, min_value=1e-6, max_value=100.0, buckets_per_octave=4):
+        self.min_value = min_value
+        self.scale = buckets_per_octave
+        self.size = int(math.log2(max_value / min_value) * buckets_per_octave) + 2
+        self.counts = [0] * self.size
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        # Bucket 0 holds everything at or below min_value
+        if value <= self.min_value:
+            index = 0
+        else:
+            index = int(math.log2(value / self.min_value) * self.scale) + 1
+            if index >= self.size:
+                index = self.size - 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def upper_bound(self, index):
+        if index == 0:
+            return self.min_value
+        return self.min_value * 2 ** (index / self.scale)
+
+    def percentile(self, pct):
+        # Upper edge of the bucket holding the pct-th value
+        if not self.count:
+            return 0.0
+        target = self.count * pct / 100
+        running = 0
+        for index, bucket_count in enumerate(self.counts):
+            running += bucket_count
+            if running >= target and bucket_count:
+                return min(self.upper_bound(index), self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+    def reset(self):
+        self.counts = [0] * self.size
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
@@ -0,0 +1,111 @@
+# Incremental record framing on top of a reusable receive buffer. Bytes are
+# read straight into a bytearray, complete records are decoded from memoryview
+# slices and partial records stay in the buffer until the rest arrives.
+# A capture callback, e.g. RawLog, is handed each raw record before decoding,
+# and the bytes discard() drops, so late replies still end up in the capture.
+
+
+class LineFramer:
+    def __init__(self, size=4096, terminator=b"\n", max_size=1 << 20):
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.terminator = terminator
+        self.max_size = max_size
+        self.capture = None
+
+        # Valid data lives in buffer[start:end]
+        self.start = 0
+        self.end = 0
+
+        # Counters for syscalls and throughput
+        self.reads = 0
+        self.bytes_read = 0
+        self.records_out = 0
+        self.overflows = 0
+        self.discarded = 0
+
+    def reserve(self, size):
+        # Make room for size more bytes, compacting before growing
+        if self.end + size <= len(self.buffer):
+            return
+        if self.start:
+            remaining = self.end - self.start
+            self.buffer[:remaining] = self.buffer[self.start : self.end]
+            self.start = 0
+            self.end = remaining
+        if self.end + size > len(self.buffer):
+            if self.end + size > self.max_size:
+                # A record this long is line noise, drop it
+                self.overflows += 1
+                self.start = self.end = 0
+                size = min(size, self.max_size)
+            new_size = len(self.buffer)
+            while new_size < self.end + size:
+                new_size *= 2
+            self.view.release()
+            self.buffer.extend(bytes(new_size - len(self.buffer)))
+            self.view = memoryview(self.buffer)
+
+    def feed(self, data):
+        self.reserve(len(data))
+        self.view[self.end : self.end + len(data)] = data
+        self.end += len(data)
+        self.bytes_read += len(data)
+
+    def read_from(self, ser, block=True):
+        # Read everything the port has buffered in one call. With block=True
+        # and nothing waiting, wait up to the port timeout for the first byte.
+        waiting = ser.in_waiting
+        if not waiting:
+            if not block:
+                return 0
+            waiting = 1
+        total = 0
+        while waiting:
+            self.reserve(waiting)
+            count = ser.readinto(self.view[self.end : self.end + waiting]) or 0
+            self.reads += 1
+            self.end += count
+            self.bytes_read += count
+            total += count
+            if not count:
+                break
+            waiting = ser.in_waiting
+        return total
+
+    def records(self):
+        # Split out every complete record, zero or more per call
+        found = []
+        terminator = self.terminator
+        while True:
+            index = self.buffer.find(terminator, self.start, self.end)
+            if index < 0:
+                break
+            if self.capture is not None:
+                self.capture(self.view[self.start : index])
+            record = str(self.view[self.start : index], "ascii", "replace")
+            found.append(record.rstrip())
+            self.start = index + len(terminator)
+        if self.start == self.end:
+            self.start = self.end = 0
+        self.records_out += len(found)
+        return found
+
+    def discard(self, ser=None):
+        # Drop buffered bytes, e.g. a late reply to a timed out command, and
+        # whatever ser already has waiting. The capture gets them first, one
+        # call per line and the partial line last.
+        if ser is not None:
+            self.read_from(ser, block=False)
+        if self.capture is not None:
+            start = self.start
+            while start < self.end:
+                index = self.buffer.find(self.terminator, start, self.end)
+                stop = self.end if index < 0 else index
+                self.capture(self.view[start:stop])
+                start = stop + len(self.terminator)
+        self.discarded += self.end - self.start
+        self.start = self.end = 0
+
+    def pending_bytes(self):
+        return self.end - self.start
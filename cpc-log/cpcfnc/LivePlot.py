@@ -0,0 +1,170 @@
+# Live concentration plot. Axes, labels, log scale, formatter and legend are
+# set up once and every CPC gets one scatter (and one min/max band for
+# downsampled or rollup data) that is updated in place. The x axis shows the
+# window plus a tenth of it ahead and moves in those steps, the y axis only
+# moves when the data outgrows it, so most frames restore the cached
+# background and blit the data artists; the whole figure is only drawn when
+# a limit changes, the range is switched with set_window or the window is
+# resized. Every frame's render time goes into a histogram.
+from datetime import timedelta
+import time
+
+import matplotlib.dates as mdates
+from matplotlib.patches import Polygon
+import numpy as np
+
+from cpcfnc.Histogram import Histogram
+
+# Concentrations above this are overrange and do not set the y limit
+Y_MAX_VALID = 299000
+Y_DEFAULT = 200000
+
+
+def range_label(seconds):
+    # 600 -> "10 min", 86400 -> "24 h", 604800 -> "7 d"
+    if seconds % 86400 == 0 and seconds > 86400:
+        return f"{seconds // 86400} d"
+    if seconds % 3600 == 0:
+        return f"{seconds // 3600} h"
+    if seconds % 60 == 0:
+        return f"{seconds // 60} min"
+    return f"{seconds} s"
+
+
+def band(times, lows, highs):
+    # Polygon vertices along the lows and back along the highs
+    return np.column_stack(
+        (np.concatenate((times, times[::-1])), np.concatenate((lows, highs[::-1])))
+    )
+
+
+class LivePlot:
+    def __init__(self, figure, canvas, names, window, ranges=False, budget=0.05):
+        self.figure = figure
+        self.canvas = canvas
+        self.budget = budget
+
+        self.ax = figure.add_subplot(1, 1, 1)
+        self.ax.set_xlabel("Time")
+        self.ax.set_ylabel("Particle Count, particles/cm³")
+        self.ax.set_yscale("log")
+        self.ax.xaxis_date()
+        self.ax.set_ylim([1, Y_DEFAULT * 1.1])
+        self.set_window(window)
+
+        # New tick labels copy the rotation and alignment of the first one
+        self.ax.tick_params(axis="x", labelrotation=45)
+        for label in self.ax.get_xticklabels():
+            label.set_horizontalalignment("right")
+
+        # Data artists are animated, a full draw leaves them out
+        self.points = {}
+        self.ranges = {}
+        for i, name in enumerate(names):
+            color = f"C{i % 10}"
+            self.points[name] = self.ax.scatter(
+                [], [], label=name, s=10, color=color, animated=True
+            )
+            if ranges:
+                # One band through the mins and back along the maxs, drawn
+                # as a single path however many buckets it spans
+                self.ranges[name] = self.ax.add_patch(
+                    Polygon(
+                        np.zeros((0, 2)),
+                        facecolor=color,
+                        edgecolor="none",
+                        alpha=0.3,
+                        animated=True,
+                    )
+                )
+        self.ax.legend(
+            loc="upper center", bbox_to_anchor=(0.5, 1.1), ncol=3, fancybox=True
+        )
+
+        self.background = None
+        canvas.mpl_connect("draw_event", self.on_draw)
+
+        # Counters
+        self.frames = 0
+        self.full_draws = 0
+        self.over_budget = 0
+        self.render_time = Histogram()
+
+    def set_window(self, window):
+        # Seconds shown, the next update moves the x axis and draws it all
+        self.window = window
+        self.step = window / 10
+        self.right = None
+        if window > 86400:
+            self.ax.xaxis.set_major_formatter(mdates.DateFormatter("%m-%d %H:%M"))
+        else:
+            self.ax.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M:%S"))
+
+    def artists(self):
+        return list(self.ranges.values()) + list(self.points.values())
+
+    def on_draw(self, event=None):
+        # The figure was drawn without the data, keep it as the background
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self.draw_artists()
+
+    def draw_artists(self):
+        for artist in self.artists():
+            self.ax.draw_artist(artist)
+
+    def update(self, now, series):
+        # series maps a CPC name to (times, values) or (times, values, mins,
+        # maxs) with times as matplotlib date numbers
+        start = time.perf_counter()
+        max_val = []
+        for name, data in series.items():
+            times, values = data[0], data[1]
+            self.points[name].set_offsets(np.column_stack((times, values)))
+            if len(data) > 2:
+                self.ranges[name].set_xy(band(times, data[2], data[3]))
+                values = data[3]
+            elif name in self.ranges:
+                self.ranges[name].set_xy(np.zeros((0, 2)))
+            if len(values):
+                max_val.append(np.max(values))
+
+        if self.update_limits(now, max_val) or self.background is None:
+            self.canvas.draw()
+            self.full_draws += 1
+        else:
+            self.canvas.restore_region(self.background)
+            self.draw_artists()
+            self.canvas.blit(self.figure.bbox)
+
+        elapsed = time.perf_counter() - start
+        self.render_time.add(elapsed)
+        self.frames += 1
+        if elapsed > self.budget:
+            self.over_budget += 1
+
+    def update_limits(self, now, max_val):
+        # True when an axis limit moved and the background must be redrawn
+        changed = False
+        if self.right is None or now > self.right:
+            self.right = now + timedelta(seconds=self.step)
+            self.ax.set_xlim([now - timedelta(seconds=self.window), self.right])
+            changed = True
+
+        # Same limit as before, the largest valid value plus 10%, but only
+        # moved when the data outgrows it or falls well below it
+        valid = [value for value in max_val if value <= Y_MAX_VALID]
+        top = (max(valid) if valid else Y_DEFAULT) * 1.1
+        current = self.ax.get_ylim()[1]
+        if top > current or top < current / 2:
+            self.ax.set_ylim([1, top])
+            changed = True
+        return changed
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "full_draws": self.full_draws,
+            "over_budget": self.over_budget,
+            "budget": self.budget,
+            "render_time": self.render_time.snapshot(),
+        }
@@ -0,0 +1,367 @@
+# Local live data service for viewers that should not load the acquisition
+# process. The pipeline only hands each drained batch to an inbox, the
+# dispatcher thread appends it to a per-CPC window of recent records and to
+# a short log of batches and wakes the clients. Every client runs on its own
+# server thread and picks the instruments and fields it asked for out of the
+# shared batches. A batch's fields are JSON encoded once, by the first client
+# that needs them, so publishing costs the same for one viewer or fifty.
+#   GET /instruments                                    names and fields
+#   GET /latest?cpc=Outdoor&fields=concentration        newest record
+#   GET /window?cpc=Outdoor&fields=concentration&seconds=600
+#   GET /stream?cpc=Outdoor,SADDEST&fields=concentration   server-sent events
+#   GET /stats
+#   GET /metrics                                        pipeline latency metrics
+# cpc and fields are comma separated and default to everything, datetime is
+# always included. /stream events carry the batch number as id, a client
+# that reconnects with Last-Event-ID gets the batches it missed, an id from
+# before a logger restart starts over at the new run's first batch. Web pages
+# from other origins cannot read the data unless allow_origin names theirs.
+from collections import deque
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import itertools
+import json
+import math
+import threading
+from urllib.parse import parse_qs, urlsplit
+
+
+def json_value(value):
+    # NaN and inf are not JSON, datetimes go out as ISO strings
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def encode_column(records, field):
+    return json.dumps([json_value(record[field]) for record in records])
+
+
+class Batch:
+    # One CPC's drained records, shared by every client
+    __slots__ = ("seq", "index", "records", "encoded")
+
+    def __init__(self, seq, index, records):
+        self.seq = seq
+        self.index = index
+        self.records = records
+        self.encoded = {}
+
+    def column(self, field):
+        # Encoded on first use, two clients racing only encode it twice
+        encoded = self.encoded.get(field)
+        if encoded is None:
+            encoded = self.encoded[field] = encode_column(self.records, field)
+        return encoded
+
+
+class LiveHandler(BaseHTTPRequestHandler):
+    server_version = "cpc-log"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        live = self.server.live
+        try:
+            selection = live.select(query.get("cpc"), query.get("fields"))
+        except KeyError as e:
+            self.send_json({"error": f"unknown {e.args[0]}"}, 404)
+            return
+
+        if url.path == "/stream":
+            self.stream(live, selection, query)
+        elif url.path == "/latest":
+            self.send_json(live.latest(selection))
+        elif url.path == "/window":
+            try:
+                seconds = float(query.get("seconds", [live.window])[0])
+            except ValueError:
+                self.send_json({"error": "seconds must be a number"}, 400)
+                return
+            self.send_json(live.recent_window(selection, seconds))
+        elif url.path == "/instruments":
+            self.send_json(live.instruments())
+        elif url.path == "/stats":
+            self.send_json(live.stats())
+        elif url.path == "/metrics":
+            if live.metrics is None:
+                self.send_json({"error": "metrics disabled"}, 404)
+            else:
+                self.send_json(live.metrics.status())
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_origin()
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream(self, live, selection, query):
+        # Resume after Last-Event-ID, otherwise start with the next batch
+        after = self.headers.get("Last-Event-ID") or query.get("since", [None])[0]
+        try:
+            after = int(after) if after is not None else live.seq
+        except ValueError:
+            after = live.seq
+        if after > live.seq:
+            # The id is from before a logger restart, replay the new run's
+            # backlog, a gap event says when some of it is gone already
+            after = 0
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_origin()
+        self.end_headers()
+
+        live.connect()
+        try:
+            while not live.stopping:
+                after, missed, batches = live.wait(after)
+                chunks = []
+                if missed:
+                    chunks.append(f'event: gap\ndata: {{"missed": {missed}}}\n\n')
+                for batch in batches:
+                    if batch.index in selection:
+                        message = live.message(batch, selection[batch.index])
+                        chunks.append(f"id: {batch.seq}\ndata: {message}\n\n")
+                if not batches:
+                    chunks.append(": keepalive\n\n")
+                self.wfile.write("".join(chunks).encode())
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            live.disconnect()
+
+    def send_origin(self):
+        allow_origin = self.server.live.allow_origin
+        if allow_origin:
+            self.send_header("Access-Control-Allow-Origin", allow_origin)
+            self.send_header("Vary", "Origin")
+
+    def log_message(self, format, *args):
+        # One line per request would flood the logger's console
+        pass
+
+
+class LiveServer:
+    def __init__(
+        self,
+        configs,
+        host="127.0.0.1",
+        port=8765,
+        window=600,
+        backlog=256,
+        keepalive=15.0,
+        allow_origin=None,
+    ):
+        self.names = [config["cpc_name"] for config in configs]
+        self.fields = [list(config["cpc_header"]) for config in configs]
+        self.window = window
+        self.keepalive = keepalive
+        self.allow_origin = allow_origin
+        # Metrics of the pipeline for /metrics, set by the pipeline
+        self.metrics = None
+
+        # Recent records per CPC and the last backlog batches for streams,
+        # both only changed under the condition's lock
+        self.recent = [deque() for _ in configs]
+        self.batches = deque(maxlen=backlog)
+        self.seq = 0
+        self.changed = threading.Condition()
+        self.stopping = False
+
+        # Batches published since the dispatcher last ran
+        self.inbox = deque()
+        self.pending = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="live-dispatch")
+
+        self.server = ThreadingHTTPServer((host, port), LiveHandler)
+        self.server.daemon_threads = True
+        self.server.live = self
+        self.address = self.server.server_address
+        self.server_thread = threading.Thread(
+            target=self.server.serve_forever, name="live-server", daemon=True
+        )
+
+        # Counters
+        self.published_batches = 0
+        self.published_records = 0
+        self.clients = 0
+        self.max_clients = 0
+        self.streams = 0
+        self.batches_sent = 0
+        self.gaps = 0
+
+    def start(self):
+        self.thread.start()
+        self.server_thread.start()
+
+    def publish(self, index, records):
+        # Called from the pipeline with every drained batch, no lock taken
+        self.inbox.append((index, records))
+        self.pending.set()
+
+    def close(self, timeout=5.0):
+        self.stopping = True
+        self.pending.set()
+        self.thread.join(timeout)
+        self.server.shutdown()
+        self.server.server_close()
+        self.server_thread.join(timeout)
+
+    def run(self):
+        while not self.stopping:
+            self.pending.wait()
+            self.pending.clear()
+            self.dispatch()
+        with self.changed:
+            self.changed.notify_all()
+
+    def dispatch(self):
+        if not self.inbox:
+            return
+        with self.changed:
+            while self.inbox:
+                index, records = self.inbox.popleft()
+                self.seq += 1
+                self.batches.append(Batch(self.seq, index, records))
+                self.trim(self.recent[index], records)
+                self.published_batches += 1
+                self.published_records += len(records)
+            self.changed.notify_all()
+
+    def trim(self, recent, records):
+        # Keep window seconds before the newest record
+        recent.extend(records)
+        newest = records[-1]["datetime"]
+        if newest is None:
+            return
+        cutoff = newest - timedelta(seconds=self.window)
+        while recent and (
+            recent[0]["datetime"] is None or recent[0]["datetime"] < cutoff
+        ):
+            recent.popleft()
+
+    def select(self, cpcs=None, fields=None):
+        # {CPC index: [fields]} for the comma separated query values
+        names = split(cpcs)
+        for name in names or []:
+            if name not in self.names:
+                raise KeyError(name)
+        wanted = split(fields)
+        selection = {}
+        for index, name in enumerate(self.names):
+            if names is not None and name not in names:
+                continue
+            header = self.fields[index]
+            if wanted is None:
+                selection[index] = [field for field in header if field != "cpc name"]
+            else:
+                selection[index] = ["datetime"] + [
+                    field
+                    for field in wanted
+                    if field in header and field != "datetime"
+                ]
+        return selection
+
+    def wait(self, after):
+        # (newest seq, batches lost from the backlog, batches after after),
+        # waits up to keepalive seconds for a new one
+        with self.changed:
+            if self.seq <= after and not self.stopping:
+                self.changed.wait(self.keepalive)
+            if self.seq <= after or not self.batches:
+                return self.seq, 0, []
+            first = self.batches[0].seq
+            missed = max(0, first - after - 1)
+            batches = list(
+                itertools.islice(self.batches, max(0, after + 1 - first), None)
+            )
+            if missed:
+                self.gaps += 1
+            self.batches_sent += len(batches)
+            return self.seq, missed, batches
+
+    def message(self, batch, fields):
+        # JSON object built from the batch's encoded columns
+        parts = [
+            f'"seq": {batch.seq}',
+            f'"cpc": {json.dumps(self.names[batch.index])}',
+        ]
+        for field in fields:
+            parts.append(f"{json.dumps(field)}: {batch.column(field)}")
+        return "{" + ", ".join(parts) + "}"
+
+    def latest(self, selection):
+        with self.changed:
+            newest = {
+                index: self.recent[index][-1]
+                for index in selection
+                if self.recent[index]
+            }
+        return {
+            self.names[index]: {
+                field: json_value(record[field]) for field in selection[index]
+            }
+            for index, record in newest.items()
+        }
+
+    def recent_window(self, selection, seconds):
+        # Columns of every record in the last seconds before each CPC's newest
+        window = {}
+        for index, fields in selection.items():
+            with self.changed:
+                records = list(self.recent[index])
+            if records and records[-1]["datetime"] is not None:
+                start = records[-1]["datetime"] - timedelta(seconds=seconds)
+                records = [
+                    record
+                    for record in records
+                    if record["datetime"] is not None and record["datetime"] >= start
+                ]
+            window[self.names[index]] = {
+                field: [json_value(record[field]) for record in records]
+                for field in fields
+            }
+        return window
+
+    def instruments(self):
+        return {name: fields for name, fields in zip(self.names, self.fields)}
+
+    def connect(self):
+        with self.changed:
+            self.clients += 1
+            self.streams += 1
+            self.max_clients = max(self.max_clients, self.clients)
+
+    def disconnect(self):
+        with self.changed:
+            self.clients -= 1
+
+    def stats(self):
+        return {
+            "address": f"{self.address[0]}:{self.address[1]}",
+            "seq": self.seq,
+            "published_batches": self.published_batches,
+            "published_records": self.published_records,
+            "clients": self.clients,
+            "max_clients": self.max_clients,
+            "streams": self.streams,
+            "batches_sent": self.batches_sent,
+            "gaps": self.gaps,
+        }
+
+
+def split(values):
+    # parse_qs lists of comma separated names, None when not given
+    if not values:
+        return None
+    return [name for value in values for name in value.split(",") if name]
@@ -0,0 +1,144 @@
+# Per-stage latency of the records going through the logging pipeline.
+# Records carry the perf_counter time their line was read, put on the queue
+# and drained by check_queue (read_time, put_time, get_time), and each stage
+# adds the time since the one before it to a histogram per CPC:
+#   parse  serial read -> parsed record, ready to queue
+#   put    time spent in the queue put, backpressure from a full queue
+#   queue  put -> drained by check_queue
+#   write  drained -> written to the CSV buffer by the writer thread, which
+#          includes the row_lateness a bin waits for late CPCs
+#   plot   drained -> first plot frame that shows it (GUI only)
+#   total  serial read -> CSV buffer
+# A histogram add is about 1 us, every other cost is per batch. Histograms
+# are rolled every interval seconds: the last complete interval is what
+# status() reports and what goes to the metrics file as one JSON line,
+# together with the error, timeout, reconnect and drop totals since start.
+# A roll swaps fresh histograms into each CPC's stage dict under the lock
+# and snapshots the old ones, so the reading threads keep adding without
+# locking and never hit a histogram that is being reset. The file is moved
+# to metrics.jsonl.1 once it reaches max_bytes, replacing the one before.
+from datetime import datetime
+import json
+import os
+import threading
+import time
+
+from cpcfnc.Histogram import Histogram
+
+STAGES = ("parse", "put", "queue", "write", "plot", "total")
+
+
+class Metrics:
+    def __init__(self, names, path=None, interval=60.0, max_bytes=10_000_000):
+        self.names = list(names)
+        self.path = path
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.histograms = {
+            name: {stage: Histogram() for stage in STAGES} for name in self.names
+        }
+        self.timeouts = {name: 0 for name in self.names}
+
+        self.started = time.time()
+        self.next_roll = time.monotonic() + interval
+        self.last = None
+        self.rolls = 0
+        self.errors = 0
+        self.last_error = None
+
+    def stages(self, name):
+        # The histograms of one CPC, kept by the thread that reads it. The
+        # dict stays the same, look the stage up for every add
+        return self.histograms[name]
+
+    def timeout(self, name, count=1):
+        with self.lock:
+            self.timeouts[name] += count
+
+    def drained(self, name, records):
+        # Called by check_queue right after draining one CPC's queue
+        get_time = time.perf_counter()
+        queue_time = self.histograms[name]["queue"]
+        for record in records:
+            record.get_time = get_time
+            if record.put_time is not None:
+                queue_time.add(get_time - record.put_time)
+
+    def written(self, records):
+        # Called by the writer thread once the rows of records are buffered
+        now = time.perf_counter()
+        for record in records:
+            stages = self.histograms.get(record.schema.name)
+            if stages is None:
+                continue
+            if record.get_time is not None:
+                stages["write"].add(now - record.get_time)
+            if record.read_time is not None:
+                stages["total"].add(now - record.read_time)
+
+    def plotted(self, name, get_time):
+        self.histograms[name]["plot"].add(time.perf_counter() - get_time)
+
+    def due(self, now=None):
+        return (now or time.monotonic()) >= self.next_roll
+
+    def roll(self, counters=None, extra=None):
+        # Close the interval: swap in new histograms, snapshot the old ones,
+        # merge in the counters of the other parts ({name: {counter: value}})
+        # and append the result to the metrics file
+        now = time.time()
+        self.next_roll = time.monotonic() + self.interval
+        with self.lock:
+            closed = {}
+            for name in self.names:
+                stages = self.histograms[name]
+                closed[name] = dict(stages)
+                for stage in STAGES:
+                    stages[stage] = Histogram()
+            timeouts = dict(self.timeouts)
+        instruments = {}
+        for name in self.names:
+            stages = {
+                stage: histogram.snapshot()
+                for stage, histogram in closed[name].items()
+            }
+            counts = {"timeouts": timeouts[name]}
+            counts.update((counters or {}).get(name, {}))
+            instruments[name] = {"stages": stages, "counters": counts}
+        self.last = {
+            "time": datetime.fromtimestamp(now).isoformat(timespec="seconds"),
+            "interval": now - self.started,
+            "instruments": instruments,
+        }
+        self.last.update(extra or {})
+        self.started = now
+        self.rolls += 1
+        if self.path:
+            self.append(self.last)
+        return self.last
+
+    def append(self, snapshot):
+        try:
+            if self.max_bytes and os.path.getsize(self.path) >= self.max_bytes:
+                os.replace(self.path, self.path + ".1")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Could not roll over {self.path}: {e}")
+        try:
+            with open(self.path, "a", encoding="utf-8") as metrics_file:
+                metrics_file.write(json.dumps(snapshot) + "\n")
+        except OSError as e:
+            self.errors += 1
+            self.last_error = str(e)
+            print(f"Error writing {self.path}: {e}")
+
+    def status(self):
+        return {
+            "interval": self.interval,
+            "rolls": self.rolls,
+            "file": self.path,
+            "file_errors": self.errors,
+            "last": self.last,
+        }
@@ -0,0 +1,361 @@
+# Optional columnar log next to the CSV file, needs pyarrow. Each CPC's typed
+# records are appended as Arrow record batches to
+#   data_dir/YYYY-MM-DD/<instrument>/<instrument>_<start time>.arrows
+# while the logger runs. An Arrow IPC stream stays readable up to its last
+# complete batch, so nothing but the last flush is lost if the program dies.
+# When a CPC's records move on to the next day or the logger closes, the
+# stream is rewritten as a Parquet file with large row groups (written to a
+# .tmp file, fsynced and renamed) and the stream is removed. Streams left
+# behind by a crash are finalised by recover() when the logger starts, only
+# for this logger's CPCs and only once nobody has written them for a while.
+# A batch that fails to append is cut off its stream again, and the days of
+# a flush that made it to disk are not appended twice on the retry.
+from datetime import datetime, timedelta
+import os
+import time
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from cpcfnc.DataFolders import DATE_FOLDER, instrument_folder
+from cpcfnc.Histogram import Histogram
+from cpcfnc.RecordSchema import RecordSchema
+from cpcfnc.StoreThread import StoreThread
+
+STREAM_SUFFIX = ".arrows"
+CLAIMED_SUFFIX = ".recovering"
+PARQUET_SUFFIX = ".parquet"
+
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError("Parquet logging needs pyarrow: pip install pyarrow")
+
+
+def arrow_schema(schema):
+    types = {
+        "float": pa.float64(),
+        "int": pa.int64(),
+        "str": pa.string(),
+        "datetime": pa.timestamp("us"),
+    }
+    return pa.schema(
+        [(field, types[dtype]) for field, dtype in zip(schema.fields, schema.dtypes)]
+    )
+
+
+def record_batch(schema, arrow_schema, records):
+    # Typed records to one column per field
+    columns = [
+        [getattr(record, attr) for record in records] for attr in schema.attr_names
+    ]
+    return pa.RecordBatch.from_arrays(
+        [
+            pa.array(values, type=field.type)
+            for values, field in zip(columns, arrow_schema)
+        ],
+        schema=arrow_schema,
+    )
+
+
+def read_stream(path):
+    # Every complete batch of an Arrow stream, a batch cut off by a crash is
+    # dropped. None when not even the schema made it to disk.
+    with open(path, "rb") as stream_file:
+        try:
+            reader = pa.ipc.open_stream(stream_file)
+        except (pa.ArrowInvalid, OSError):
+            return None
+        batches = []
+        while True:
+            try:
+                batches.append(reader.read_next_batch())
+            except StopIteration:
+                break
+            except (pa.ArrowInvalid, OSError):
+                break
+        return pa.Table.from_batches(batches, schema=reader.schema)
+
+
+def finalize_stream(path, row_group_size=100000, compression="zstd", final_path=None):
+    # Rewrite a closed stream as Parquet, the rename is the commit point
+    table = read_stream(path)
+    if final_path is None:
+        final_path = path[: -len(STREAM_SUFFIX)] + PARQUET_SUFFIX
+    if table is not None and table.num_rows:
+        tmp_path = final_path + ".tmp"
+        pq.write_table(
+            table, tmp_path, row_group_size=row_group_size, compression=compression
+        )
+        with open(tmp_path, "rb") as tmp_file:
+            os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, final_path)
+    else:
+        final_path = None
+    os.remove(path)
+    return final_path
+
+
+def recover(directory, folders, row_group_size=100000, compression="zstd", min_age=60):
+    # Finalise the streams a crashed logger of these instrument folders left
+    # behind, returns the new files. Files written in the last min_age
+    # seconds may belong to another running logger and are left alone.
+    recovered = []
+    if not os.path.isdir(directory):
+        return recovered
+    now = time.time()
+    for date in sorted(os.listdir(directory)):
+        if not DATE_FOLDER.match(date):
+            continue
+        for folder in folders:
+            instrument_path = os.path.join(directory, date, folder)
+            if not os.path.isdir(instrument_path):
+                continue
+            for name in os.listdir(instrument_path):
+                path = os.path.join(instrument_path, name)
+                if now - os.path.getmtime(path) < min_age:
+                    continue
+                if name.endswith(PARQUET_SUFFIX + ".tmp"):
+                    os.remove(path)
+                elif name.endswith(STREAM_SUFFIX) or name.endswith(CLAIMED_SUFFIX):
+                    final_path = recover_stream(path, row_group_size, compression)
+                    if final_path is not None:
+                        recovered.append(final_path)
+    return recovered
+
+
+def recover_stream(path, row_group_size, compression):
+    # Claim the stream by renaming it first. A stream another process still
+    # has open cannot be renamed on Windows and is skipped.
+    if path.endswith(STREAM_SUFFIX):
+        claimed = path + CLAIMED_SUFFIX
+        try:
+            os.replace(path, claimed)
+        except OSError:
+            return None
+    else:
+        claimed = path
+        path = path[: -len(CLAIMED_SUFFIX)]
+    print(f"Recovering {path}")
+    final_path = path[: -len(STREAM_SUFFIX)] + PARQUET_SUFFIX
+    return finalize_stream(claimed, row_group_size, compression, final_path)
+
+
+def read_range(directory, instrument, start, end, columns=None):
+    # Load [start, end) for one CPC from the Parquet files and any stream
+    # that is still being written, only the requested columns are read
+    require_pyarrow()
+    folder = instrument_folder(instrument)
+    if columns is not None:
+        columns = ["datetime"] + [c for c in columns if c != "datetime"]
+    start = pa.scalar(start, pa.timestamp("us"))
+    end = pa.scalar(end, pa.timestamp("us"))
+
+    tables = []
+    day = start.as_py().date()
+    while day <= end.as_py().date():
+        instrument_path = os.path.join(directory, day.strftime("%Y-%m-%d"), folder)
+        day += timedelta(days=1)
+        if not os.path.isdir(instrument_path):
+            continue
+        for name in sorted(os.listdir(instrument_path)):
+            path = os.path.join(instrument_path, name)
+            if name.endswith(PARQUET_SUFFIX):
+                # Row group statistics skip the groups outside the range
+                tables.append(
+                    pq.read_table(
+                        path,
+                        columns=columns,
+                        filters=[("datetime", ">=", start), ("datetime", "<", end)],
+                    )
+                )
+            elif name.endswith(STREAM_SUFFIX):
+                table = read_stream(path)
+                if table is None:
+                    continue
+                if columns is not None:
+                    table = table.select(columns)
+                mask = pc.and_(
+                    pc.greater_equal(table["datetime"], start),
+                    pc.less(table["datetime"], end),
+                )
+                tables.append(table.filter(mask))
+
+    if not tables:
+        return pa.table({})
+    return pa.concat_tables(tables).sort_by("datetime")
+
+
+class OpenStream:
+    # One Arrow stream being appended to
+    def __init__(self, path, schema):
+        self.path = path
+        self.file = open(path, "wb")
+        self.writer = pa.ipc.new_stream(self.file, schema)
+        self.rows = 0
+
+    def write(self, batch):
+        # All or nothing: a batch that did not make it to disk is cut off
+        # again, so the retry does not leave it in the stream twice
+        size = self.file.tell()
+        try:
+            self.writer.write_batch(batch)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        except OSError:
+            try:
+                os.truncate(self.path, size)
+            except OSError:
+                pass
+            raise
+        self.rows += batch.num_rows
+
+    def close(self):
+        try:
+            self.writer.close()
+        finally:
+            self.file.close()
+
+
+class ParquetLogger(StoreThread):
+    def __init__(
+        self,
+        configs,
+        directory,
+        flush_interval=10.0,
+        row_group_size=100000,
+        compression="zstd",
+    ):
+        require_pyarrow()
+        super().__init__(len(configs), flush_interval, "parquet-logger", "Parquet log")
+        self.directory = directory
+        self.row_group_size = row_group_size
+        self.compression = compression
+
+        self.schemas = [RecordSchema(config) for config in configs]
+        self.arrow_schemas = [arrow_schema(schema) for schema in self.schemas]
+        self.folders = [instrument_folder(schema.name) for schema in self.schemas]
+
+        # Open streams, keyed by (CPC index, date)
+        self.streams = {}
+
+        # Counters
+        self.batches_written = 0
+        self.files = 0
+        self.recovered = 0
+        self.flush_time = Histogram()
+        self.finalize_time = Histogram()
+
+    def setup(self):
+        try:
+            self.recovered += len(
+                recover(
+                    self.directory,
+                    self.folders,
+                    self.row_group_size,
+                    self.compression,
+                    min_age=max(60, 3 * self.flush_interval),
+                )
+            )
+        except OSError as e:
+            self.failed(e)
+
+    def finish(self):
+        # Turn every open stream into Parquet
+        for key in list(self.streams):
+            self.finalize(key)
+
+    def flush(self):
+        start = time.perf_counter()
+        for index, records in enumerate(self.pending):
+            if not records:
+                continue
+            try:
+                self.append(index, records)
+            except OSError as e:
+                # Records stay pending and the stream is reopened next flush
+                self.failed(e)
+                self.drop_streams(index)
+                continue
+            except pa.ArrowException as e:
+                # Records that do not fit the schema would fail every time
+                self.failed(e)
+                self.drop_pending(index)
+                continue
+            self.pending[index] = []
+        self.flush_time.add(time.perf_counter() - start)
+
+    def append(self, index, records):
+        # Records are partitioned by the day they were read on. Each day is
+        # taken off pending once its batch is on disk, a failure part way
+        # through only leaves the days that were not written.
+        days = {}
+        for record in records:
+            day = (record["datetime"] or datetime.now()).strftime("%Y-%m-%d")
+            days.setdefault(day, []).append(record)
+        remaining = sorted(days)
+        for day in sorted(days):
+            stream = self.stream_for(index, day)
+            stream.write(self.record_batch(index, days[day]))
+            self.batches_written += 1
+            remaining.remove(day)
+            self.pending[index] = [r for d in remaining for r in days[d]]
+
+        # Earlier days of this CPC are complete
+        last_day = max(days)
+        for key in list(self.streams):
+            if key[0] == index and key[1] < last_day:
+                self.finalize(key)
+
+    def record_batch(self, index, records):
+        return record_batch(self.schemas[index], self.arrow_schemas[index], records)
+
+    def stream_for(self, index, day):
+        key = (index, day)
+        stream = self.streams.get(key)
+        if stream is None:
+            folder = os.path.join(self.directory, day, self.folders[index])
+            os.makedirs(folder, exist_ok=True)
+            name = f"{self.folders[index]}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            path = os.path.join(folder, name + STREAM_SUFFIX)
+            stream = self.streams[key] = OpenStream(path, self.arrow_schemas[index])
+        return stream
+
+    def finalize(self, key):
+        stream = self.streams.pop(key)
+        start = time.perf_counter()
+        try:
+            stream.close()
+            finalize_stream(stream.path, self.row_group_size, self.compression)
+        except OSError as e:
+            # The stream stays on disk and is recovered on the next start
+            self.failed(e)
+            return
+        self.finalize_time.add(time.perf_counter() - start)
+        self.files += 1
+
+    def drop_streams(self, index):
+        for key in list(self.streams):
+            if key[0] == index:
+                try:
+                    self.streams.pop(key).close()
+                except OSError:
+                    pass
+
+    def stats(self):
+        stats = self.store_stats()
+        stats.update(
+            {
+                "open_streams": len(self.streams),
+                "batches": self.batches_written,
+                "files": self.files,
+                "recovered": self.recovered,
+                "flush_time": self.flush_time.snapshot(),
+                "finalize_time": self.finalize_time.snapshot(),
+            }
+        )
+        return stats
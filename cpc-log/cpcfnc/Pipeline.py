@@ -0,0 +1,372 @@
+# The logging pipeline without any GUI: config, acquisition engines, record
+# queues, the row assembler and every writer. run_many.App draws on top of
+# it and run_headless.py drives it with its own scheduler, so this module
+# and its imports must never load tkinter or matplotlib. pyarrow is only
+# imported when Parquet or rollup logging is enabled, the pty simulator
+# (termios, not on Windows) only when it is.
+import math
+import os
+import threading
+import time
+
+import yaml
+
+from cpcfnc import (
+    CPCAsync,
+    CPCReplay,
+    CPCSerial,
+    CPCShard,
+    CSVWriter,
+    Metrics,
+    RecordQueue,
+    RowAssembler,
+    SampleClock,
+    SQLiteStore,
+)
+
+
+def load_config(program_path, config_file):
+    with open(os.path.join(program_path, config_file), "r", encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+
+class Pipeline:
+    def __init__(self, config, program_path):
+        self.config = config
+        self.program_path = program_path
+
+        self.num_cpcs = self.config["num_cpcs"]
+        self.data_dir = self.config.get("data_dir") or os.getcwd()
+
+        # Select thread-per-CPC, single event loop, multi-process or replay
+        # acquisition
+        self.acquisition_mode = self.config.get("acquisition_mode", "thread")
+
+        # Replayed data is logged to its own folder, never next to real data
+        self.replay = dict(self.config.get("replay") or {})
+        self.store_dir = self.program_path
+        if self.acquisition_mode == "replay":
+            self.replay_dir = self.data_dir
+            self.data_dir = os.path.join(
+                self.program_path, self.replay.get("output_dir", "replay")
+            )
+            self.store_dir = self.data_dir
+
+        # Swap the serial ports for pty simulated CPCs when configured
+        self.simulator = None
+        if (self.config.get("simulator") or {}).get("enabled"):
+            self.start_simulator()
+
+        self.configs = [self.config[f"cpc{i+1}"] for i in range(self.num_cpcs)]
+        self.serial_ports = [config["serial_port"] for config in self.configs]
+        self.cpc_name = [config["cpc_name"] for config in self.configs]
+
+        # Threading related initializations
+        self.serial_queues = [
+            RecordQueue.make_queue(self.config) for _ in range(self.num_cpcs)
+        ]
+        self.stop_threads = threading.Event()
+
+        # One tick grid shared by every CPC and the CSV writer, CPCs with a
+        # sample_rate tick faster on the same grid
+        self.update_interval = self.config.get("update_interval", 1)  # seconds
+        self.clock = SampleClock.SampleClock(self.update_interval)
+
+        # Raw serial capture rings, kept on a local disk next to the program
+        # unless dir is absolute
+        self.raw_log = dict(self.config.get("raw_log") or {})
+        if self.raw_log.get("enabled"):
+            self.raw_log["dir"] = os.path.join(
+                self.program_path, self.raw_log.get("dir", "raw")
+            )
+
+        # Optional per-stage latency histograms and counters, rolled into
+        # metrics_file every metrics_interval seconds
+        self.metrics = None
+        if self.config.get("metrics_enabled"):
+            metrics_file = self.config.get("metrics_file", "metrics.jsonl")
+            if metrics_file:
+                metrics_file = os.path.join(self.store_dir, metrics_file)
+            self.metrics = Metrics.Metrics(
+                self.cpc_name,
+                path=metrics_file or None,
+                interval=self.config.get("metrics_interval", 60.0),
+                max_bytes=int(self.config.get("metrics_file_max_mb", 10) * 1_000_000),
+            )
+
+        self.cpcs = self.create_engines()
+
+        # Called with (CPC index, records) for every drained batch, the GUI
+        # plots and shows them
+        self.listeners = []
+
+        # Setup CSV writer, files are created and rolled over on its thread
+        self.cpc_headers = []
+        for config in self.configs:
+            self.cpc_headers.extend(config["cpc_header"])
+        self.writer = CSVWriter.CSVWriter(
+            self.cpc_headers,
+            self.data_dir,
+            flush_interval=self.config.get("writer_flush_interval", 5.0),
+            flush_bytes=self.config.get("writer_flush_bytes", 1 << 16),
+            fsync_interval=self.config.get("writer_fsync_interval", 60.0),
+            metrics=self.metrics,
+        )
+        self.writer.start()
+
+        # One aligned CSV row per time bin, written once the bin is
+        # row_lateness seconds old so a lagging CPC does not hold up the rest
+        self.assembler = RowAssembler.RowAssembler(
+            [config["cpc_header"] for config in self.configs],
+            bin_width=self.config.get("row_bin_width", self.update_interval),
+            lateness=self.config.get("row_lateness", 1.0),
+            track=self.metrics is not None,
+        )
+
+        # Optional typed per-CPC Parquet files next to the CSV, needs pyarrow
+        self.parquet = None
+        if self.config.get("parquet_enabled"):
+            from cpcfnc import ParquetLogger
+
+            self.parquet = ParquetLogger.ParquetLogger(
+                self.configs,
+                self.data_dir,
+                flush_interval=self.config.get("parquet_flush_interval", 10.0),
+                row_group_size=self.config.get("parquet_row_group_size", 100000),
+                compression=self.config.get("parquet_compression", "zstd"),
+            )
+            self.parquet.start()
+
+        # Optional local SQLite store for time range queries (run_query.py)
+        self.store = None
+        if self.config.get("sqlite_enabled"):
+            self.store = SQLiteStore.SQLiteStore(
+                self.configs,
+                os.path.join(
+                    self.store_dir,
+                    self.config.get("sqlite_path", "cpc_log.sqlite"),
+                ),
+                flush_interval=self.config.get("sqlite_flush_interval", 2.0),
+            )
+            self.store.start()
+
+        # Optional 1 min / 1 h statistics per CPC, written as each bucket closes
+        self.rollups = None
+        if self.config.get("rollup_enabled"):
+            from cpcfnc import Rollup
+
+            self.rollups = Rollup.RollupLogger(
+                self.configs,
+                self.data_dir,
+                resolutions=self.config.get("rollup_resolutions", [60, 3600]),
+                fields=self.config.get("rollup_fields"),
+                lateness=self.config.get("rollup_lateness", 5.0),
+            )
+            self.rollups.start()
+
+        # Optional localhost HTTP server streaming the records to viewers
+        self.server = None
+        if self.config.get("server_enabled"):
+            from cpcfnc import LiveServer
+
+            try:
+                self.server = LiveServer.LiveServer(
+                    self.configs,
+                    host=self.config.get("server_host", "127.0.0.1"),
+                    port=self.config.get("server_port", 8765),
+                    window=self.config.get("server_window", 600),
+                    allow_origin=self.config.get("server_allow_origin"),
+                )
+            except OSError as e:
+                # Logging goes on without viewers when the port is taken
+                print(f"Live server not started: {e}")
+            else:
+                self.server.metrics = self.metrics
+                self.server.start()
+                self.listeners.append(self.server.publish)
+                host, port = self.server.address[:2]
+                print(f"Serving live data on http://{host}:{port}")
+
+    def start_simulator(self):
+        from cpcfnc import CPCSimulator
+
+        configs, profile = CPCSimulator.simulated_configs(self.config)
+        self.simulator = CPCSimulator.CPCSimulator(configs, profile)
+        self.num_cpcs = len(configs)
+        self.config["num_cpcs"] = self.num_cpcs
+        for i, (cpc_config, port) in enumerate(zip(configs, self.simulator.ports)):
+            cpc_config["serial_port"] = port
+            self.config[f"cpc{i+1}"] = cpc_config
+        self.simulator.start()
+
+    def create_engines(self):
+        # CPC acquisition for the configured mode, started by start()
+        if self.acquisition_mode == "async":
+            cpc = CPCAsync.CPCAsync(
+                self.configs,
+                self.serial_queues,
+                self.stop_threads,
+                poll_interval=self.config.get("async_poll_interval", 0.01),
+                test=False,
+                clock=self.clock,
+                raw_log=self.raw_log,
+                metrics=self.metrics,
+            )
+            return [cpc]
+        if self.acquisition_mode == "sharded":
+            cpc = CPCShard.CPCShard(
+                self.configs,
+                self.serial_queues,
+                self.stop_threads,
+                num_workers=self.config.get("shard_workers", 2),
+                ring_size=self.config.get("shard_ring_size", 4096),
+                poll_interval=self.config.get("async_poll_interval", 0.01),
+                raw_log=self.raw_log,
+                clock=self.clock,
+                metrics=self.metrics,
+            )
+            return [cpc]
+        if self.acquisition_mode == "replay":
+            raw_dir = self.replay.get("raw_dir")
+            cpc = CPCReplay.CPCReplay(
+                self.configs,
+                self.serial_queues,
+                self.stop_threads,
+                files=CPCReplay.expand(self.replay.get("files") or [], self.replay_dir),
+                raw_dir=os.path.join(self.program_path, raw_dir) if raw_dir else None,
+                speed=self.replay.get("speed", 1),
+                restamp=self.replay.get("restamp", True),
+            )
+            return [cpc]
+        return [
+            CPCSerial.CPCSerial(
+                config,
+                data_queue,
+                self.stop_threads,
+                None,
+                test=False,
+                clock=self.clock,
+                raw_log=self.raw_log,
+                metrics=self.metrics,
+            )
+            for config, data_queue in zip(self.configs, self.serial_queues)
+        ]
+
+    def start(self):
+        # Start threads for all CPCs
+        for cpc in self.cpcs:
+            cpc.start()
+
+    def acquisition_status(self):
+        # Connection state, uptime and reconnect counts per CPC
+        status = {}
+        for cpc in self.cpcs:
+            status.update(cpc.status())
+        return status
+
+    def next_delay(self):
+        # Run half a period after each tick, once the CPCs have reported
+        return self.clock.next_delay("writer", phase=self.update_interval / 2)
+
+    def check_queue(self):
+        self.clock.arrive("writer")
+        rows = []
+
+        # Read before draining, every record up to it is queued by then
+        bin_time = self.bin_time()
+
+        # Drain everything each CPC queued since the last check and bin it
+        # by timestamp for the CSV file
+        for i in range(self.num_cpcs):
+            data_points = self.serial_queues[i].drain()
+            if not data_points:
+                continue
+            if self.metrics is not None:
+                self.metrics.drained(self.cpc_name[i], data_points)
+            for listener in self.listeners:
+                listener(i, data_points)
+
+            # Records for bins that were already written come back as rows
+            rows.extend(self.assembler.add(i, data_points))
+            if self.parquet is not None:
+                self.parquet.write_records(i, data_points)
+            if self.store is not None:
+                self.store.write_records(i, data_points)
+            if self.rollups is not None:
+                self.rollups.write_records(i, data_points)
+
+        # Write every time bin that is past the lateness window
+        if bin_time is not None:
+            rows.extend(self.assembler.emit(bin_time))
+        if rows:
+            # The writer thread buffers the batch and owns the file
+            self.writer.write_rows(rows, self.assembler.emitted_records())
+
+        if self.metrics is not None and self.metrics.due():
+            self.roll_metrics()
+
+    def bin_time(self):
+        # Time bins close on the wall clock. A replay closes them on its
+        # position, recorded timestamps would all be past the lateness
+        # window, and on everything once it finished.
+        if self.acquisition_mode != "replay":
+            return time.time()
+        replay = self.cpcs[0]
+        if replay.state in ("finished", "stopped"):
+            return math.inf
+        return replay.position
+
+    def roll_metrics(self):
+        # Close the metrics interval with the counters kept by the other parts
+        status = self.acquisition_status()
+        counters = {}
+        for name, data_queue in zip(self.cpc_name, self.serial_queues):
+            counts = {
+                key: value
+                for key, value in status.get(name, {}).items()
+                if key in ("connects", "reconnects", "failures")
+            }
+            queue_stats = data_queue.stats()
+            counts["queue_dropped"] = queue_stats["dropped"]
+            counts["queue_max_depth"] = queue_stats["max_depth"]
+            counters[name] = counts
+        writer_stats = self.writer.stats()
+        return self.metrics.roll(
+            counters,
+            {
+                "writer_errors": writer_stats["errors"],
+                "writer_dropped_bytes": writer_stats["dropped_bytes"],
+                "late_records": self.assembler.late,
+            },
+        )
+
+    def close(self, timeout=10.0):
+        # Stop acquisition, then write out everything that is still queued
+        self.stop_threads.set()
+        for cpc in self.cpcs:
+            if cpc.thread.is_alive():
+                cpc.thread.join(timeout)
+        if self.simulator is not None:
+            self.simulator.stop()
+        self.check_queue()
+        if self.acquisition_mode == "replay":
+            stats = self.cpcs[0].stats()
+            print(
+                f"Replayed {stats['records']} records in {stats['elapsed']:.1f} s, "
+                f"{stats['records_per_second']:.0f} rec/s"
+            )
+        rows = self.assembler.emit_all()
+        if rows:
+            self.writer.write_rows(rows, self.assembler.emitted_records())
+        self.writer.close()
+        if self.metrics is not None:
+            # The last, partial interval
+            self.roll_metrics()
+        if self.parquet is not None:
+            self.parquet.close()
+        if self.store is not None:
+            self.store.close()
+        if self.rollups is not None:
+            self.rollups.close()
+        if self.server is not None:
+            self.server.close()
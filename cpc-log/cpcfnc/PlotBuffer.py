@@ -0,0 +1,124 @@
+# Fixed size buffer of one CPC's plot points. Times and values are float64
+# arrays in which every point is written twice, at i and i + capacity, so
+# the newest capacity points are always one contiguous slice. A time window
+# is found with searchsorted and handed to matplotlib as a view, without
+# copying, and memory stays the same however long the logger runs.
+# MinMaxBuffer keeps the same layout for min/max downsampled long ranges.
+import math
+
+import numpy as np
+
+
+class PlotBuffer:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.times = np.full(2 * capacity, np.nan)
+        self.values = np.full(2 * capacity, np.nan)
+        self.count = 0
+
+        # Points older than the newest one would break the time order
+        self.out_of_order = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, time, value):
+        if self.count and time < self.last_time():
+            self.out_of_order += 1
+            return False
+        i = self.count % self.capacity
+        self.times[i] = self.times[i + self.capacity] = time
+        self.values[i] = self.values[i + self.capacity] = value
+        self.count += 1
+        return True
+
+    def last_time(self):
+        return self.times[(self.count - 1) % self.capacity]
+
+    def last_value(self):
+        return self.values[(self.count - 1) % self.capacity]
+
+    def set_last(self, value):
+        i = (self.count - 1) % self.capacity
+        self.values[i] = self.values[i + self.capacity] = value
+
+    def view(self):
+        # Every point held, oldest first
+        if self.count <= self.capacity:
+            return self.times[: self.count], self.values[: self.count]
+        start = self.count % self.capacity
+        end = start + self.capacity
+        return self.times[start:end], self.values[start:end]
+
+    def window(self, start, end=None):
+        # Points with start <= time (< end), O(log n)
+        times, values = self.view()
+        first = np.searchsorted(times, start, side="left")
+        last = len(times) if end is None else np.searchsorted(times, end, "left")
+        return times[first:last], values[first:last]
+
+
+class MinMaxBuffer:
+    # Plot points of one CPC for a long range, downsampled to buckets of
+    # width (in plot time units) as they arrive. Each bucket keeps its mean,
+    # min and max, so spikes survive at any zoom. Stored mirrored like
+    # PlotBuffer, the newest bucket is updated in place.
+    def __init__(self, width, capacity):
+        self.width = width
+        self.capacity = capacity
+        self.times = np.full(2 * capacity, np.nan)
+        self.means = np.full(2 * capacity, np.nan)
+        self.mins = np.full(2 * capacity, np.nan)
+        self.maxs = np.full(2 * capacity, np.nan)
+        self.count = 0
+        self.bucket = None
+        self.total = 0.0
+        self.points = 0
+        self.low = self.high = 0.0
+        self.out_of_order = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def add(self, time, value):
+        bucket = math.floor(time / self.width)
+        if self.bucket is not None and bucket < self.bucket:
+            self.out_of_order += 1
+            return False
+        if bucket != self.bucket:
+            # Points are drawn in the middle of their bucket
+            self.bucket = bucket
+            self.total = 0.0
+            self.points = 0
+            self.low = self.high = value
+            self.count += 1
+            i = (self.count - 1) % self.capacity
+            self.times[i] = self.times[i + self.capacity] = (bucket + 0.5) * self.width
+        else:
+            i = (self.count - 1) % self.capacity
+            self.low = min(self.low, value)
+            self.high = max(self.high, value)
+        self.total += value
+        self.points += 1
+        j = i + self.capacity
+        self.means[i] = self.means[j] = self.total / self.points
+        self.mins[i] = self.mins[j] = self.low
+        self.maxs[i] = self.maxs[j] = self.high
+        return True
+
+    def window(self, start, end=None):
+        # (times, means, mins, maxs) of the buckets with start <= time (< end)
+        if self.count <= self.capacity:
+            first, last = 0, self.count
+        else:
+            first = self.count % self.capacity
+            last = first + self.capacity
+        times = self.times[first:last]
+        lo = first + np.searchsorted(times, start, side="left")
+        hi = last if end is None else first + np.searchsorted(times, end, "left")
+        return (
+            self.times[lo:hi],
+            self.means[lo:hi],
+            self.mins[lo:hi],
+            self.maxs[lo:hi],
+        )
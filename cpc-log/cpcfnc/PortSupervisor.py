@@ -0,0 +1,111 @@
+# Connection supervision for one CPC port. Tracks the connect/run/backoff
+# state, decides when a port is dead or hung, spaces reconnect attempts with
+# exponential backoff and keeps uptime and reconnect counters per CPC.
+import random
+import time
+import traceback
+
+
+class PortStale(Exception):
+    pass
+
+
+class PortSupervisor:
+    def __init__(self, config):
+        self.name = config["cpc_name"]
+        self.backoff_min = config.get("reconnect_backoff_min", 1.0)
+        self.backoff_max = config.get("reconnect_backoff_max", 60.0)
+        self.stale_timeout = config.get("stale_timeout", 10.0)
+        self.restart_interval = config.get("restart_commands_interval", 0)
+
+        self.state = "connecting"
+        self.connects = 0
+        self.reconnects = 0
+        self.failures = 0
+        self.streak = 0
+        self.last_error = ""
+        self.reported = set()
+        self.connected_at = None
+        self.last_record = None
+        self.last_restart = None
+        self.uptime_total = 0.0
+
+    def connected(self, now=None):
+        now = time.monotonic() if now is None else now
+        if self.connects:
+            self.reconnects += 1
+        if self.streak:
+            print(f"Reconnected: {self.name} after {self.streak} failed attempts")
+        self.connects += 1
+        self.streak = 0
+        self.state = "running"
+        self.connected_at = now
+        self.last_record = now
+        self.last_restart = now
+
+    def record_received(self, now=None):
+        self.last_record = time.monotonic() if now is None else now
+
+    def is_stale(self, now=None):
+        # No data for stale_timeout seconds means the port is hung
+        now = time.monotonic() if now is None else now
+        if self.state != "running" or not self.stale_timeout:
+            return False
+        return now - self.last_record > self.stale_timeout
+
+    def restart_due(self, now=None):
+        # Re-send startup commands to CPCs that restart on their own
+        now = time.monotonic() if now is None else now
+        if not self.restart_interval or self.state != "running":
+            return False
+        if now - self.last_restart >= self.restart_interval:
+            self.last_restart = now
+            return True
+        return False
+
+    def failed(self, error, now=None):
+        # Returns the seconds to wait before the next connection attempt
+        now = time.monotonic() if now is None else now
+        if self.state == "running":
+            self.uptime_total += now - self.connected_at
+        self.state = "backoff"
+        self.connected_at = None
+        self.failures += 1
+        self.streak += 1
+        self.last_error = f"{type(error).__name__}: {error}"
+
+        # Full traceback once per kind of error, one line per retry after
+        if self.last_error not in self.reported:
+            self.reported.add(self.last_error)
+            print(f"Error: {self.name}")
+            print(
+                "".join(
+                    traceback.format_exception(
+                        type(error), error, error.__traceback__
+                    )
+                )
+            )
+        delay = min(self.backoff_max, self.backoff_min * 2 ** (self.streak - 1))
+        delay = delay * (0.5 + random.random() / 2)
+        print(f"Reconnecting: {self.name} in {delay:.1f} s ({self.last_error})")
+        return delay
+
+    def uptime(self, now=None):
+        now = time.monotonic() if now is None else now
+        if self.connected_at is None:
+            return self.uptime_total
+        return self.uptime_total + now - self.connected_at
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            "state": self.state,
+            "uptime": self.uptime(now),
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "seconds_since_record": (
+                now - self.last_record if self.last_record is not None else None
+            ),
+        }
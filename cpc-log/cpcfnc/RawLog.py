@@ -0,0 +1,337 @@
+# Raw serial capture. Every line a CPC sends (and every command sent to it)
+# is appended, before parsing, to a fixed size memory mapped ring file per
+# instrument together with its monotonic and wall clock time. Writes go to
+# the shared mapping, so they survive the process dying without an fsync per
+# record; only a power cut can lose what the OS has not written back yet,
+# which sync_interval bounds. The oldest records are overwritten once the
+# file is full. run_raw_decode.py re-parses a capture with any cpc_header.
+#
+# File layout: a 64 byte header, then records aligned to 8 bytes, each a
+# 32 byte record header and the raw bytes. A record is written before the
+# header's head position moves past it, and the tail moves past records
+# before they are overwritten, so readers only ever see complete records.
+from collections import deque
+import mmap
+import os
+import re
+import struct
+import time
+import zlib
+
+MAGIC = b"CPCRAW1\0"
+
+# magic, version, header size, capacity, head, tail, records
+HEADER = struct.Struct("<8sIIQQQQ")
+HEADER_SIZE = 64
+
+# length, kind, crc32, reserved, monotonic, wall
+RECORD = struct.Struct("<IIIIdd")
+WRAP = 0xFFFFFFFF
+
+# Record kinds
+RECEIVED = 0
+SENT = 1
+
+
+def aligned(size):
+    return (size + 7) & ~7
+
+
+def ring_path(directory, name):
+    # One ring file per CPC, named after the CPC
+    name = re.sub(r"[^\w.-]", "_", name.strip()) or "CPC"
+    return os.path.join(directory, name + ".ring")
+
+
+def open_for(config, settings):
+    # Ring for one CPC from the raw_log block of config.yml, None when off
+    if not settings or not settings.get("enabled"):
+        return None
+    return RawLog(
+        ring_path(settings.get("dir", "raw"), config["cpc_name"]),
+        capacity=int(settings.get("size_mb", 64) * (1 << 20)),
+        sync_interval=settings.get("sync_interval", 60.0),
+    )
+
+
+class RawLog:
+    def __init__(self, path, capacity=1 << 26, sync_interval=60.0):
+        self.path = path
+        self.sync_interval = sync_interval
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        # An existing ring keeps its size so old captures stay readable
+        existing = os.path.exists(path) and os.path.getsize(path) > HEADER_SIZE
+        self.file = open(path, "r+b" if existing else "w+b")
+        if not existing:
+            self.file.truncate(HEADER_SIZE + aligned(capacity))
+        self.map = mmap.mmap(self.file.fileno(), 0)
+
+        magic, version, _, stored_capacity, head, tail, records = HEADER.unpack_from(
+            self.map, 0
+        )
+        if magic == MAGIC:
+            self.capacity = stored_capacity
+            self.head, self.tail, self.records = head, tail, records
+        else:
+            self.capacity = len(self.map) - HEADER_SIZE
+            self.head = self.tail = self.records = 0
+            self.write_header()
+        self.last_sync = time.monotonic()
+
+        # Counters
+        self.appended = 0
+        self.bytes_appended = 0
+        self.overwritten = 0
+        self.syncs = 0
+
+    def write_header(self):
+        HEADER.pack_into(
+            self.map,
+            0,
+            MAGIC,
+            1,
+            HEADER_SIZE,
+            self.capacity,
+            self.head,
+            self.tail,
+            self.records,
+        )
+
+    def append(self, data, kind=RECEIVED, monotonic=None, wall=None):
+        data = bytes(data)
+        size = aligned(RECORD.size + len(data))
+        if size > self.capacity // 2:
+            return
+        offset = self.head % self.capacity
+
+        # Skip the end of the file when the record does not fit before it
+        skip = self.capacity - offset if offset + size > self.capacity else 0
+        self.make_room(skip + size)
+        if skip:
+            if skip >= 4:
+                struct.pack_into("<I", self.map, HEADER_SIZE + offset, WRAP)
+            self.head += skip
+            offset = 0
+
+        # Record first, then the header publishes it
+        monotonic = time.monotonic() if monotonic is None else monotonic
+        wall = time.time() if wall is None else wall
+        position = HEADER_SIZE + offset
+        RECORD.pack_into(
+            self.map, position, len(data), kind, zlib.crc32(data), 0, monotonic, wall
+        )
+        self.map[position + RECORD.size : position + RECORD.size + len(data)] = data
+        self.head += size
+        self.records += 1
+        self.write_header()
+
+        self.appended += 1
+        self.bytes_appended += len(data)
+        if self.sync_interval and monotonic - self.last_sync >= self.sync_interval:
+            self.sync()
+
+    def make_room(self, size):
+        # Move the tail past the oldest records until size bytes are free
+        while self.head + size - self.tail > self.capacity:
+            offset = self.tail % self.capacity
+            if self.capacity - offset < RECORD.size:
+                self.tail += self.capacity - offset
+                continue
+            length = struct.unpack_from("<I", self.map, HEADER_SIZE + offset)[0]
+            if length == WRAP:
+                self.tail += self.capacity - offset
+            else:
+                self.tail += aligned(RECORD.size + length)
+                self.records -= 1
+                self.overwritten += 1
+        self.write_header()
+
+    def capture(self, kind=RECEIVED):
+        # Callback for LineFramer.capture and CapturedSerial
+        return lambda data: self.append(data, kind)
+
+    def sync(self):
+        self.map.flush()
+        self.last_sync = time.monotonic()
+        self.syncs += 1
+
+    def close(self):
+        if self.map is None:
+            return
+        self.sync()
+        self.map.close()
+        self.file.close()
+        self.map = None
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "capacity": self.capacity,
+            "used": self.head - self.tail,
+            "records": self.records,
+            "appended": self.appended,
+            "bytes_appended": self.bytes_appended,
+            "overwritten": self.overwritten,
+            "syncs": self.syncs,
+        }
+
+
+def read_records(path):
+    # Yield (kind, monotonic, wall, data) from oldest to newest. A record
+    # whose checksum does not match (power cut mid write) ends the read.
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, _, _, capacity, head, tail, _ = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a raw CPC capture")
+    position = tail
+    while position < head:
+        offset = position % capacity
+        if capacity - offset < RECORD.size:
+            position += capacity - offset
+            continue
+        start = HEADER_SIZE + offset
+        length = struct.unpack_from("<I", data, start)[0]
+        if length == WRAP:
+            position += capacity - offset
+            continue
+        length, kind, crc, _, monotonic, wall = RECORD.unpack_from(data, start)
+        payload = data[start + RECORD.size : start + RECORD.size + length]
+        if len(payload) != length or zlib.crc32(payload) != crc:
+            break
+        yield kind, monotonic, wall, payload
+        position += aligned(RECORD.size + length)
+
+
+class CapturedSerial:
+    # Serial port wrapper that logs every write before sending it
+    def __init__(self, ser, raw_log):
+        self.ser = ser
+        self.raw_log = raw_log
+
+    def write(self, data):
+        self.raw_log.append(data, SENT)
+        return self.ser.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.ser, name)
+
+
+class CommandCycles:
+    # Command polled records rebuilt from a capture the way the poller built
+    # them. Replies come back in send order, so each reply goes to the oldest
+    # unanswered command. A command still unanswered after its timeout gets
+    # an empty field, replies with no command outstanding (late replies the
+    # poller discarded) are dropped. A timeout with later commands in flight
+    # made the poller throw the batch away and poll again, so it is dropped
+    # here too and the re-poll becomes the record.
+    def __init__(self, config):
+        self.commands = list(config["serial_commands"])
+        timeouts = config.get("command_timeouts") or {}
+        self.timeouts = [
+            timeouts.get(command, config["serial_timeout"])
+            for command in self.commands
+        ]
+        self.replies = None
+        self.outstanding = deque()
+        self.sent = 0
+        self.pipelined = False
+        self.last_reply = 0.0
+        self.wall = None
+
+        # Counters
+        self.dropped = 0
+        self.misaligned = 0
+
+    def send(self, command, now):
+        if self.replies is None or self.sent >= len(self.commands):
+            return
+        if command != self.commands[self.sent]:
+            return
+        self.pipelined = self.pipelined or bool(self.outstanding)
+        self.outstanding.append((self.sent, now))
+        self.sent += 1
+
+    def receive(self, line, now, wall):
+        if not self.outstanding:
+            self.dropped += 1
+            return
+        slot, _ = self.outstanding.popleft()
+        self.replies[slot] = line
+        self.last_reply = now
+        self.wall = wall
+
+    def expire(self, now):
+        # Give up on the oldest outstanding command once its timeout passed
+        while self.outstanding:
+            slot, sent = self.outstanding[0]
+            if now <= max(sent, self.last_reply) + self.timeouts[slot]:
+                return
+            if self.pipelined:
+                self.misaligned += 1
+                self.replies = None
+                self.outstanding.clear()
+                return
+            self.outstanding.popleft()
+            self.replies[slot] = ""
+            self.last_reply = now
+
+    def begin(self):
+        # Finish the open cycle, returns (responses, wall) or None
+        finished = self.finish()
+        self.replies = [None] * len(self.commands)
+        self.sent = 0
+        self.pipelined = False
+        return finished
+
+    def finish(self):
+        replies, wall = self.replies, self.wall
+        self.replies = self.wall = None
+        self.outstanding.clear()
+        if replies is None or wall is None:
+            return None
+        responses = []
+        for reply in replies:
+            responses.extend((reply or "").split(","))
+        return responses, wall
+
+
+def decode(path, config, start=None, end=None):
+    # Re-parse a capture with config's cpc_header into typed records, start
+    # and end are wall clock epoch seconds. Command polled CPCs give one
+    # record per command cycle, matched as CommandCycles describes.
+    from datetime import datetime
+
+    from cpcfnc.RecordSchema import RecordSchema
+
+    schema = RecordSchema(config)
+    cycles = CommandCycles(config) if config.get("serial_commands") else None
+    for kind, monotonic, wall, data in read_records(path):
+        if start is not None and wall < start:
+            continue
+        if end is not None and wall >= end:
+            break
+        if cycles is None:
+            if kind == RECEIVED:
+                line = str(data, "ascii", "replace").rstrip()
+                yield schema.parse(line.split(","), datetime.fromtimestamp(wall))
+            continue
+        cycles.expire(monotonic)
+        if kind == RECEIVED:
+            cycles.receive(str(data, "ascii", "replace").rstrip(), monotonic, wall)
+            continue
+
+        # A pipelined write holds several commands
+        for command in str(data, "ascii", "replace").split("\r"):
+            command = command.strip()
+            if command == cycles.commands[0]:
+                finished = cycles.begin()
+                if finished is not None:
+                    responses, last_wall = finished
+                    yield schema.parse(responses, datetime.fromtimestamp(last_wall))
+            cycles.send(command, monotonic)
+    finished = cycles.finish() if cycles is not None else None
+    if finished is not None:
+        responses, last_wall = finished
+        yield schema.parse(responses, datetime.fromtimestamp(last_wall))
@@ -0,0 +1,85 @@
+# Bounded CPC record queue with a backpressure policy and drop accounting.
+#   block       - producer waits up to block_timeout for space, then drops
+#   drop_oldest - the oldest queued record is discarded to make room
+#   latest      - the queue is coalesced down to the newest record
+import queue
+
+POLICIES = ("block", "drop_oldest", "latest")
+
+
+class RecordQueue(queue.Queue):
+    def __init__(self, maxsize=0, policy="block", block_timeout=1.0):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown queue policy: {policy}")
+        super().__init__(maxsize)
+        self.policy = policy
+        self.block_timeout = block_timeout
+
+        # Counters
+        self.puts = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+    def put(self, item, block=True, timeout=None):
+        if self.policy == "block":
+            try:
+                if timeout is None:
+                    timeout = self.block_timeout
+                super().put(item, block, timeout)
+            except queue.Full:
+                with self.mutex:
+                    self.dropped += 1
+            return
+
+        with self.not_full:
+            if self.policy == "latest":
+                self.dropped += self._qsize()
+                self.queue.clear()
+            elif self.maxsize > 0 and self._qsize() >= self.maxsize:
+                self._get()
+                self.dropped += 1
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.puts += 1
+            self.max_depth = max(self.max_depth, self._qsize())
+            self.not_empty.notify()
+
+    def _put(self, item):
+        super()._put(item)
+        if self.policy == "block":
+            self.puts += 1
+            self.max_depth = max(self.max_depth, self._qsize())
+
+    def drain(self, max_items=None):
+        # Take everything queued in one lock round trip
+        with self.mutex:
+            count = self._qsize()
+            if max_items is not None:
+                count = min(count, max_items)
+            items = [self._get() for _ in range(count)]
+            if items:
+                self.not_full.notify_all()
+            return items
+
+    def depth(self):
+        return self.qsize()
+
+    def stats(self):
+        with self.mutex:
+            return {
+                "policy": self.policy,
+                "maxsize": self.maxsize,
+                "depth": self._qsize(),
+                "max_depth": self.max_depth,
+                "puts": self.puts,
+                "dropped": self.dropped,
+            }
+
+
+def make_queue(config):
+    # Queue settings from the top level of config.yml, unbounded by default
+    return RecordQueue(
+        maxsize=config.get("queue_size", 0),
+        policy=config.get("queue_policy", "block"),
+        block_timeout=config.get("queue_block_timeout", 1.0),
+    )
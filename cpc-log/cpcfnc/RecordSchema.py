@@ -0,0 +1,269 @@
+# Typed CPC records. Each instrument's cpc_header is compiled once into a
+# __slots__ record class with a converter per field, so a serial line is
+# parsed to floats/strings at the source and consumers never re-parse it.
+# Records still behave like the old dicts (record["concentration"],
+# .keys(), .values(), .items()) for code that indexes by header name.
+# read_time, put_time and get_time are the perf_counter times a record was
+# read, queued and drained, for the pipeline metrics, None where unknown.
+# raw keeps the split text the record was parsed from, so the CSV file gets
+# numbers exactly as the instrument sent them and empty fields for missing
+# ones, like before records were typed. A concentration computed from counts
+# is written with two decimals.
+from datetime import datetime
+import keyword
+import math
+import re
+
+import numpy as np
+
+# Header fields that are text, every other field defaults to float
+DEFAULT_DTYPES = {
+    "cpc name": "str",
+    "datetime": "datetime",
+    "instrument_datetime": "str",
+    "flags": "str",
+    "flags_character": "str",
+    "serial_number": "str",
+    "ready environment": "str",
+    "liquid level": "str",
+}
+
+NAN = float("nan")
+
+
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return NAN
+
+
+def to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        try:
+            return int(float(value))
+        except (TypeError, ValueError):
+            return 0
+
+
+def to_str(value):
+    return "" if value is None else str(value)
+
+
+def format_number(value):
+    # CSV text of a number without its source text, e.g. from a ring buffer
+    if isinstance(value, float):
+        if math.isnan(value):
+            return ""
+        if value.is_integer():
+            return str(int(value))
+    return repr(value)
+
+
+def to_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+CONVERTERS = {"float": to_float, "int": to_int, "str": to_str, "datetime": to_datetime}
+MISSING = {"float": NAN, "int": 0, "str": "", "datetime": None}
+
+
+def attribute_name(field, taken):
+    # Header names contain spaces and may start with digits
+    name = re.sub(r"\W", "_", field.strip())
+    if not name or name[0].isdigit() or keyword.iskeyword(name):
+        name = "_" + name
+    while name in taken:
+        name = name + "_"
+    taken.add(name)
+    return name
+
+
+class Record:
+    __slots__ = ("raw", "read_time", "put_time", "get_time")
+    schema = None
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, self.schema.attrs[key])
+        except KeyError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        setattr(self, self.schema.attrs[key], value)
+
+    def __contains__(self, key):
+        return key in self.schema.attrs
+
+    def __iter__(self):
+        return iter(self.schema.fields)
+
+    def __len__(self):
+        return len(self.schema.fields)
+
+    def get(self, key, default=None):
+        attr = self.schema.attrs.get(key)
+        return default if attr is None else getattr(self, attr)
+
+    def keys(self):
+        return self.schema.fields
+
+    def values(self):
+        return [getattr(self, attr) for attr in self.schema.attr_names]
+
+    def csv_values(self):
+        return self.schema.csv_values(self)
+
+    def items(self):
+        return list(zip(self.schema.fields, self.values()))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self.items())})"
+
+
+class RecordSchema:
+    def __init__(self, config):
+        self.name = config["cpc_name"]
+        self.fields = list(config["cpc_header"])
+
+        # Declared dtypes override the defaults
+        dtypes = dict(DEFAULT_DTYPES)
+        dtypes.update(config.get("cpc_dtypes") or {})
+        self.dtypes = [dtypes.get(field, "float") for field in self.fields]
+        self.converters = [CONVERTERS[dtype] for dtype in self.dtypes]
+        self.missing = [MISSING[dtype] for dtype in self.dtypes]
+
+        # Attribute names must not shadow the Record methods
+        taken = {"schema", "get", "keys", "values", "items"}
+        taken.update(Record.__slots__)
+        self.attr_names = [attribute_name(field, taken) for field in self.fields]
+        self.attrs = dict(zip(self.fields, self.attr_names))
+
+        # Concentration from counts when the instrument flow is not default
+        self.default_flow = config.get("default_flow", True)
+        self.flowrate = config.get("cpc_flowrate") or 0
+        self.computed = None
+        if not self.default_flow and "1 second counts" in self.attrs:
+            self.computed = self.fields.index("concentration")
+
+        # Fields written from the raw text, indexes into the parsed values
+        self.numeric = [
+            index
+            for index, dtype in enumerate(self.dtypes)
+            if dtype in ("float", "int") and index != self.computed
+        ]
+
+        # Text fields cut by fill_row, {field: count}
+        self.str_len = 32
+        self.truncated = {}
+
+        self.record_class = type(
+            f"{re.sub(r'[^0-9A-Za-z]', '', self.name) or 'CPC'}Record",
+            (Record,),
+            {"__slots__": tuple(self.attr_names), "schema": self},
+        )
+
+    def parse(self, responses, timestamp=None, read_time=None):
+        # Fill a record from the split serial responses, at the source
+        record = self.record_class()
+        record.read_time = read_time
+        record.put_time = record.get_time = None
+        values = [self.name, timestamp or datetime.now()] + list(responses)
+        record.raw = values
+        count = len(values)
+        for index, attr in enumerate(self.attr_names):
+            if index < count:
+                value = self.converters[index](values[index])
+            else:
+                value = self.missing[index]
+            setattr(record, attr, value)
+
+        if self.computed is not None:
+            counts = record["1 second counts"]
+            try:
+                record["concentration"] = to_float(counts) / self.flowrate
+            except ZeroDivisionError:
+                record["concentration"] = NAN
+        return record
+
+    def csv_values(self, record):
+        # Typed values with numbers replaced by their source text
+        values = record.values()
+        raw = record.raw
+        if raw is None:
+            for index in self.numeric:
+                values[index] = format_number(values[index])
+        else:
+            count = len(raw)
+            for index in self.numeric:
+                values[index] = str(raw[index]) if index < count else ""
+        if self.computed is not None:
+            concentration = values[self.computed]
+            values[self.computed] = (
+                "" if math.isnan(concentration) else "{:.2f}".format(concentration)
+            )
+        return values
+
+    def empty(self, timestamp=None):
+        # Placeholder record with every field missing
+        return self.parse([], timestamp)
+
+    def numpy_dtype(self, str_len=32):
+        # Fixed width layout for preallocated structured arrays, with the
+        # read and put times for the metrics. Longer text is cut to str_len
+        # and reported once per field by fill_row.
+        self.str_len = str_len
+        fields = []
+        for field, dtype in zip(self.attr_names, self.dtypes):
+            if dtype == "float":
+                fields.append((field, "f8"))
+            elif dtype == "int":
+                fields.append((field, "i8"))
+            elif dtype == "datetime":
+                fields.append((field, "f8"))
+            else:
+                fields.append((field, f"U{str_len}"))
+        fields.extend([("read_time", "f8"), ("put_time", "f8")])
+        return np.dtype(fields)
+
+    def fill_row(self, array, index, record):
+        # Copy a record into row index of a structured array, datetimes are
+        # stored as epoch seconds
+        row = array[index]
+        for field, attr, dtype in zip(self.fields, self.attr_names, self.dtypes):
+            value = getattr(record, attr)
+            if dtype == "datetime":
+                value = value.timestamp() if value is not None else NAN
+            elif dtype == "str" and len(value) > self.str_len:
+                self.truncate(field, value)
+            row[attr] = value
+        row["read_time"] = NAN if record.read_time is None else record.read_time
+        row["put_time"] = NAN if record.put_time is None else record.put_time
+
+    def truncate(self, field, value):
+        self.truncated[field] = self.truncated.get(field, 0) + 1
+        if self.truncated[field] == 1:
+            print(
+                f"{self.name}: {field} is longer than {self.str_len} characters, "
+                f"cut to {value[: self.str_len]!r}"
+            )
+
+    def from_row(self, row):
+        record = self.record_class()
+        record.raw = record.get_time = None
+        for attr, dtype in zip(self.attr_names, self.dtypes):
+            value = row[attr].item()
+            if dtype == "datetime":
+                value = None if math.isnan(value) else datetime.fromtimestamp(value)
+            setattr(record, attr, value)
+        for attr in ("read_time", "put_time"):
+            value = row[attr].item()
+            setattr(record, attr, None if math.isnan(value) else value)
+        return record
@@ -0,0 +1,385 @@
+# Streaming rollups of the logged records. Each CPC keeps one open bucket per
+# resolution (1 min and 1 h by default) with the count, mean, min, max and
+# standard deviation of the selected fields and the count of records whose
+# flags are set. Records go into the finest resolution, every closed bucket
+# is merged into the next one, so nothing is rescanned. A bucket closes when
+# a record for a later bucket arrives, or once it is over and its CPC has
+# been quiet for lateness seconds, and is then appended as one row to
+#   data_dir/YYYY-MM-DD/<instrument>/<instrument>_1min.csv
+# Closed buckets are also kept in memory for the live plot.
+from collections import deque
+import csv
+from datetime import datetime, timedelta
+import math
+import os
+import threading
+import time
+
+from cpcfnc.DataFolders import instrument_folder
+from cpcfnc.RecordSchema import RecordSchema
+from cpcfnc.StoreThread import StoreThread
+
+STATS = ("count", "mean", "min", "max", "std")
+
+# Header fields rolled up when rollup_fields is empty
+DEFAULT_FIELDS = ("concentration", "temp", "pressure", "flow")
+
+# flags value -> whether any flag is set
+FLAG_CACHE = {}
+
+
+def resolution_label(seconds):
+    if seconds % 3600 == 0:
+        return f"{seconds // 3600}h"
+    if seconds % 60 == 0:
+        return f"{seconds // 60}min"
+    return f"{seconds}s"
+
+
+def rollup_fields(schema, fields=None):
+    # Float fields to aggregate, by default concentration, temperatures,
+    # pressures and flow
+    if fields:
+        return [field for field in fields if field in schema.attrs]
+    return [
+        field
+        for field, dtype in zip(schema.fields, schema.dtypes)
+        if dtype in ("float", "int") and any(k in field for k in DEFAULT_FIELDS)
+    ]
+
+
+def flag_set(value):
+    # Flags are hex words, anything that does not parse counts as set
+    flagged = FLAG_CACHE.get(value)
+    if flagged is None:
+        text = str(value).strip()
+        try:
+            flagged = int(text, 16) != 0 if text else False
+        except ValueError:
+            flagged = True
+        if len(FLAG_CACHE) < 4096:
+            FLAG_CACHE[value] = flagged
+    return flagged
+
+
+def rollup_path(directory, instrument, resolution, start):
+    folder = instrument_folder(instrument)
+    return os.path.join(
+        directory,
+        start.strftime("%Y-%m-%d"),
+        folder,
+        f"{folder}_{resolution_label(resolution)}.csv",
+    )
+
+
+class Bucket:
+    # Running statistics of one time bucket, Welford updates per record and
+    # Chan's formula to merge buckets
+    __slots__ = ("key", "records", "flagged", "count", "mean", "m2", "min", "max")
+
+    def __init__(self, key, width):
+        self.key = key
+        self.records = 0
+        self.flagged = 0
+        self.count = [0] * width
+        self.mean = [0.0] * width
+        self.m2 = [0.0] * width
+        self.min = [math.inf] * width
+        self.max = [-math.inf] * width
+
+    def add(self, values, flagged):
+        self.records += 1
+        self.flagged += flagged
+        count, mean, m2 = self.count, self.mean, self.m2
+        for k, value in enumerate(values):
+            if value is None or value != value:
+                continue
+            n = count[k] + 1
+            delta = value - mean[k]
+            mean[k] += delta / n
+            m2[k] += delta * (value - mean[k])
+            count[k] = n
+            if value < self.min[k]:
+                self.min[k] = value
+            if value > self.max[k]:
+                self.max[k] = value
+
+    def merge(self, other):
+        self.records += other.records
+        self.flagged += other.flagged
+        for k, nb in enumerate(other.count):
+            if not nb:
+                continue
+            na = self.count[k]
+            n = na + nb
+            delta = other.mean[k] - self.mean[k]
+            self.mean[k] += delta * nb / n
+            self.m2[k] += other.m2[k] + delta * delta * na * nb / n
+            self.count[k] = n
+            self.min[k] = min(self.min[k], other.min[k])
+            self.max[k] = max(self.max[k], other.max[k])
+
+    def std(self, k):
+        n = self.count[k]
+        return math.sqrt(self.m2[k] / (n - 1)) if n > 1 else math.nan
+
+    def row(self, start):
+        row = [start.isoformat(sep=" "), self.records, self.flagged]
+        for k, n in enumerate(self.count):
+            if n:
+                row.extend([n, self.mean[k], self.min[k], self.max[k], self.std(k)])
+            else:
+                row.extend([0, math.nan, math.nan, math.nan, math.nan])
+        return row
+
+    @classmethod
+    def from_row(cls, key, row, width):
+        # Back from a file row, m2 is rebuilt from the standard deviation
+        bucket = cls(key, width)
+        bucket.records = int(row[1])
+        bucket.flagged = int(row[2])
+        for k in range(width):
+            n, mean, low, high, std = row[3 + 5 * k : 8 + 5 * k]
+            n = int(n)
+            if not n:
+                continue
+            bucket.count[k] = n
+            bucket.mean[k] = float(mean)
+            bucket.min[k] = float(low)
+            bucket.max[k] = float(high)
+            bucket.m2[k] = float(std) ** 2 * (n - 1) if n > 1 else 0.0
+        return bucket
+
+
+def header(fields):
+    names = ["start", "records", "flagged"]
+    for field in fields:
+        names.extend(f"{field}_{stat}" for stat in STATS)
+    return names
+
+
+def read_rollups(directory, instrument, resolution, start, end):
+    # Buckets of one CPC starting in [start, end) from the rollup files,
+    # returns (column names, rows). Rows of the same bucket, written when
+    # the logger was restarted within it, are merged into one.
+    names = None
+    buckets = {}
+    day = start.date()
+    while day <= end.date():
+        path = rollup_path(directory, instrument, resolution, day)
+        day += timedelta(days=1)
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", newline="") as rollup_file:
+            reader = csv.reader(rollup_file)
+            file_names = next(reader, None)
+            if not file_names:
+                continue
+            if names is None:
+                names = file_names
+            elif file_names != names:
+                print(f"Skipping {path}, its columns changed")
+                continue
+            width = (len(names) - 3) // len(STATS)
+            for row in reader:
+                bucket_start = datetime.fromisoformat(row[0])
+                if not start <= bucket_start < end:
+                    continue
+                bucket = Bucket.from_row(bucket_start, row, width)
+                if bucket_start in buckets:
+                    buckets[bucket_start].merge(bucket)
+                else:
+                    buckets[bucket_start] = bucket
+    rows = [[key] + buckets[key].row(key)[1:] for key in sorted(buckets)]
+    return names or [], rows
+
+
+class RollupLogger(StoreThread):
+    def __init__(
+        self,
+        configs,
+        directory,
+        resolutions=(60, 3600),
+        fields=None,
+        lateness=5.0,
+        history=2000,
+    ):
+        # Buckets are closed and written every second
+        super().__init__(len(configs), 1.0, "rollup-logger", "rollups")
+        self.directory = directory
+        self.resolutions = sorted(resolutions)
+        for finer, coarser in zip(self.resolutions, self.resolutions[1:]):
+            if coarser % finer:
+                raise ValueError("Rollup resolutions must be multiples of each other")
+        self.lateness = lateness
+
+        self.schemas = [RecordSchema(config) for config in configs]
+        self.fields = [rollup_fields(schema, fields) for schema in self.schemas]
+        self.attrs = [
+            [schema.attrs[field] for field in fields]
+            for schema, fields in zip(self.schemas, self.fields)
+        ]
+        self.flag_attrs = [schema.attrs.get("flags") for schema in self.schemas]
+
+        # Open bucket and when it last changed per resolution and CPC, closed
+        # buckets as (start, bucket) for the plot
+        self.open = [[None] * len(configs) for _ in self.resolutions]
+        self.touched = [[0.0] * len(configs) for _ in self.resolutions]
+        self.history = [
+            [deque(maxlen=history) for _ in configs] for _ in self.resolutions
+        ]
+        self.history_lock = threading.Lock()
+
+        # Rows of closed buckets waiting to be written, {path: (index, rows)}
+        self.pending_rows = {}
+
+        # Counters
+        self.closed = [0] * len(self.resolutions)
+        self.late = 0
+
+    def setup(self):
+        self.load_history()
+
+    def flush(self):
+        self.advance(time.time(), time.monotonic())
+        self.write_pending()
+
+    def finish(self):
+        # Close the open buckets, partial ones included, and write them
+        for level in range(len(self.resolutions)):
+            for index in range(len(self.schemas)):
+                if self.open[level][index] is not None:
+                    self.close_bucket(level, index)
+        self.write_pending()
+
+    def add(self, index, records):
+        # Records go straight into the open buckets, nothing is kept pending
+        attrs = self.attrs[index]
+        flag_attr = self.flag_attrs[index]
+        width = len(attrs)
+        resolution = self.resolutions[0]
+        now = time.monotonic()
+        for record in records:
+            self.records += 1
+            key = math.floor(record["datetime"].timestamp() / resolution)
+            bucket = self.open[0][index]
+            if bucket is None or key > bucket.key:
+                if bucket is not None:
+                    self.close_bucket(0, index)
+                bucket = self.open[0][index] = Bucket(key, width)
+            elif key < bucket.key:
+                self.late += 1
+                continue
+            flagged = flag_attr is not None and flag_set(getattr(record, flag_attr))
+            bucket.add([getattr(record, attr) for attr in attrs], flagged)
+            self.touched[0][index] = now
+
+    def advance(self, now, monotonic):
+        # Close buckets that are over when their CPC has gone quiet
+        for level, resolution in enumerate(self.resolutions):
+            for index, bucket in enumerate(self.open[level]):
+                if bucket is None:
+                    continue
+                over = (bucket.key + 1) * resolution + self.lateness <= now
+                if over and monotonic - self.touched[level][index] >= self.lateness:
+                    self.close_bucket(level, index)
+
+    def close_bucket(self, level, index):
+        bucket = self.open[level][index]
+        self.open[level][index] = None
+        resolution = self.resolutions[level]
+        start = datetime.fromtimestamp(bucket.key * resolution)
+        self.closed[level] += 1
+        with self.history_lock:
+            self.history[level][index].append((start, bucket))
+        path = rollup_path(self.directory, self.schemas[index].name, resolution, start)
+        self.pending_rows.setdefault(path, (index, []))[1].append(bucket.row(start))
+
+        # Merge into the next resolution up
+        if level + 1 < len(self.resolutions):
+            coarser = self.resolutions[level + 1]
+            key = bucket.key * resolution // coarser
+            parent = self.open[level + 1][index]
+            if parent is not None and key > parent.key:
+                self.close_bucket(level + 1, index)
+                parent = None
+            if parent is None:
+                parent = self.open[level + 1][index] = Bucket(key, len(bucket.count))
+            if key == parent.key:
+                parent.merge(bucket)
+                self.touched[level + 1][index] = time.monotonic()
+            else:
+                self.late += bucket.records
+
+    def write_pending(self):
+        # Rows stay pending and are retried when the folder is unavailable
+        for path in list(self.pending_rows):
+            index, rows = self.pending_rows[path]
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                new_file = not os.path.exists(path)
+                with open(path, "a", newline="") as rollup_file:
+                    rollup_writer = csv.writer(rollup_file, delimiter=",")
+                    if new_file:
+                        rollup_writer.writerow(header(self.fields[index]))
+                    rollup_writer.writerows(rows)
+            except OSError as e:
+                self.failed(e, path)
+                continue
+            del self.pending_rows[path]
+
+    def load_history(self):
+        # Buckets from earlier runs so long plot windows are filled at start
+        now = datetime.now()
+        for level, resolution in enumerate(self.resolutions):
+            start = now - timedelta(seconds=resolution * self.history[level][0].maxlen)
+            for index, schema in enumerate(self.schemas):
+                try:
+                    names, rows = read_rollups(
+                        self.directory, schema.name, resolution, start, now
+                    )
+                except (OSError, ValueError) as e:
+                    print(f"Could not load rollups of {schema.name}: {e}")
+                    continue
+                if names != header(self.fields[index]):
+                    continue
+                width = len(self.fields[index])
+                with self.history_lock:
+                    for row in rows:
+                        key = math.floor(row[0].timestamp() / resolution)
+                        bucket = Bucket.from_row(key, row, width)
+                        self.history[level][index].append((row[0], bucket))
+
+    def series(self, level, index, field="concentration", start=None):
+        # (starts, means, mins, maxs) of closed buckets for the plot
+        try:
+            k = self.fields[index].index(field)
+        except ValueError:
+            return [], [], [], []
+        with self.history_lock:
+            buckets = list(self.history[level][index])
+        if start is not None:
+            buckets = [item for item in buckets if item[0] >= start]
+        buckets = [item for item in buckets if item[1].count[k]]
+        return (
+            [item[0] for item in buckets],
+            [item[1].mean[k] for item in buckets],
+            [item[1].min[k] for item in buckets],
+            [item[1].max[k] for item in buckets],
+        )
+
+    def stats(self):
+        stats = self.store_stats()
+        stats.update(
+            {
+                "resolutions": self.resolutions,
+                "closed": dict(
+                    zip(map(resolution_label, self.resolutions), self.closed)
+                ),
+                "late": self.late,
+                "pending_rows": sum(
+                    len(rows) for _, rows in self.pending_rows.values()
+                ),
+            }
+        )
+        return stats
@@ -0,0 +1,124 @@
+# Timestamp binned rows for the wide MANY_*.csv file. Records are grouped by
+# the time they were stamped at the source, bin_width seconds per bin, and a
+# bin is written once it is lateness seconds old, whether or not every CPC
+# reported. A CPC that lags only leaves gaps in its own columns. Several
+# records of one CPC in a bin (faster sample_rate, jitter) are merged into
+# consecutive rows of that bin instead of being dropped, records for a bin
+# that was already written go out in their own rows and are counted as late.
+# With track=True the records of the rows built since the last call are
+# returned by emitted_records(), for the write latency metrics.
+import math
+
+
+class RowAssembler:
+    def __init__(self, headers, bin_width=1.0, lateness=1.0, track=False):
+        self.widths = [len(header) for header in headers]
+        self.bin_width = bin_width
+        self.lateness = lateness
+        self.track = track
+        self.emitted = []
+
+        # bin number -> one list of records per CPC
+        self.bins = {}
+        self.last_emitted = None
+
+        # Counters
+        self.records = 0
+        self.rows = 0
+        self.bins_emitted = 0
+        self.late = 0
+        self.merged = 0
+        self.padded = 0
+        self.max_merged = 0
+        self.last_bin_merged = 0
+
+    def bin_of(self, record):
+        return math.floor(record["datetime"].timestamp() / self.bin_width)
+
+    def add(self, index, records):
+        # Sort the records of one CPC into their bins, late ones come back
+        # as rows straight away
+        late_rows = []
+        for record in records:
+            self.records += 1
+            record_bin = self.bin_of(record)
+            if self.last_emitted is not None and record_bin <= self.last_emitted:
+                self.late += 1
+                late_rows.extend(self.build_rows(self.one_cpc(index, record)))
+                continue
+            slots = self.bins.get(record_bin)
+            if slots is None:
+                slots = self.bins[record_bin] = [[] for _ in self.widths]
+            slots[index].append(record)
+        return late_rows
+
+    def one_cpc(self, index, record):
+        slots = [[] for _ in self.widths]
+        slots[index].append(record)
+        return slots
+
+    def emit(self, now):
+        # Rows for every bin that closed more than lateness seconds ago
+        ready = sorted(
+            b
+            for b in self.bins
+            if (b + 1) * self.bin_width + self.lateness <= now
+        )
+        rows = []
+        for record_bin in ready:
+            rows.extend(self.emit_bin(record_bin))
+        return rows
+
+    def emit_all(self):
+        # Flush every pending bin, e.g. on shutdown
+        rows = []
+        for record_bin in sorted(self.bins):
+            rows.extend(self.emit_bin(record_bin))
+        return rows
+
+    def emit_bin(self, record_bin):
+        slots = self.bins.pop(record_bin)
+        merged = sum(max(len(records) - 1, 0) for records in slots)
+        self.merged += merged
+        self.max_merged = max(self.max_merged, merged)
+        self.last_bin_merged = merged
+        self.bins_emitted += 1
+        if self.last_emitted is None or record_bin > self.last_emitted:
+            self.last_emitted = record_bin
+        return self.build_rows(slots)
+
+    def build_rows(self, slots):
+        # One row per record index, CPCs with fewer records are padded
+        rows = []
+        for k in range(max(len(records) for records in slots)):
+            row = []
+            for records, width in zip(slots, self.widths):
+                if k < len(records):
+                    row.extend(records[k].csv_values())
+                    if self.track:
+                        self.emitted.append(records[k])
+                else:
+                    row.extend([math.nan] * width)
+                    self.padded += 1
+            rows.append(row)
+        self.rows += len(rows)
+        return rows
+
+    def emitted_records(self):
+        records, self.emitted = self.emitted, []
+        return records
+
+    def stats(self):
+        return {
+            "bin_width": self.bin_width,
+            "lateness": self.lateness,
+            "pending_bins": len(self.bins),
+            "records": self.records,
+            "rows": self.rows,
+            "bins": self.bins_emitted,
+            "late": self.late,
+            "merged": self.merged,
+            "max_merged_per_bin": self.max_merged,
+            "last_bin_merged": self.last_bin_merged,
+            "padded": self.padded,
+        }
@@ -0,0 +1,230 @@
+# Local time indexed store for logged CPC data. One SQLite table per CPC with
+# the typed cpc_header columns and an index on the read time, in WAL mode so
+# queries can run while the logger writes. Inserts happen on the store's own
+# thread in one transaction per flush_interval; the GUI only queues records.
+# Keep the database on a local disk, SQLite locking does not work on synced
+# or network folders. A locked or unavailable database is retried with the
+# next flush; when rows keep failing any other way, each CPC is written on
+# its own and the rows of a CPC that still fails are dropped. CPC names
+# that map to the same table name get a numbered table of their own.
+from datetime import datetime
+import math
+import re
+import sqlite3
+import time
+
+from cpcfnc.Histogram import Histogram
+from cpcfnc.RecordSchema import RecordSchema
+from cpcfnc.StoreThread import StoreThread
+
+SQL_TYPES = {"float": "REAL", "int": "INTEGER", "str": "TEXT", "datetime": "REAL"}
+
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def table_name(name):
+    return "cpc_" + (re.sub(r"\W", "_", name.strip()) or "CPC")
+
+
+def row_values(record):
+    return [
+        value.timestamp() if isinstance(value, datetime) else value
+        for value in record.values()
+    ]
+
+
+def connect(path, readonly=False):
+    if readonly:
+        return sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+def assign_table(connection, name):
+    # The table registered for this CPC, or a new one no other CPC uses:
+    # "CPC-1" and "CPC 1" would both be cpc_CPC_1
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS instruments (name TEXT PRIMARY KEY, tab TEXT)"
+    )
+    row = connection.execute(
+        "SELECT tab FROM instruments WHERE name = ?", (name,)
+    ).fetchone()
+    if row is not None:
+        return row[0]
+    taken = {tab for (tab,) in connection.execute("SELECT tab FROM instruments")}
+    table = base = table_name(name)
+    number = 2
+    while table in taken:
+        table = f"{base}_{number}"
+        number += 1
+    return table
+
+
+def create_table(connection, schema, table):
+    # Table and time index for one CPC, columns a new firmware added to
+    # cpc_header are appended to an existing table
+    columns = [
+        f"{quote(field)} {SQL_TYPES[dtype]}"
+        for field, dtype in zip(schema.fields, schema.dtypes)
+    ]
+    connection.execute(f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(columns)})")
+    existing = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+    for field, dtype in zip(schema.fields, schema.dtypes):
+        if field not in existing:
+            connection.execute(
+                f"ALTER TABLE {table} ADD COLUMN {quote(field)} {SQL_TYPES[dtype]}"
+            )
+    connection.execute(
+        f"CREATE INDEX IF NOT EXISTS {table}_datetime ON {table} (datetime)"
+    )
+    connection.execute(
+        "INSERT OR IGNORE INTO instruments VALUES (?, ?)", (schema.name, table)
+    )
+    connection.commit()
+
+
+def instruments(path):
+    # (name, first time, last time, rows) for every CPC in the store
+    connection = connect(path, readonly=True)
+    try:
+        found = []
+        for name, table in connection.execute("SELECT name, tab FROM instruments"):
+            first, last, count = connection.execute(
+                f"SELECT min(datetime), max(datetime), count(*) FROM {table}"
+            ).fetchone()
+            found.append(
+                (
+                    name,
+                    datetime.fromtimestamp(first) if first is not None else None,
+                    datetime.fromtimestamp(last) if last is not None else None,
+                    count,
+                )
+            )
+        return found
+    finally:
+        connection.close()
+
+
+def query(path, instrument, start, end, columns=None):
+    # Rows of one CPC read in [start, end), returns (column names, rows).
+    # The datetime column always comes first and is a datetime again.
+    connection = connect(path, readonly=True)
+    try:
+        row = connection.execute(
+            "SELECT tab FROM instruments WHERE name = ?", (instrument,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(f"No CPC named {instrument} in {path}")
+        table = row[0]
+        table_info = connection.execute(f"PRAGMA table_info({table})")
+        types = {info[1]: info[2] for info in table_info}
+        if columns is None:
+            columns = [c for c in types if c != "datetime"]
+        for column in columns:
+            if column not in types:
+                raise KeyError(f"No column {column} for {instrument}")
+        names = ["datetime"] + [c for c in columns if c != "datetime"]
+        rows = connection.execute(
+            f"SELECT {', '.join(quote(c) for c in names)} FROM {table} "
+            "WHERE datetime >= ? AND datetime < ? ORDER BY datetime",
+            (start.timestamp(), end.timestamp()),
+        ).fetchall()
+    finally:
+        connection.close()
+
+    # SQLite stores NaN as NULL, text is never NULL
+    nan = math.nan
+    fromtimestamp = datetime.fromtimestamp
+    result = [
+        [fromtimestamp(row[0]), *[nan if value is None else value for value in row[1:]]]
+        for row in rows
+    ]
+    return names, result
+
+
+class SQLiteStore(StoreThread):
+    def __init__(self, configs, path, flush_interval=2.0):
+        super().__init__(len(configs), flush_interval, "sqlite-store", path)
+        self.path = path
+        self.connection = None
+        self.schemas = [RecordSchema(config) for config in configs]
+        self.inserts = []
+
+        # Counters
+        self.rows = 0
+        self.transactions = 0
+        self.commit_time = Histogram()
+
+    def setup(self):
+        # The connection belongs to this thread
+        self.connection = connect(self.path)
+        for schema in self.schemas:
+            table = assign_table(self.connection, schema.name)
+            create_table(self.connection, schema, table)
+            columns = ", ".join(quote(field) for field in schema.fields)
+            marks = ", ".join("?" * len(schema.fields))
+            self.inserts.append(f"INSERT INTO {table} ({columns}) VALUES ({marks})")
+
+    def finish(self):
+        self.connection.close()
+
+    def flush(self):
+        if not any(self.pending):
+            return
+        start = time.perf_counter()
+        try:
+            with self.connection:
+                for index, records in enumerate(self.pending):
+                    if records:
+                        self.connection.executemany(
+                            self.inserts[index], (row_values(r) for r in records)
+                        )
+        except sqlite3.Error as e:
+            # Rows stay pending and are retried with the next flush, a locked
+            # or unavailable database is an OperationalError
+            if not self.retry(e, isinstance(e, sqlite3.OperationalError)):
+                self.flush_each()
+            return
+        self.commit_time.add(time.perf_counter() - start)
+        self.transactions += 1
+        self.attempts = 0
+        self.rows += sum(len(records) for records in self.pending)
+        self.pending = [[] for _ in self.pending]
+
+    def flush_each(self):
+        # One transaction per CPC, so only the rows of a CPC that cannot be
+        # written are dropped
+        for index, records in enumerate(self.pending):
+            if not records:
+                continue
+            try:
+                with self.connection:
+                    self.connection.executemany(
+                        self.inserts[index], (row_values(r) for r in records)
+                    )
+            except sqlite3.Error as e:
+                print(
+                    f"Dropping {len(records)} rows of {self.schemas[index].name}: "
+                    f"{type(e).__name__}: {e}"
+                )
+                self.drop_pending(index)
+                continue
+            self.transactions += 1
+            self.rows += len(records)
+            self.pending[index] = []
+
+    def stats(self):
+        stats = self.store_stats()
+        stats.update(
+            {
+                "path": self.path,
+                "rows": self.rows,
+                "transactions": self.transactions,
+                "commit_time": self.commit_time.snapshot(),
+            }
+        )
+        return stats
@@ -0,0 +1,124 @@
+# Shared sampling clock. Every acquisition worker and the CSV writer wait on
+# the same monotonic tick grid, so they stay aligned instead of drifting apart
+# with their own sleep loops. Ticks fall on whole wall clock periods at start.
+# Workers sampling faster than the clock period (sample_rate) use their own
+# period on the same epoch, so a 10 Hz grid still lines up with the 1 Hz one.
+import math
+import threading
+import time
+
+from cpcfnc.Histogram import Histogram
+
+
+def sample_period(config):
+    # Seconds between samples for one CPC, None follows the clock period
+    rate = config.get("sample_rate")
+    return 1.0 / rate if rate else None
+
+
+class TickTiming:
+    # Timing statistics for one worker
+    def __init__(self, phase, period):
+        self.phase = phase
+        self.period = period
+        self.last_tick = None
+        self.scheduled_tick = None
+        self.last_start = None
+        self.ticks = 0
+        self.skipped = 0
+        self.lateness = Histogram()
+        self.jitter = Histogram()
+
+
+class SampleClock:
+    def __init__(self, period=1.0):
+        self.period = period
+        now = time.monotonic()
+        self.epoch = now - (time.time() % period)
+        self.timings = {}
+        self.lock = threading.Lock()
+
+    def timing(self, name, phase=0.0, period=None):
+        try:
+            return self.timings[name]
+        except KeyError:
+            with self.lock:
+                return self.timings.setdefault(
+                    name, TickTiming(phase, period or self.period)
+                )
+
+    def tick_time(self, tick, period=None):
+        return self.epoch + tick * (period or self.period)
+
+    def current_tick(self, now=None, period=None):
+        if now is None:
+            now = time.monotonic()
+        return math.floor((now - self.epoch) / (period or self.period))
+
+    def next_delay(self, name, phase=0.0, period=None):
+        # Seconds until this worker's next tick. A worker that fell behind
+        # runs right away on the current tick and the ticks in between are
+        # counted as skipped. Consumers pass a phase (seconds after the tick)
+        # so they run once the producers of that tick are done.
+        timing = self.timing(name, phase, period)
+        now = time.monotonic() - timing.phase
+        current = self.current_tick(now, timing.period)
+        if timing.last_tick is None:
+            next_tick = current + 1
+        else:
+            next_tick = timing.last_tick + 1
+            if current > next_tick:
+                timing.skipped += current - next_tick
+                next_tick = current
+        timing.scheduled_tick = next_tick
+        return max(self.tick_time(next_tick, timing.period) - now, 0.0)
+
+    def arrive(self, name):
+        # Record how late the worker started relative to its scheduled tick
+        timing = self.timing(name)
+        now = time.monotonic() - timing.phase
+        if timing.scheduled_tick is None:
+            timing.scheduled_tick = self.current_tick(now, timing.period)
+        scheduled = self.tick_time(timing.scheduled_tick, timing.period)
+        timing.lateness.add(now - scheduled)
+        if timing.last_start is not None:
+            expected = (timing.scheduled_tick - timing.last_tick) * timing.period
+            timing.jitter.add(abs(now - timing.last_start - expected))
+        timing.last_start = now
+        timing.last_tick = timing.scheduled_tick
+        timing.ticks += 1
+        return timing.scheduled_tick
+
+    def arrived(self, name, period=None):
+        # Event driven workers, e.g. streaming CPCs, are not woken by the
+        # clock. Their arrivals are timed against the tick they fall in,
+        # ticks without one are counted as skipped.
+        timing = self.timing(name, period=period)
+        tick = self.current_tick(time.monotonic() - timing.phase, timing.period)
+        if timing.last_tick is not None and tick > timing.last_tick + 1:
+            timing.skipped += tick - timing.last_tick - 1
+        timing.scheduled_tick = tick
+        return self.arrive(name)
+
+    def wait(self, name, stop_event=None, phase=0.0, period=None):
+        # Block until the worker's next tick, returns the tick number
+        delay = self.next_delay(name, phase, period)
+        if stop_event is not None:
+            stop_event.wait(delay)
+        else:
+            time.sleep(delay)
+        return self.arrive(name)
+
+    def stats(self, name=None):
+        names = [name] if name is not None else list(self.timings)
+        return {
+            n: {
+                "period": self.timings[n].period,
+                "ticks": self.timings[n].ticks,
+                "skipped": self.timings[n].skipped,
+                "lateness": self.timings[n].lateness.snapshot(),
+                "jitter": self.timings[n].jitter.snapshot(),
+            }
+            for n in names
+            if n in self.timings
+        }
@@ -0,0 +1,152 @@
+# Writer thread shared by the optional stores next to the CSV file, the
+# Parquet log, the SQLite store and the rollups. The GUI queues each CPC's
+# drained records with write_records and returns straight away. The thread
+# runs setup() first, hands every batch to add(), calls flush() every
+# flush_interval seconds and once more on close, then finish(). By default
+# add() keeps the records in pending, one list per CPC, for flush().
+# Errors never end the thread silently. When setup() fails the store is down:
+# the error is printed and records are dropped instead of queued. Pending
+# records are capped at max_pending per CPC, the oldest are dropped, and
+# records failing with an error that is not transient are dropped after
+# max_attempts flushes.
+import queue
+import threading
+import time
+
+
+class StoreThread:
+    def __init__(
+        self,
+        num_cpcs,
+        flush_interval,
+        name,
+        target,
+        max_pending=100000,
+        max_attempts=3,
+    ):
+        self.flush_interval = flush_interval
+        self.target = target
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.down = False
+        self.attempts = 0
+
+        self.pending = [[] for _ in range(num_cpcs)]
+        self.batches = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name=name)
+
+        # Counters
+        self.records = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_error = ""
+
+    def start(self):
+        self.thread.start()
+
+    def write_records(self, index, records):
+        # Called from the GUI thread with the typed records of one CPC
+        if self.down:
+            self.dropped += len(records)
+        elif records:
+            self.batches.put((index, records))
+
+    def close(self, timeout=None):
+        # Write what is queued and finish the store
+        self.batches.put(None)
+        self.thread.join(timeout)
+
+    def run(self):
+        try:
+            self.setup()
+        except Exception as e:
+            self.failed(e)
+            self.stop()
+            return
+
+        next_flush = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self.batches.get(timeout=max(next_flush - time.monotonic(), 0))
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+            if item:
+                self.add(*item)
+            if time.monotonic() >= next_flush:
+                self.guard(self.flush)
+                next_flush = time.monotonic() + self.flush_interval
+
+        self.guard(self.flush)
+        self.guard(self.finish)
+
+    def stop(self):
+        # The store is down, queued and future records are dropped
+        self.down = True
+        print(f"Stopped writing {self.target}, its records are dropped")
+        while True:
+            try:
+                item = self.batches.get_nowait()
+            except queue.Empty:
+                break
+            if item:
+                self.dropped += len(item[1])
+        self.drop_pending()
+
+    def guard(self, step):
+        # An unexpected error is reported and the thread goes on
+        try:
+            step()
+        except Exception as e:
+            self.failed(e)
+
+    def setup(self):
+        pass
+
+    def add(self, index, records):
+        pending = self.pending[index]
+        pending.extend(records)
+        self.records += len(records)
+        over = len(pending) - self.max_pending
+        if over > 0:
+            del pending[:over]
+            self.dropped += over
+
+    def flush(self):
+        pass
+
+    def finish(self):
+        pass
+
+    def failed(self, error, target=None):
+        self.errors += 1
+        self.last_error = f"{type(error).__name__}: {error}"
+        print(f"Error writing {target or self.target}: {self.last_error}")
+
+    def retry(self, error, transient):
+        # Count a failed flush, False once the pending records should be
+        # given up: the same kind of error that is not transient came back
+        # max_attempts flushes in a row
+        self.failed(error)
+        self.attempts = 0 if transient else self.attempts + 1
+        if self.attempts < self.max_attempts:
+            return True
+        self.attempts = 0
+        return False
+
+    def drop_pending(self, index=None):
+        indexes = range(len(self.pending)) if index is None else [index]
+        for i in indexes:
+            self.dropped += len(self.pending[i])
+            self.pending[i] = []
+
+    def store_stats(self):
+        return {
+            "down": self.down,
+            "records": self.records,
+            "pending": sum(len(records) for records in self.pending),
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
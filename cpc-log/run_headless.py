@@ -0,0 +1,73 @@
+# Log the CPCs without the GUI, for small headless field PCs. Same config,
+# acquisition modes and output files as run_many.py, but the queues are
+# checked by a plain loop on the clock grid instead of Tk callbacks, and
+# neither tkinter nor matplotlib is ever imported. SIGINT and SIGTERM stop
+# acquisition and flush every file before exiting.
+#   python run_headless.py
+#   python run_headless.py --config site.yml --status-interval 60
+import argparse
+import os
+import signal
+import threading
+import time
+
+from cpcfnc import Pipeline
+
+
+def print_status(pipeline):
+    writer = pipeline.writer.stats()
+    states = [
+        f"{name} {status.get('state', '?')}"
+        for name, status in pipeline.acquisition_status().items()
+    ]
+    print(
+        f"{time.strftime('%Y-%m-%d %H:%M:%S')} {writer['rows']} rows, "
+        f"{writer['errors']} write errors, " + ", ".join(states)
+    )
+
+    # Read to CSV latency per CPC over the last metrics interval
+    last = pipeline.metrics.last if pipeline.metrics is not None else None
+    if last:
+        totals = [
+            f"{name} p50 {1000 * m['stages']['total']['p50']:.0f} ms "
+            f"p99 {1000 * m['stages']['total']['p99']:.0f} ms, "
+            f"{m['counters']['timeouts']} timeouts"
+            for name, m in last["instruments"].items()
+        ]
+        print("  latency " + ", ".join(totals))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default="config.yml")
+    parser.add_argument(
+        "--status-interval", type=float, default=0, help="seconds, 0 is quiet"
+    )
+    args = parser.parse_args()
+
+    program_path = os.path.dirname(os.path.realpath(__file__))
+    config = Pipeline.load_config(program_path, args.config)
+    pipeline = Pipeline.Pipeline(config, program_path)
+
+    # The handlers only set the event, the loop below does the shutdown
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda signum, frame: stop.set())
+
+    pipeline.start()
+    print(f"Logging {pipeline.num_cpcs} CPCs to {pipeline.data_dir}")
+    next_status = time.monotonic() + args.status_interval
+    try:
+        # Check the queues half a period after each clock tick
+        while not stop.wait(pipeline.next_delay()):
+            pipeline.check_queue()
+            if args.status_interval and time.monotonic() >= next_status:
+                next_status += args.status_interval
+                print_status(pipeline)
+    finally:
+        print("Closing logger...")
+        pipeline.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,14 @@
-import csv
-from matplotlib.animation import FuncAnimation
+import math
 from datetime import datetime, timedelta
 import os
-import queue
-import threading
 import time
 import tkinter as tk
 from tkinter import ttk
-import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 import matplotlib.dates as mdates
 
-import numpy as np
-import yaml
-
-from cpcfnc import CPCSerial
+from cpcfnc import Histogram, LivePlot, Pipeline, PlotBuffer
 
 
 class App:
@@ -24,39 +17,28 @@ class App:
         # Load config file
         self.config_file = config_file
         self.program_path = os.path.dirname(os.path.realpath(__file__))
-        with open(
-            os.path.join(self.program_path, self.config_file),
-            "r",
-            encoding="utf-8",
-        ) as f:
-            self.config = yaml.safe_load(f)
-
-        self.num_cpcs = self.config["num_cpcs"]
-        try:
-            self.data_dir = self.config["data_dir"]
-        except KeyError:
-            self.data_dir =os.getcwd()
-
-        # Gather all serial ports into a list
-        self.serial_ports = [self.config[f"cpc{i}"]["serial_port"] for i in range(1, self.num_cpcs + 1)]
-
-        # Gather all cpc names into a list
-        self.cpc_name = [self.config[f"cpc{i}"]["cpc_name"] for i in range(1, self.num_cpcs + 1)]
-        
-        # Threading related initializations
-        self.serial_queues = [queue.Queue() for _ in range(self.num_cpcs)]
-        self.stop_threads = threading.Event()
-
-        # Initialize CPC classes, test=True when testing GUI offline
-        self.cpcs = []
-        for i in range(self.num_cpcs):
-            cpc = CPCSerial.CPCSerial(
-                self.config[f"cpc{i+1}"],
-                self.serial_queues[i],
-                self.stop_threads,
-                None, test=False
-            )
-            self.cpcs.append(cpc)
+        config = Pipeline.load_config(self.program_path, self.config_file)
+
+        # Acquisition, queues and every writer, shared with run_headless.py
+        self.pipeline = Pipeline.Pipeline(config, self.program_path)
+        self.config = self.pipeline.config
+        self.num_cpcs = self.pipeline.num_cpcs
+        self.cpc_name = self.pipeline.cpc_name
+        self.rollups = self.pipeline.rollups
+        self.update_interval = self.pipeline.update_interval
+        self.metrics = self.pipeline.metrics
+
+        # Drain time of the oldest record of each CPC not drawn yet, for the
+        # plot latency metrics
+        self.plot_pending = [None] * self.num_cpcs
+
+        # Plot points per second per CPC, faster data is decimated for display
+        # while every record still goes to the CSV file
+        self.plot_max_rate = self.config.get("plot_max_rate", 1)
+
+        # Seconds shown in the live plot, long windows are drawn from the
+        # rollups when they are enabled
+        self.plot_window = self.config.get("plot_window", 600)
 
         # Setup tkinter GUI
         self.root = root
@@ -64,25 +46,13 @@ class App:
         self.root.protocol("WM_DELETE_WINDOW", self.close)
         # Initialize the GUI components
         self.setup_layout()
-
-        # Setup CSV file
-        self.current_date = datetime.now().strftime("%Y-%m-%d")
-        self.cpc_headers = []
-        for i in range(self.num_cpcs):
-            cpc_header = self.config[f"cpc{i+1}"]["cpc_header"]
-            self.cpc_headers.extend(cpc_header)
-        self.start_time, self.csv_filepath = self.create_files(self.cpc_headers,self.data_dir)
-
-        # Constants for flow intervals
-        self.curr_time = time.monotonic()
-        self.update_interval = 1  # seconds
+        self.pipeline.listeners.append(self.show_records)
 
         # Start threads for all CPCs
-        for cpc in self.cpcs:
-            cpc.start()
+        self.pipeline.start()
         
-        # Check the queue every 1s
-        root.after(1000, self.check_queue)
+        # Check the queue on the next clock tick
+        root.after(self.next_check_ms(), self.check_queue)
 
     def setup_layout(self):
         # Create the tab control (Notebook)
@@ -95,6 +65,10 @@ class App:
         # Add tabs to the Notebook
         tab_control.add(plots_tab, text='Data & Plots')
         tab_control.add(overview_tab, text='System Overview')
+        if self.metrics is not None:
+            status_tab = ttk.Frame(tab_control)
+            tab_control.add(status_tab, text='Pipeline Status')
+            self.create_status_widgets(status_tab)
 
         # Pack to make the tabs visible
         tab_control.pack(expand=1, fill="both")
@@ -107,7 +81,6 @@ class App:
         
     def create_plots_widgets(self, frame):
         self.figure = Figure(figsize=(7, 7), dpi=100)
-        self.ax = self.figure.add_subplot(1, 1, 1)
         
         self.matplotlib_canvas = FigureCanvasTkAgg(self.figure, master=frame)
         self.canvas_widget = self.matplotlib_canvas.get_tk_widget()
@@ -115,23 +88,89 @@ class App:
         frame.columnconfigure(0, weight=1)
         frame.rowconfigure(0, weight=1)
 
-        self.ax.set_xlabel("Time")
-        self.ax.set_ylabel("Particle Count, particles/cm³")
-
-        # Initialize data structures for plotting
-        self.plot_data = {name: {'datetime': [], 'concentration': []} for name in self.cpc_name}
-        # Start the animation
-        self.ani = FuncAnimation(self.figure, self.update_plot, interval=1000, cache_frame_data=False)
+        # Ranges selectable below the plot, plot_window is shown first
+        self.plot_ranges = sorted(
+            set(self.config.get("plot_ranges", [600, 3600, 86400, 604800]))
+            | {self.plot_window}
+        )
+        self.plot_points = self.config.get("plot_points", 1000)
+
+        # Each range is drawn from the rollups when they have 100 buckets
+        # across it, from the raw points when they fit in plot_points, and
+        # otherwise from min/max buckets of range / plot_points seconds that
+        # are kept up to date as records arrive
+        self.plot_rollup_levels = {}
+        self.plot_widths = {}
+        raw_points = []
+        for seconds in self.plot_ranges:
+            level = self.rollup_level(seconds)
+            if level is not None:
+                self.plot_rollup_levels[seconds] = level
+            elif seconds * self.plot_max_rate > self.plot_points:
+                self.plot_widths[seconds] = seconds / self.plot_points / 86400
+            else:
+                raw_points.append(seconds * self.plot_max_rate)
+
+        # Fixed size point buffers per CPC, enough for the longest raw range
+        # with some slack for the points of one update
+        self.plot_capacity = int(max(raw_points or [self.plot_points]) * 1.1) + 10
+        self.plot_data = {name: PlotBuffer.PlotBuffer(self.plot_capacity) for name in self.cpc_name}
+        self.plot_downsampled = {name: self.new_plot_levels() for name in self.cpc_name}
+        self.plot_bins = {}
+
+        # Artists are created once and updated in place every second,
+        # long ranges draw means with their min/max range
+        self.plot = LivePlot.LivePlot(
+            self.figure,
+            self.matplotlib_canvas,
+            self.cpc_name,
+            self.plot_window,
+            ranges=len(self.plot_rollup_levels) + len(self.plot_widths) > 0,
+            budget=self.config.get("plot_frame_budget", 0.05),
+        )
+
+        selector = ttk.Frame(frame)
+        selector.grid(row=1, column=0, sticky="w", padx=10, pady=5)
+        self.plot_range = tk.IntVar(value=self.plot_window)
+        for seconds in self.plot_ranges:
+            ttk.Radiobutton(
+                selector,
+                text=LivePlot.range_label(seconds),
+                value=seconds,
+                variable=self.plot_range,
+                command=self.select_plot_range,
+            ).pack(side="left", padx=5)
+        self.root.after(1000, self.update_plot)
+
+    def new_plot_levels(self):
+        capacity = int(self.plot_points * 1.1) + 10
+        return {
+            seconds: PlotBuffer.MinMaxBuffer(width, capacity)
+            for seconds, width in self.plot_widths.items()
+        }
 
 
     def create_overview_widgets(self, frame):
         self.cpc_tab = ttk.Frame(frame) 
         self.cpc_tab.pack(expand=1, fill="both")
+
+        # The newest record of each CPC is shown overview_refresh_rate times
+        # a second, a CPC without records for overview_stale_after seconds
+        # turns red
+        self.overview_interval = 1 / self.config.get("overview_refresh_rate", 1)
+        self.overview_stale_after = self.config.get("overview_stale_after", 10)
+        ttk.Style(self.root).configure("Stale.TLabel", foreground="red")
+        self.overview_time = Histogram.Histogram()
+
         # Initialize CPC instrument frames
         self.init_cpc_frames()
+        self.root.after(int(self.overview_interval * 1000), self.refresh_overview)
 
     def init_cpc_frames(self):
-        # Layout initialization
+        # Layout initialization, each CPC's labels are kept by field so
+        # updates never walk or parse the widgets
+        self.cpc_labels = []
+        self.cpc_text = []
         for i in range(1, self.config['num_cpcs']+  1):
             cpc_key = f"cpc{i}"
             cpc_config = self.config[cpc_key]
@@ -139,144 +178,220 @@ class App:
             frame.grid(row=(i-1)//3, column=(i-1)%3, sticky='ew', padx=10, pady=10)
 
             # Add labels for each attribute except 'datetime'
+            labels = {}
             for key in self.config[cpc_key]['cpc_header']:
                 if key != 'datetime':
-                    ttk.Label(frame, text=f"{key}: N/A").grid()
+                    labels[key] = ttk.Label(frame, text=f"{key}: N/A")
+                    labels[key].grid()
+            self.cpc_labels.append(labels)
+            self.cpc_text.append({key: f"{key}: N/A" for key in labels})
+
+        # Newest record not shown yet, and when each CPC last sent one;
+        # startup counts as a record so connecting CPCs are not stale
+        self.cpc_latest = [None] * len(self.cpc_labels)
+        self.cpc_seen = [time.monotonic()] * len(self.cpc_labels)
+        self.cpc_stale = [False] * len(self.cpc_labels)
+
+
+    def create_status_widgets(self, frame):
+        # Latency per CPC and stage over the last metrics interval, with the
+        # counters, redrawn when the metrics roll
+        columns = ("count", "p50", "p99", "max", "counters")
+        self.status_tree = ttk.Treeview(frame, columns=columns)
+        self.status_tree.heading("#0", text="CPC / stage")
+        for column in columns:
+            heading = column if column in ("count", "counters") else f"{column} ms"
+            self.status_tree.heading(column, text=heading)
+            self.status_tree.column(column, width=80, anchor="e")
+        self.status_tree.column("counters", width=420, anchor="w")
+        self.status_tree.pack(expand=1, fill="both", padx=10, pady=10)
+        self.status_label = ttk.Label(frame, text="Waiting for the first interval")
+        self.status_label.pack(anchor="w", padx=10, pady=(0, 10))
+        self.status_rolls = 0
+        self.root.after(1000, self.refresh_status)
+
+    def refresh_status(self):
+        last = self.metrics.last
+        if last is not None and self.metrics.rolls != self.status_rolls:
+            self.status_rolls = self.metrics.rolls
+            self.status_tree.delete(*self.status_tree.get_children())
+            for name, instrument in last["instruments"].items():
+                counters = ", ".join(
+                    f"{key} {value}" for key, value in instrument["counters"].items()
+                )
+                total = instrument["stages"]["total"]
+                parent = self.status_tree.insert(
+                    "", "end", text=name, open=True,
+                    values=self.status_values(total) + (counters,),
+                )
+                for stage, stats in instrument["stages"].items():
+                    self.status_tree.insert(
+                        parent, "end", text=stage, values=self.status_values(stats)
+                    )
+            self.status_label.config(
+                text=f"{last['time']}, {last['interval']:.0f} s interval, "
+                f"{last['late_records']} late records, "
+                f"{last['writer_errors']} write errors"
+            )
+        self.root.after(1000, self.refresh_status)
+
+    def status_values(self, stats):
+        return (
+            stats["count"],
+            f"{stats['p50'] * 1000:.2f}",
+            f"{stats['p99'] * 1000:.2f}",
+            f"{stats['max'] * 1000:.2f}",
+        )
 
+    def next_check_ms(self):
+        return int(self.pipeline.next_delay() * 1000)
 
     def check_queue(self):
-        # Create new file on new day
-        if datetime.now().day != self.start_time.day:
-            self.current_date = datetime.now().strftime("%Y-%m-%d")
-            self.start_time, self.csv_filepath = self.create_files(
-                self.cpc_headers,self.data_dir
-            )
-        all_cpc_data = {}
-
-        # Get data from all CPCs and store for plotting and writing to CSV
-        for i in range(self.num_cpcs):
-            try:
-                data_point = self.serial_queues[i].get_nowait()
-                # print(data_point)
-                self.update_cpc_display(i, data_point)
-
-                # Extract cpc_name from the data_point
-                cpc_name = self.cpc_name[i]
-                if cpc_name not in self.plot_data:
-                    self.plot_data[cpc_name] = {'datetime': [], 'concentration': []}
-
-                # Parse datetime and concentration, add to the plot data structure
-                parsed_datetime = data_point['datetime']
-
-                # Safe parsing of concentration with default value if empty or invalid
-                try:
-                    concentration = float(data_point['concentration']) if data_point['concentration'] else 0.0
-                except:
-                    concentration = 0.0  # Default value or decide if you want to log this error or take any specific action
-
-                self.plot_data[cpc_name]['datetime'].append(parsed_datetime)
-                self.plot_data[cpc_name]['concentration'].append(concentration)
-
-                all_cpc_data[cpc_name] = data_point
-
-            except queue.Empty:
-                pass
-
-        # Write all raw data to CSV file if all_cpc_data is populated
-        if all_cpc_data:  # Checks if there's any data collected
-            with open(self.csv_filepath, mode="a", newline="") as data_file:
-                data_writer = csv.writer(data_file, delimiter=",",escapechar="\\")
-                # Create a list that will hold one entry per CPC for this timestamp
-                row = []
-                for i, name in enumerate(self.cpc_name):  # Ensuring the order of data in the CSV
-                    if name in all_cpc_data:
-                        # Assuming all_cpc_data[name] is a dictionary containing all necessary data fields
-                        row.extend(list(all_cpc_data[name].values()))
-                    else:
-                        # Extend row with NaNs or some placeholder if no data for this CPC
-                        row.extend([np.nan] * len(self.config[f"cpc{i+1}"]["cpc_header"]))  # Adjust the number as per data fields
-
-                data_writer.writerow(row)
-         
-        # Schedule the next update
-        self.curr_time = self.curr_time + self.update_interval
-        next_time = self.curr_time + self.update_interval - time.monotonic()
-        if next_time < 0:
-            next_time = 0
-        next_time = int(next_time * 1000)
-  
-
-        # Check the queue again after 1s
-        self.root.after(next_time, self.check_queue)
+        # Drain the queues into the files, show_records plots each batch
+        self.pipeline.check_queue()
+
+        # Check the queue again on the next clock tick
+        self.root.after(self.next_check_ms(), self.check_queue)
+
+    def show_records(self, i, data_points):
+        # The overview only shows the newest record, on its next refresh
+        self.cpc_latest[i] = data_points[-1]
+        self.cpc_seen[i] = time.monotonic()
+        if self.metrics is not None and self.plot_pending[i] is None:
+            self.plot_pending[i] = data_points[0].get_time
+
+        # Extract cpc_name from the data_point
+        cpc_name = self.cpc_name[i]
+        if cpc_name not in self.plot_data:
+            self.plot_data[cpc_name] = PlotBuffer.PlotBuffer(self.plot_capacity)
+            self.plot_downsampled[cpc_name] = self.new_plot_levels()
+
+        for data_point in data_points:
+            # Parse datetime and concentration, add to the plot data structure
+            parsed_datetime = data_point['datetime']
+
+            # Concentration is parsed to a float at the source, plot
+            # missing values as 0
+            concentration = data_point['concentration']
+            if math.isnan(concentration):
+                concentration = 0.0
+
+            self.add_plot_point(cpc_name, parsed_datetime, concentration)
+
+    def add_plot_point(self, cpc_name, parsed_datetime, concentration):
+        # Times are stored as matplotlib date numbers so windows plot as is
+        plot_time = mdates.date2num(parsed_datetime)
+
+        # Long ranges take every record into their min/max buckets
+        for level in self.plot_downsampled[cpc_name].values():
+            level.add(plot_time, concentration)
+
+        # Keep one point per 1/plot_max_rate seconds, the bin maximum, so
+        # short transients still show up in the decimated plot
+        plot_data = self.plot_data[cpc_name]
+        plot_bin = math.floor(parsed_datetime.timestamp() * self.plot_max_rate)
+        if self.plot_bins.get(cpc_name) == plot_bin:
+            if concentration > plot_data.last_value():
+                plot_data.set_last(concentration)
+            return
+        if plot_data.append(plot_time, concentration):
+            self.plot_bins[cpc_name] = plot_bin
+
+    def refresh_overview(self):
+        start = time.perf_counter()
+        now = time.monotonic()
+        for index, labels in enumerate(self.cpc_labels):
+            data = self.cpc_latest[index]
+            if data is not None:
+                self.cpc_latest[index] = None
+                self.update_cpc_display(index, data)
+
+            # Restyle only when a CPC goes stale or comes back
+            stale = now - self.cpc_seen[index] > self.overview_stale_after
+            if stale != self.cpc_stale[index]:
+                self.cpc_stale[index] = stale
+                for label in labels.values():
+                    label.configure(style="Stale.TLabel" if stale else "TLabel")
+        self.overview_time.add(time.perf_counter() - start)
+
+        self.root.after(int(self.overview_interval * 1000), self.refresh_overview)
 
     def update_cpc_display(self, index, data):
-        frame = self.cpc_tab.winfo_children()[index]
-        for label in frame.winfo_children():
-            key = label.cget("text").split(":")[0]
-            if key in data:
-                label.config(text=f"{key}: {data[key]}")
-
-    def update_plot(self,frame=None):
-        # Get the current time
+        # Only labels whose text changed are sent to Tk
+        shown = self.cpc_text[index]
+        for key, label in self.cpc_labels[index].items():
+            text = f"{key}: {data[key]}"
+            if text != shown[key]:
+                shown[key] = text
+                label.config(text=text)
+
+    def update_plot(self):
+        self.draw_plot()
+        self.root.after(1000, self.update_plot)
+
+    def select_plot_range(self):
+        self.plot_window = self.plot_range.get()
+        self.plot.set_window(self.plot_window)
+        self.draw_plot()
+
+    def draw_plot(self):
         current_time = datetime.now()
-        #print(current_time)
-        # Calculate the time for two minutes ago
-        ten_min_ago = current_time - timedelta(minutes=10)
-
-        # Clear the current axes
-        self.ax.clear()
-        self.ax.set_xlabel("Time")
-        self.ax.set_ylabel("Particle Count, particles/cm³")
-        
-        # Collect max value across CPCs
-        max_val = []
-
-        # Re-plot data for each CPC
-        for cpc_name, cpc_data in self.plot_data.items():
-            if cpc_data['datetime']:
-                filtered_datetimes = [dt for dt in cpc_data['datetime'] if dt >= ten_min_ago]
-                filtered_concentrations = [concentration for dt, concentration in zip(cpc_data['datetime'], cpc_data['concentration']) if dt >= ten_min_ago]
-
-                self.ax.scatter(filtered_datetimes, filtered_concentrations, label=cpc_name,s=10)
-
-                max_val.append(max(filtered_concentrations))
-        # Update the plot's x-axis limits and format
-        self.ax.set_xlim([ten_min_ago, current_time])
-        self.ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
-        # Setup y-lim
-        filt_max = [val for val in max_val if val<= 299000]
-        if not filt_max:
-            ylim = 200000
+        window_start = current_time - timedelta(seconds=self.plot_window)
+        plot_start = mdates.date2num(window_start)
+
+        # Views of each CPC's buffer, its min/max buckets or the rollups
+        series = {}
+        if self.plot_window in self.plot_rollup_levels:
+            level = self.plot_rollup_levels[self.plot_window]
+            for i, cpc_name in enumerate(self.cpc_name):
+                starts, means, mins, maxs = self.rollups.series(
+                    level, i, "concentration", window_start
+                )
+                series[cpc_name] = (mdates.date2num(starts), means, mins, maxs)
+        elif self.plot_window in self.plot_widths:
+            for cpc_name, levels in self.plot_downsampled.items():
+                series[cpc_name] = levels[self.plot_window].window(plot_start)
         else:
-            ylim = max(filt_max)
-        self.ax.set_yscale('log')
-        self.ax.set_ylim([1,ylim*1.1])
-        plt.setp(self.ax.get_xticklabels(), rotation=45, ha="right")
-        # Update the legend
-        self.ax.legend(loc='upper center', bbox_to_anchor=(0.5, 1.1),ncol=3, fancybox=True)
-
+            for cpc_name, cpc_data in self.plot_data.items():
+                series[cpc_name] = cpc_data.window(plot_start)
+        self.plot.update(current_time, series)
+
+        # Records drained since the last frame are on screen now
+        if self.metrics is not None:
+            for i, get_time in enumerate(self.plot_pending):
+                if get_time is not None:
+                    self.metrics.plotted(self.cpc_name[i], get_time)
+                    self.plot_pending[i] = None
+
+    def rollup_level(self, window):
+        # Coarsest rollup resolution that still gives 100 points across the
+        # window, None plots the records kept in memory
+        if not self.config.get("rollup_enabled"):
+            return None
+        level = None
+        resolutions = sorted(self.config.get("rollup_resolutions", [60, 3600]))
+        for i, resolution in enumerate(resolutions):
+            if window / resolution >= 100:
+                level = i
+        return level
 
     def close(self):
-        self.stop_threads.set()
         print("Closing application...")
+        self.pipeline.close()
+        plot_stats = self.plot.stats()
+        print(
+            f"Plot: {plot_stats['frames']} frames, {plot_stats['full_draws']} full "
+            f"draws, p99 {plot_stats['render_time']['p99'] * 1000:.1f} ms, "
+            f"{plot_stats['over_budget']} over budget"
+        )
+        overview_time = self.overview_time.snapshot()
+        print(
+            f"Overview: {overview_time['count']} refreshes, mean "
+            f"{overview_time['mean'] * 1000:.2f} ms, p99 "
+            f"{overview_time['p99'] * 1000:.2f} ms"
+        )
         self.root.destroy()
 
-    def create_files(self, header, directory):
-        # Create subfolder for current date
-        subfolder_path = os.path.join(directory, self.current_date)
-        os.makedirs(subfolder_path, exist_ok=True)
-
-        # Create CSV file and writer
-        csv_filename = f"MANY_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        csv_filepath = os.path.join(subfolder_path, csv_filename)
-
-        # Open CSV logging file
-        with open(csv_filepath, mode="w", newline="") as data_file:
-            data_writer = csv.writer(data_file, delimiter=",")
-            data_writer.writerow(header)
-
-        return datetime.now(), csv_filepath
-
 
 if __name__ == "__main__":
     root = tk.Tk()
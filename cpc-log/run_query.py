@@ -0,0 +1,66 @@
+# Query the local SQLite store (sqlite_enabled in config.yml)
+#   python run_query.py --list
+#   python run_query.py Outdoor 2024-05-07T02:00 2024-05-07T04:00 -c concentration
+#   python run_query.py Outdoor 2024-05-07T02:00 2024-05-07T04:00 --output outdoor.csv
+import argparse
+import csv
+from datetime import datetime
+import os
+import sys
+import time
+
+import yaml
+
+from cpcfnc import SQLiteStore
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("cpc", nargs="?", help="cpc_name")
+    parser.add_argument("start", nargs="?", help="ISO time, e.g. 2024-05-07T02:00")
+    parser.add_argument("end", nargs="?", help="ISO time")
+    parser.add_argument(
+        "-c", "--columns", nargs="+", help="cpc_header fields, default all"
+    )
+    parser.add_argument("--db", help="database file, default sqlite_path from config")
+    parser.add_argument("--list", action="store_true", help="list CPCs and time spans")
+    parser.add_argument("--output", help="CSV file, default prints to the terminal")
+    args = parser.parse_args()
+
+    path = args.db
+    if path is None:
+        program_path = os.path.dirname(os.path.realpath(__file__))
+        with open(os.path.join(program_path, "config.yml"), "r", encoding="utf-8") as f:
+            config = yaml.safe_load(f)
+        path = os.path.join(program_path, config.get("sqlite_path", "cpc_log.sqlite"))
+
+    if args.list or args.cpc is None:
+        for name, first, last, count in SQLiteStore.instruments(path):
+            print(f"{name}: {count} rows from {first} to {last}")
+        return
+    if args.start is None or args.end is None:
+        parser.error("start and end are needed with a CPC name")
+
+    start = time.perf_counter()
+    columns, rows = SQLiteStore.query(
+        path,
+        args.cpc,
+        datetime.fromisoformat(args.start),
+        datetime.fromisoformat(args.end),
+        args.columns,
+    )
+    query_time = time.perf_counter() - start
+
+    data_file = open(args.output, "w", newline="") if args.output else None
+    try:
+        data_writer = csv.writer(data_file or sys.stdout, delimiter=",")
+        data_writer.writerow(columns)
+        data_writer.writerows(rows)
+    finally:
+        if data_file is not None:
+            data_file.close()
+    print(f"{len(rows)} rows in {1000 * query_time:.1f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# Re-decode a raw serial capture (raw_log in config.yml) to CSV or Parquet,
+# e.g. with a cpc_header that matches the firmware the data was taken with.
+#   python run_raw_decode.py raw/SADDEST.ring --cpc cpc1 --output SADDEST.csv
+#   python run_raw_decode.py raw/SADDEST.ring --cpc cpc1 --start 2024-05-01T02:00
+#       --end 2024-05-01T04:00 --output SADDEST.parquet --config old_config.yml
+import argparse
+import csv
+from datetime import datetime
+import os
+import sys
+
+import yaml
+
+from cpcfnc import RawLog
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("ring", help="raw capture file")
+    parser.add_argument("--cpc", default="cpc1", help="config entry to decode with")
+    parser.add_argument("--config", default="config.yml")
+    parser.add_argument("--start", help="ISO time, e.g. 2024-05-01T02:00")
+    parser.add_argument("--end", help="ISO time")
+    parser.add_argument("--output", help=".csv or .parquet, default prints CSV")
+    args = parser.parse_args()
+
+    program_path = os.path.dirname(os.path.realpath(__file__))
+    with open(os.path.join(program_path, args.config), "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f)[args.cpc]
+    start = datetime.fromisoformat(args.start).timestamp() if args.start else None
+    end = datetime.fromisoformat(args.end).timestamp() if args.end else None
+    records = RawLog.decode(args.ring, config, start, end)
+
+    if args.output and args.output.endswith(".parquet"):
+        # Typed columns like the Parquet logger writes
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        from cpcfnc import ParquetLogger
+        from cpcfnc.RecordSchema import RecordSchema
+
+        schema = RecordSchema(config)
+        arrow_schema = ParquetLogger.arrow_schema(schema)
+        batch = ParquetLogger.record_batch(schema, arrow_schema, list(records))
+        pq.write_table(pa.Table.from_batches([batch]), args.output)
+        print(f"{batch.num_rows} records written to {args.output}")
+        return
+
+    data_file = open(args.output, "w", newline="") if args.output else None
+    try:
+        data_writer = csv.writer(data_file or sys.stdout, delimiter=",")
+        data_writer.writerow(config["cpc_header"])
+        count = 0
+        for record in records:
+            data_writer.writerow(record.csv_values())
+            count += 1
+    finally:
+        if data_file is not None:
+            data_file.close()
+    if args.output:
+        print(f"{count} records written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
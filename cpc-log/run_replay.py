@@ -0,0 +1,148 @@
+# Replay recorded MANY_*.csv files (and raw_log captures) through the
+# queues, row assembler and CSV writer without the GUI, and report the end
+# to end throughput. Speed 0 replays as fast as the pipeline keeps up.
+# --rollup-dir also builds the 1 min / 1 h rollup files from old data.
+#   python run_replay.py "D:/data/2024-05-0*/MANY_*.csv"
+#   python run_replay.py "2024-05-07/MANY_*.csv" --speed 60 --output-dir replay
+#   python run_replay.py --raw-dir raw --speed 10 --restamp
+#   python run_replay.py "D:/data/2024-*/MANY_*.csv" --rollup-dir D:/data
+import argparse
+import os
+import threading
+import time
+
+import yaml
+
+from cpcfnc import CPCReplay, CSVWriter, RecordQueue, Rollup, RowAssembler
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("files", nargs="*", help="MANY_*.csv files or glob patterns")
+    parser.add_argument("--config", default="config.yml")
+    parser.add_argument("--raw-dir", help="raw_log folder to replay rings from")
+    parser.add_argument("--speed", type=float, default=0, help="0 is max speed")
+    parser.add_argument("--restamp", action="store_true", help="use replay time")
+    parser.add_argument("--output-dir", help="write the rows as MANY_*.csv here")
+    parser.add_argument("--rollup-dir", help="write rollup files under this folder")
+    parser.add_argument("--report-interval", type=float, default=5.0)
+    args = parser.parse_args()
+
+    program_path = os.path.dirname(os.path.realpath(__file__))
+    with open(os.path.join(program_path, args.config), "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+    configs = [config[f"cpc{i+1}"] for i in range(config["num_cpcs"])]
+    headers = [cpc_config["cpc_header"] for cpc_config in configs]
+
+    files = CPCReplay.expand(args.files)
+    if not files and not args.raw_dir:
+        parser.error("no files matched")
+
+    # Blocking queues, a regression run should not lose records
+    data_queues = [
+        RecordQueue.RecordQueue(
+            config.get("queue_size", 0),
+            "block",
+            config.get("queue_block_timeout", 1.0),
+        )
+        for _ in configs
+    ]
+    stop_event = threading.Event()
+    replay = CPCReplay.CPCReplay(
+        configs,
+        data_queues,
+        stop_event,
+        files=files,
+        raw_dir=args.raw_dir,
+        speed=args.speed,
+        restamp=args.restamp,
+    )
+    update_interval = config.get("update_interval", 1)
+    assembler = RowAssembler.RowAssembler(
+        headers,
+        bin_width=config.get("row_bin_width", update_interval),
+        lateness=config.get("row_lateness", 1.0),
+    )
+    writer = None
+    if args.output_dir:
+        writer = CSVWriter.CSVWriter(sum(headers, []), args.output_dir)
+        writer.start()
+    rollups = None
+    if args.rollup_dir:
+        rollups = Rollup.RollupLogger(
+            configs,
+            args.rollup_dir,
+            resolutions=config.get("rollup_resolutions", [60, 3600]),
+            fields=config.get("rollup_fields"),
+            lateness=config.get("rollup_lateness", 5.0),
+        )
+        rollups.start()
+
+    # Drain, bin and write like run_many.App.check_queue, more often than
+    # update_interval so a max speed replay is not held up by the queues
+    print(f"Replaying {len(files)} files, {len(replay.rings)} raw captures")
+    replay.start()
+    start = time.monotonic()
+    next_report = start + args.report_interval
+    consumed = 0
+    rows_written = 0
+    try:
+        while True:
+            # Every record up to position is queued once position is set
+            running = replay.thread.is_alive()
+            position = replay.position
+            rows = []
+            for i, data_queue in enumerate(data_queues):
+                records = data_queue.drain()
+                consumed += len(records)
+                rows.extend(assembler.add(i, records))
+                if rollups is not None:
+                    rollups.write_records(i, records)
+            if position is not None:
+                rows.extend(assembler.emit(position))
+            if not running:
+                rows.extend(assembler.emit_all())
+            if rows and writer is not None:
+                writer.write_rows(rows)
+            rows_written += len(rows)
+
+            now = time.monotonic()
+            if now >= next_report:
+                print(
+                    f"{consumed} records, {consumed / (now - start):.0f} rec/s, "
+                    f"replay at {replay.stats()['position']}"
+                )
+                next_report = now + args.report_interval
+            if not running and not any(q.depth() for q in data_queues):
+                break
+            time.sleep(0.05 if args.speed == 0 else min(update_interval, 0.25))
+    except KeyboardInterrupt:
+        stop_event.set()
+        replay.thread.join()
+    if writer is not None:
+        writer.close()
+    if rollups is not None:
+        rollups.close()
+    elapsed = time.monotonic() - start
+
+    stats = replay.stats()
+    dropped = sum(q.stats()["dropped"] for q in data_queues)
+    print(f"{stats['rows_read']} CSV rows, {stats['records']} records replayed")
+    print(
+        f"{consumed} records and {rows_written} rows through the pipeline in "
+        f"{elapsed:.1f} s: {consumed / elapsed:.0f} rec/s end to end"
+    )
+    assembled = assembler.stats()
+    print(
+        f"queue drops {dropped}, late {assembled['late']}, "
+        f"merged {assembled['merged']}, unknown CPCs {stats['unknown_cpcs']}, "
+        f"bad rows {stats['bad_rows']}"
+    )
+    if writer is not None:
+        print(f"written to {writer.csv_filepath}")
+    if rollups is not None:
+        print(f"rollups: {rollups.stats()['closed']} buckets, late {rollups.late}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+# Start pty simulated CPCs from config.yml and print their ports, e.g. to
+# point another logger at them. Runs until Ctrl+C.
+#   python run_simulator.py [num_cpcs]
+import os
+import sys
+import time
+
+import yaml
+
+from cpcfnc import CPCSimulator
+
+
+def main():
+    program_path = os.path.dirname(os.path.realpath(__file__))
+    with open(os.path.join(program_path, "config.yml"), "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+
+    # Number of instruments from the command line overrides the config
+    config["simulator"] = config.get("simulator") or {}
+    if len(sys.argv) > 1:
+        config["simulator"]["num_cpcs"] = int(sys.argv[1])
+
+    configs, profile = CPCSimulator.simulated_configs(config)
+    simulator = CPCSimulator.CPCSimulator(configs, profile)
+    for cpc_config, port in zip(configs, simulator.ports):
+        print(f"{cpc_config['cpc_name']}: {port}")
+    simulator.start()
+
+    try:
+        while True:
+            time.sleep(10)
+            sent = sum(s["records_sent"] for s in simulator.stats().values())
+            print(f"{sent} records sent")
+    except KeyboardInterrupt:
+        simulator.stop()
+
+
+if __name__ == "__main__":
+    main()
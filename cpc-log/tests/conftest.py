@@ -0,0 +1,6 @@
+# Tests run from cpc-log or the repository root, with cpc-log on the path like
+# the benchmarks. None of them need hardware, a display or pyserial.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
@@ -0,0 +1,89 @@
+from cpcfnc.CommandPipeline import CommandPipeline
+from cpcfnc.LineFramer import LineFramer
+
+COMMANDS = ["RD", "R1", "R2", "R3", "RE"]
+
+
+class FakeInstrument:
+    # Answers each command with "<command>=<n>", the n-th replies in drop are
+    # never sent
+    def __init__(self, drop=()):
+        self.drop = set(drop)
+        self.replies = 0
+        self.pending = bytearray()
+
+    def write(self, data):
+        for command in data.decode().split("\r"):
+            if not command:
+                continue
+            if self.replies not in self.drop:
+                self.pending += f"{command}={self.replies}\r\n".encode()
+            self.replies += 1
+
+    @property
+    def in_waiting(self):
+        return len(self.pending)
+
+    def readinto(self, view):
+        count = min(len(view), len(self.pending))
+        view[:count] = self.pending[:count]
+        del self.pending[:count]
+        return count
+
+
+def make_pipeline(depth=0):
+    config = {
+        "serial_commands": COMMANDS,
+        "serial_timeout": 0.02,
+        "pipeline_depth": depth,
+    }
+    return CommandPipeline(config)
+
+
+def columns(responses):
+    # Command each field answered, "" for a missing reply
+    return [response.split("=")[0] for response in responses]
+
+
+def test_replies_in_order():
+    pipeline = make_pipeline()
+    responses = pipeline.poll(FakeInstrument(), LineFramer())
+    assert columns(responses) == COMMANDS
+    assert pipeline.stats()["misaligned_cycles"] == 0
+
+
+def test_dropped_reply_repolls_the_batch():
+    # Without the resync every reply after R1 would shift one column left
+    pipeline = make_pipeline()
+    responses = pipeline.poll(FakeInstrument(drop=[1]), LineFramer())
+    assert columns(responses) == COMMANDS
+    stats = pipeline.stats()
+    assert stats["misaligned_cycles"] == 1
+    assert stats["timeouts"] == 1
+    assert stats["discarded_replies"] == 0
+
+
+def test_limited_depth_drop_repolls():
+    pipeline = make_pipeline(depth=2)
+    responses = pipeline.poll(FakeInstrument(drop=[3]), LineFramer())
+    assert columns(responses) == COMMANDS
+    assert pipeline.stats()["misaligned_cycles"] == 1
+
+
+def test_depth_one_leaves_one_field_empty():
+    pipeline = make_pipeline(depth=1)
+    responses = pipeline.poll(FakeInstrument(drop=[2]), LineFramer())
+    assert columns(responses) == ["RD", "R1", "", "R3", "RE"]
+    assert pipeline.stats()["misaligned_cycles"] == 0
+
+
+def test_late_replies_are_discarded_while_settling():
+    pipeline = make_pipeline()
+    pipeline.begin(0.0)
+    pipeline.due_writes(0.0)
+    pipeline.feed(["RD=0", "R1=1"], 0.001)
+    assert pipeline.expire(0.05)
+    assert pipeline.due_writes(0.05) == []
+    pipeline.feed(["R3=3"], 0.06)
+    assert pipeline.stats()["discarded_replies"] == 1
+    assert pipeline.due_writes(pipeline.settle_until) == [b"RD\r"]
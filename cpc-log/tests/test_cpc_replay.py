@@ -0,0 +1,109 @@
+import csv
+from datetime import datetime, timedelta
+import threading
+
+from cpcfnc import RawLog
+from cpcfnc.CPCReplay import CPCReplay
+from cpcfnc.Pipeline import Pipeline
+from cpcfnc.RecordQueue import RecordQueue
+
+START = datetime(2024, 5, 1, 12, 0, 0)
+HEADER = ["cpc name", "datetime", "concentration"]
+CONFIGS = [
+    {"cpc_name": "Outdoor", "cpc_header": HEADER, "serial_port": "COM3"},
+    {"cpc_name": "SADDEST", "cpc_header": HEADER, "serial_port": "COM4"},
+]
+
+
+def write_many(path, seconds):
+    # Wide rows like CSVWriter writes, SADDEST missing from the last row
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER + HEADER)
+        for i, second in enumerate(seconds):
+            stamp = str(START + timedelta(seconds=second))
+            row = ["Outdoor", stamp, str(100 + i)]
+            if i < len(seconds) - 1:
+                row += ["SADDEST", stamp, str(200 + i)]
+            else:
+                row += ["nan", "nan", "nan"]
+            writer.writerow(row)
+
+
+def replay(files=(), **kwargs):
+    queues = [RecordQueue() for _ in CONFIGS]
+    cpc = CPCReplay(CONFIGS, queues, threading.Event(), files=files, **kwargs)
+    cpc.start()
+    cpc.thread.join(10)
+    return cpc, [data_queue.drain() for data_queue in queues]
+
+
+def test_csv_rows_are_split_per_cpc(tmp_path):
+    path = str(tmp_path / "MANY_20240501_120000.csv")
+    write_many(path, [0, 1, 2])
+    cpc, (outdoor, saddest) = replay([path], speed=0, restamp=False)
+    assert [r["concentration"] for r in outdoor] == [100, 101, 102]
+    assert [r["concentration"] for r in saddest] == [200, 201]
+    assert outdoor[-1]["datetime"] == START + timedelta(seconds=2)
+    assert cpc.position == outdoor[-1]["datetime"].timestamp()
+    assert cpc.state == "finished"
+    assert cpc.stats()["records"] == 5
+
+
+def test_speed_paces_and_restamp_moves_to_replay_time(tmp_path):
+    path = str(tmp_path / "MANY_20240501_120000.csv")
+    write_many(path, [0, 1, 2, 3])
+    before = datetime.now()
+    cpc, (outdoor, _) = replay([path], speed=10, restamp=True)
+    assert cpc.elapsed() >= 0.29
+    stamps = [record["datetime"] for record in outdoor]
+    assert stamps[0] >= before - timedelta(seconds=1)
+    gaps = [(b - a).total_seconds() for a, b in zip(stamps, stamps[1:])]
+    assert all(abs(gap - 0.1) < 1e-5 for gap in gaps)
+    assert abs(cpc.position - stamps[-1].timestamp()) < 1e-5
+
+
+def test_raw_ring_replaces_the_csv_for_its_cpc(tmp_path):
+    path = str(tmp_path / "MANY_20240501_120000.csv")
+    write_many(path, [0, 2])
+    log = RawLog.RawLog(RawLog.ring_path(str(tmp_path / "raw"), "SADDEST"), 4096)
+    for second in (1, 3):
+        wall = (START + timedelta(seconds=second)).timestamp()
+        log.append(b"%d" % (300 + second), wall=wall)
+    log.close()
+
+    cpc, (outdoor, saddest) = replay(
+        [path], raw_dir=str(tmp_path / "raw"), speed=0, restamp=False
+    )
+    assert [r["concentration"] for r in outdoor] == [100, 101]
+    assert [r["concentration"] for r in saddest] == [301, 303]
+    assert cpc.position == (START + timedelta(seconds=3)).timestamp()
+    assert cpc.status()["Outdoor"]["source"] == "csv"
+
+
+def test_pipeline_closes_replayed_bins_on_the_replay_position(tmp_path):
+    config = {
+        "num_cpcs": 1,
+        "acquisition_mode": "replay",
+        "data_dir": str(tmp_path),
+        "replay": {"restamp": False},
+        "cpc1": CONFIGS[0],
+    }
+    pipeline = Pipeline(config, str(tmp_path))
+    try:
+        replayer = pipeline.cpcs[0]
+        schema = replayer.schemas[0]
+        records = [
+            schema.parse(["1"], START + timedelta(seconds=s, milliseconds=500))
+            for s in range(5)
+        ]
+        for record in records:
+            pipeline.serial_queues[0].put(record)
+        replayer.position = records[-1]["datetime"].timestamp()
+        pipeline.check_queue()
+
+        # Recorded times are far behind the wall clock, the last bins wait
+        assert pipeline.assembler.stats()["pending_bins"] == 2
+    finally:
+        pipeline.close()
+    assert pipeline.assembler.stats()["pending_bins"] == 0
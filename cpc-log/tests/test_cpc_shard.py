@@ -0,0 +1,126 @@
+from datetime import datetime
+import multiprocessing as mp
+
+from cpcfnc.CPCShard import CPCShard, SharedRing
+from cpcfnc.Metrics import Metrics
+from cpcfnc.RecordQueue import RecordQueue
+from cpcfnc.RecordSchema import RecordSchema
+
+CONFIG = {
+    "cpc_name": "Outdoor",
+    "cpc_header": ["cpc name", "datetime", "concentration", "serial_number"],
+}
+STAMP = datetime(2024, 5, 1, 12, 0, 0)
+
+
+def make_ring(capacity=4):
+    schema = RecordSchema(CONFIG)
+    return schema, SharedRing(schema, capacity)
+
+
+def test_ring_round_trip_keeps_times():
+    schema, ring = make_ring()
+    try:
+        record = schema.parse(["123.5", "SIM1"], STAMP, read_time=10.0)
+        record.put_time = 10.5
+        ring.put(record)
+        rows = ring.read()
+        copy = schema.from_row(rows[0])
+        assert copy["concentration"] == 123.5
+        assert copy["serial_number"] == "SIM1"
+        assert copy["datetime"] == STAMP
+        assert (copy.read_time, copy.put_time) == (10.0, 10.5)
+        assert len(ring.read()) == 0
+    finally:
+        ring.close()
+
+
+def test_ring_counts_lapped_rows():
+    schema, ring = make_ring(capacity=4)
+    try:
+        for value in range(10):
+            ring.put(schema.parse([str(value), "SIM1"], STAMP))
+        rows = ring.read()
+        assert [row["concentration"] for row in rows] == [7.0, 8.0, 9.0]
+        assert ring.dropped == 7
+    finally:
+        ring.close()
+
+
+def test_long_text_is_reported(capsys):
+    schema, ring = make_ring()
+    try:
+        ring.put(schema.parse(["1", "S" * 40], STAMP))
+        ring.put(schema.parse(["1", "S" * 40], STAMP))
+        assert schema.truncated == {"serial_number": 2}
+        assert capsys.readouterr().out.count("longer than 32 characters") == 1
+    finally:
+        ring.close()
+
+
+def test_worker_reports_feed_status_and_timeouts():
+    metrics = Metrics(["Outdoor"])
+    shard = CPCShard([CONFIG], [RecordQueue()], None, metrics=metrics)
+    try:
+        shard.update_status({"Outdoor": {"state": "running", "timeouts": 3}})
+        shard.update_status({"Outdoor": {"state": "running", "timeouts": 5}})
+        assert metrics.timeouts["Outdoor"] == 5
+
+        # A restarted worker counts from zero
+        shard.update_status({"Outdoor": {"state": "running", "timeouts": 2}})
+        assert metrics.timeouts["Outdoor"] == 7
+        status = shard.status()["Outdoor"]
+        assert status["worker_restarts"] == 0
+        assert "timeouts" not in status
+    finally:
+        for ring in shard.rings:
+            ring.close()
+
+
+def test_pump_follows_the_queue_policy():
+    shard = CPCShard([CONFIG], [RecordQueue(maxsize=2, policy="block")], None)
+    try:
+        for value in range(5):
+            shard.rings[0].put(shard.schemas[0].parse([str(value), "SIM1"], STAMP))
+        shard.pump_once()
+        stats = shard.data_queues[0].stats()
+        assert (stats["depth"], stats["dropped"]) == (2, 3)
+    finally:
+        for ring in shard.rings:
+            ring.close()
+
+
+class DeadProcess:
+    exitcode = 1
+
+    def is_alive(self):
+        return False
+
+
+def test_dead_worker_restarts_are_spaced_out(capsys):
+    shard = CPCShard([CONFIG], [RecordQueue()], None, restart_backoff_min=1.0)
+    started = []
+    shard.start_worker = started.append
+    shard.processes = [DeadProcess()]
+    receiver, sender = mp.Pipe(duplex=False)
+    shard.pipes = [receiver]
+    try:
+        # 5 s of pump passes with a worker that dies straight away, restarts
+        # come after 0.5-1, 1-2 and 2-4 s of backoff instead of every pass
+        for step in range(100):
+            shard.supervise(now=step * 0.05)
+        assert 2 <= len(started) <= 3
+        assert shard.status()["Outdoor"]["state"] == "backoff"
+        out = capsys.readouterr().out
+        assert out.count("Restarting acquisition worker 0") == len(started)
+        assert out.count("Error: acquisition worker 0") == 1
+
+        # A worker that reports in resets the backoff
+        sender.send({"Outdoor": {"state": "running"}})
+        shard.read_status()
+        assert shard.supervisors[0].streak == 0
+    finally:
+        receiver.close()
+        sender.close()
+        for ring in shard.rings:
+            ring.close()
@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+import math
+
+from cpcfnc import CSVReader
+from cpcfnc.CSVWriter import CSVWriter
+from cpcfnc.RecordSchema import RecordSchema
+
+HEADER = ["cpc name", "datetime", "concentration", "1 second counts", "flags"]
+CONFIGS = [
+    {"cpc_name": name, "cpc_header": HEADER, "cpc_dtypes": {"1 second counts": "int"}}
+    for name in ("Outdoor", "SADDEST", "BLANKEST")
+]
+MIDNIGHT = datetime(2024, 5, 2)
+
+
+def write_day(directory, configs, seconds, missing=None):
+    # Wide rows like the row assembler builds, the missing CPC is NaN padded
+    schemas = [RecordSchema(config) for config in configs]
+    writer = CSVWriter(HEADER * len(configs), directory)
+    rows = []
+    for second in seconds:
+        stamp = MIDNIGHT + timedelta(seconds=second)
+        row = []
+        for index, schema in enumerate(schemas):
+            if (index, second) == missing:
+                row.extend([math.nan] * len(HEADER))
+                continue
+            values = [f"{1000 + second + index}.5", str(second + 10), f"F{index}"]
+            row.extend(schema.parse(values, stamp).csv_values())
+        rows.append(row)
+    writer.write_batch(rows)
+    writer.flush()
+    writer.close_file()
+
+
+def write_files(directory):
+    # Two CPCs before midnight, the SADDEST record of 23:59:59 missing, a
+    # third CPC from the next day on
+    write_day(directory, CONFIGS[:2], [-3, -2, -1], missing=(1, -1))
+    write_day(directory, CONFIGS, [0, 1, 2])
+
+
+def values(frames):
+    return {
+        name: frame.astype(object).where(frame.notna(), None).to_dict("list")
+        for name, frame in frames.items()
+    }
+
+
+def read(directory, **kwargs):
+    start = MIDNIGHT - timedelta(seconds=2)
+    end = MIDNIGHT + timedelta(seconds=2)
+    return CSVReader.read_range(str(directory), start, end, CONFIGS, **kwargs)
+
+
+def test_round_trip_over_two_days_and_cpc_counts(tmp_path):
+    write_files(str(tmp_path))
+    assert len(CSVReader.files_between(str(tmp_path), MIDNIGHT, MIDNIGHT)) == 1
+    frames = read(tmp_path)
+    assert sorted(frames) == ["BLANKEST", "Outdoor", "SADDEST"]
+
+    outdoor = frames["Outdoor"]
+    assert list(outdoor["datetime"]) == [
+        MIDNIGHT + timedelta(seconds=s) for s in (-2, -1, 0, 1)
+    ]
+    assert list(outdoor["concentration"]) == [998.5, 999.5, 1000.5, 1001.5]
+    assert list(outdoor["1 second counts"]) == [8, 9, 10, 11]
+    assert str(outdoor["1 second counts"].dtype) == "Int64"
+    assert list(outdoor["flags"].astype(str)) == ["F0"] * 4
+
+    # The NaN padded record is not read back as a row
+    saddest = frames["SADDEST"]
+    assert list(saddest["datetime"]) == [
+        MIDNIGHT + timedelta(seconds=s) for s in (-2, 0, 1)
+    ]
+    assert list(frames["BLANKEST"]["concentration"]) == [1002.5, 1003.5]
+
+
+def test_columns_limit_what_is_read(tmp_path):
+    write_files(str(tmp_path))
+    frames = read(tmp_path, columns=["concentration"])
+    assert list(frames["Outdoor"].columns) == ["cpc name", "datetime", "concentration"]
+
+
+def test_pandas_fallback_reads_the_same(tmp_path, monkeypatch):
+    write_files(str(tmp_path))
+    expected = values(read(tmp_path))
+    monkeypatch.setattr(CSVReader, "pa", None)
+    assert values(read(tmp_path)) == expected
+
+
+def test_workers_read_the_same(tmp_path):
+    write_files(str(tmp_path))
+    assert values(read(tmp_path, workers=2)) == values(read(tmp_path))
@@ -0,0 +1,77 @@
+import csv
+from datetime import datetime
+import os
+
+from cpcfnc.CSVWriter import CSVWriter
+
+HEADER = ["cpc name", "datetime", "concentration"]
+
+
+def row(stamp, value):
+    return ["Outdoor", stamp, value]
+
+
+def read_files(directory):
+    found = {}
+    for folder, _, files in os.walk(directory):
+        for name in files:
+            with open(os.path.join(folder, name), newline="") as f:
+                rows = list(csv.reader(f))
+            found[os.path.relpath(os.path.join(folder, name), directory)] = rows
+    return found
+
+
+def test_rows_go_to_the_day_they_were_recorded(tmp_path):
+    writer = CSVWriter(HEADER, str(tmp_path))
+    writer.write_batch(
+        [
+            row(datetime(2024, 5, 1, 23, 59, 59), "1"),
+            row(datetime(2024, 5, 2, 0, 0, 0), "2"),
+            row(datetime(2024, 5, 2, 0, 0, 1), "3"),
+        ]
+    )
+    # A late row for the old day stays in the current file
+    writer.write_batch([row(datetime(2024, 5, 1, 23, 59, 58), "0")])
+    writer.flush()
+    writer.close_file()
+
+    files = read_files(tmp_path)
+    assert sorted(files) == [
+        os.path.join("2024-05-01", "MANY_20240501_235959.csv"),
+        os.path.join("2024-05-02", "MANY_20240502_000000.csv"),
+    ]
+    old, new = (files[name] for name in sorted(files))
+    assert old[0] == HEADER
+    assert [r[2] for r in old[1:]] == ["1"]
+    assert [r[2] for r in new[1:]] == ["2", "3", "0"]
+
+
+def test_rows_stay_buffered_while_the_file_cannot_be_created(tmp_path):
+    writer = CSVWriter(HEADER, str(tmp_path))
+    writer.write_batch([row(datetime(2024, 5, 1, 23, 59, 59), "1")])
+
+    # The new day's folder is blocked by a file
+    (tmp_path / "2024-05-02").write_text("")
+    writer.write_batch([row(datetime(2024, 5, 2, 0, 0, 1), "2")])
+    writer.flush()
+    assert writer.csv_filepath is None
+    assert writer.errors >= 1
+    assert "2024-05-02 00:00:01" in writer.buffer.getvalue()
+
+    os.remove(tmp_path / "2024-05-02")
+    writer.flush()
+    writer.close_file()
+    files = read_files(tmp_path)
+    new = files[os.path.join("2024-05-02", "MANY_20240502_000001.csv")]
+    assert [r[2] for r in new[1:]] == ["2"]
+    old = files[os.path.join("2024-05-01", "MANY_20240501_235959.csv")]
+    assert [r[2] for r in old[1:]] == ["1"]
+
+
+def test_thread_writes_and_closes(tmp_path):
+    writer = CSVWriter(HEADER, str(tmp_path))
+    writer.start()
+    writer.write_rows([row(datetime(2024, 5, 1, 12), "1")])
+    writer.close(timeout=5)
+    assert writer.stats()["rows"] == 1
+    assert len(read_files(tmp_path)) == 1
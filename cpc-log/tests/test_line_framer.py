@@ -0,0 +1,64 @@
+from cpcfnc.LineFramer import LineFramer
+
+
+class FakePort:
+    # Bytes waiting in the port, handed out in chunks of at most chunk
+    def __init__(self, data=b"", chunk=1 << 20):
+        self.data = bytearray(data)
+        self.chunk = chunk
+
+    @property
+    def in_waiting(self):
+        return min(len(self.data), self.chunk)
+
+    def readinto(self, buffer):
+        count = min(len(buffer), len(self.data))
+        buffer[:count] = self.data[:count]
+        del self.data[:count]
+        return count
+
+
+def test_partial_records_wait_for_the_rest():
+    framer = LineFramer()
+    framer.feed(b"1,2,3\r\n4,5")
+    assert framer.records() == ["1,2,3"]
+    assert framer.records() == []
+    framer.feed(b",6\r\n")
+    assert framer.records() == ["4,5,6"]
+    assert framer.pending_bytes() == 0
+
+
+def test_read_from_takes_everything_waiting():
+    framer = LineFramer(size=8)
+    data = b"".join(b"%d,abc\r\n" % i for i in range(100))
+    port = FakePort(data, chunk=64)
+    assert framer.read_from(port, block=False) == len(data)
+    assert framer.records() == [f"{i},abc" for i in range(100)]
+    assert framer.read_from(port, block=False) == 0
+
+
+def test_overlong_line_is_dropped():
+    framer = LineFramer(size=8, max_size=64)
+    framer.feed(b"x" * 60)
+    framer.feed(b"y" * 10)
+    assert framer.overflows == 1
+    framer.feed(b"\r\n1,2\r\n")
+    assert framer.records()[-1] == "1,2"
+
+
+def test_discard_hands_the_dropped_bytes_to_the_capture():
+    captured = []
+    framer = LineFramer()
+    framer.capture = lambda data: captured.append(bytes(data))
+    framer.feed(b"late,1\r\n")
+    port = FakePort(b"late,2\r\npart")
+    framer.discard(port)
+    assert captured == [b"late,1\r", b"late,2\r", b"part"]
+    assert framer.discarded == len(b"late,1\r\nlate,2\r\npart")
+    assert framer.pending_bytes() == 0
+    assert not port.data
+
+    # The next reply is not mixed up with the dropped ones
+    framer.feed(b"reply\r\n")
+    assert framer.records() == ["reply"]
+    assert captured[-1] == b"reply\r"
@@ -0,0 +1,93 @@
+from datetime import datetime
+import json
+import time
+from urllib.request import Request, urlopen
+
+from cpcfnc.LiveServer import LiveServer
+from cpcfnc.RecordSchema import RecordSchema
+
+CONFIG = {
+    "cpc_name": "Outdoor",
+    "cpc_header": ["cpc name", "datetime", "concentration"],
+}
+
+
+def get(server, path):
+    host, port = server.address[:2]
+    with urlopen(f"http://{host}:{port}{path}", timeout=5) as response:
+        return response.headers, json.loads(response.read())
+
+
+def serve(**kwargs):
+    server = LiveServer([CONFIG], port=0, **kwargs)
+    server.start()
+    return server
+
+
+def test_other_origins_are_not_allowed_by_default():
+    server = serve()
+    try:
+        headers, body = get(server, "/instruments")
+    finally:
+        server.close()
+    assert body == {"Outdoor": CONFIG["cpc_header"]}
+    assert headers.get("Access-Control-Allow-Origin") is None
+
+
+def test_configured_origin_is_allowed():
+    server = serve(allow_origin="http://localhost:3000")
+    try:
+        headers, _ = get(server, "/stats")
+    finally:
+        server.close()
+    assert headers["Access-Control-Allow-Origin"] == "http://localhost:3000"
+
+
+def test_latest_returns_the_newest_record():
+    schema = RecordSchema(CONFIG)
+    server = serve()
+    try:
+        records = [
+            schema.parse([str(v)], datetime(2024, 5, 1, 0, 0, v)) for v in (1, 2)
+        ]
+        server.publish(0, records)
+        for _ in range(100):
+            if server.seq:
+                break
+            time.sleep(0.01)
+        _, body = get(server, "/latest?fields=concentration")
+    finally:
+        server.close()
+    latest = {"datetime": "2024-05-01T00:00:02", "concentration": 2.0}
+    assert body == {"Outdoor": latest}
+
+
+def test_stream_id_from_before_a_restart_starts_over():
+    schema = RecordSchema(CONFIG)
+    server = serve(keepalive=0.1)
+    try:
+        for v in (1, 2):
+            record = schema.parse([str(v)], datetime(2024, 5, 1, 0, 0, v))
+            server.publish(0, [record])
+        for _ in range(100):
+            if server.seq == 2:
+                break
+            time.sleep(0.01)
+
+        # The id the viewer got from the logger before it was restarted
+        host, port = server.address[:2]
+        request = Request(
+            f"http://{host}:{port}/stream?fields=concentration",
+            headers={"Last-Event-ID": "5000"},
+        )
+        ids = []
+        with urlopen(request, timeout=5) as response:
+            for _ in range(20):
+                line = response.readline().decode().strip()
+                if line.startswith("id: "):
+                    ids.append(int(line[4:]))
+                if len(ids) == 2:
+                    break
+    finally:
+        server.close()
+    assert ids == [1, 2]
@@ -0,0 +1,34 @@
+import json
+
+from cpcfnc.Metrics import Metrics
+
+
+def test_roll_starts_new_histograms_in_the_same_stage_dict():
+    metrics = Metrics(["Outdoor"])
+    stages = metrics.stages("Outdoor")
+    stages["parse"].add(0.5)
+    metrics.timeout("Outdoor", 2)
+
+    last = metrics.roll({"Outdoor": {"reconnects": 1}})
+    outdoor = last["instruments"]["Outdoor"]
+    assert outdoor["stages"]["parse"]["count"] == 1
+    assert outdoor["stages"]["parse"]["max"] == 0.5
+    assert outdoor["counters"] == {"timeouts": 2, "reconnects": 1}
+
+    # Threads holding the stage dict add to the next interval
+    assert metrics.stages("Outdoor") is stages
+    stages["parse"].add(0.001)
+    parse = metrics.roll()["instruments"]["Outdoor"]["stages"]["parse"]
+    assert parse["count"] == 1
+    assert parse["max"] == 0.001
+
+
+def test_metrics_file_is_rolled_over_at_max_bytes(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    metrics = Metrics(["Outdoor"], path=str(path), max_bytes=1000)
+    for _ in range(20):
+        metrics.roll()
+    assert path.stat().st_size < 1000 + len(json.dumps(metrics.last)) + 1
+    old = (tmp_path / "metrics.jsonl.1").read_text().splitlines()
+    assert old and all(json.loads(line)["instruments"] for line in old)
+    assert metrics.errors == 0
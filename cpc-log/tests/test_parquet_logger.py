@@ -0,0 +1,91 @@
+from datetime import datetime
+import os
+import time
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+from cpcfnc import ParquetLogger as parquet
+from cpcfnc.RecordSchema import RecordSchema
+
+CONFIG = {
+    "cpc_name": "Outdoor",
+    "cpc_header": ["cpc name", "datetime", "concentration"],
+}
+
+
+def records(schema, stamps):
+    return [schema.parse([str(i)], stamp) for i, stamp in enumerate(stamps)]
+
+
+def write_stream(path, stamps):
+    schema = RecordSchema(CONFIG)
+    arrow_schema = parquet.arrow_schema(schema)
+    stream = parquet.OpenStream(str(path), arrow_schema)
+    stream.write(parquet.record_batch(schema, arrow_schema, records(schema, stamps)))
+    stream.close()
+
+
+def test_failed_day_does_not_duplicate_the_written_days(tmp_path, monkeypatch):
+    logger = parquet.ParquetLogger([CONFIG], str(tmp_path))
+    schema = logger.schemas[0]
+    logger.pending[0] = records(
+        schema, [datetime(2024, 5, 1, 23, 59), datetime(2024, 5, 2, 0, 1)]
+    )
+
+    # The second day's folder cannot be created
+    opened = parquet.ParquetLogger.stream_for
+
+    def stream_for(self, index, day):
+        if day == "2024-05-02":
+            raise OSError("drive away")
+        return opened(self, index, day)
+
+    monkeypatch.setattr(parquet.ParquetLogger, "stream_for", stream_for)
+    logger.flush()
+    assert logger.errors == 1
+    assert [r["concentration"] for r in logger.pending[0]] == [1.0]
+
+    # The retry only writes the missing day
+    monkeypatch.setattr(parquet.ParquetLogger, "stream_for", opened)
+    logger.flush()
+    assert logger.pending[0] == []
+    for key in list(logger.streams):
+        logger.finalize(key)
+    table = parquet.read_range(
+        str(tmp_path), "Outdoor", datetime(2024, 5, 1), datetime(2024, 5, 3)
+    )
+    assert table["concentration"].to_pylist() == [0.0, 1.0]
+
+
+def test_recover_only_touches_old_streams_of_its_own_instruments(tmp_path):
+    paths = {}
+    for folder in ("Outdoor", "Indoor"):
+        path = tmp_path / "2024-05-01" / folder / f"{folder}_20240501_000000.arrows"
+        path.parent.mkdir(parents=True)
+        write_stream(path, [datetime(2024, 5, 1)])
+        paths[folder] = path
+
+    # Another logger may still be writing a fresh stream
+    assert parquet.recover(str(tmp_path), ["Outdoor"], min_age=60) == []
+    assert paths["Outdoor"].exists()
+
+    old = time.time() - 120
+    for path in paths.values():
+        os.utime(path, (old, old))
+    recovered = parquet.recover(str(tmp_path), ["Outdoor"], min_age=60)
+    assert recovered == [str(paths["Outdoor"])[: -len(".arrows")] + ".parquet"]
+    assert not paths["Outdoor"].exists()
+    assert paths["Indoor"].exists()
+
+
+def test_interrupted_recovery_is_finished(tmp_path):
+    folder = tmp_path / "2024-05-01" / "Outdoor"
+    folder.mkdir(parents=True)
+    claimed = folder / ("Outdoor_20240501_000000.arrows" + parquet.CLAIMED_SUFFIX)
+    write_stream(claimed, [datetime(2024, 5, 1)])
+
+    recovered = parquet.recover(str(tmp_path), ["Outdoor"], min_age=0)
+    assert recovered == [str(folder / "Outdoor_20240501_000000.parquet")]
+    assert os.listdir(folder) == ["Outdoor_20240501_000000.parquet"]
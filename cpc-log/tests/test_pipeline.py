@@ -0,0 +1,21 @@
+import os
+import subprocess
+import sys
+
+
+def test_pipeline_imports_without_termios():
+    # termios does not exist on Windows. pyserial brings its own win32
+    # backend there, here it is loaded before termios is blocked.
+    code = (
+        "import sys, serial; sys.modules['termios'] = None; "
+        "sys.modules.pop('tty', None); import cpcfnc.Pipeline; "
+        "print('cpcfnc.CPCSimulator' in sys.modules)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "False"
@@ -0,0 +1,76 @@
+import numpy as np
+
+from cpcfnc.PlotBuffer import MinMaxBuffer, PlotBuffer
+
+
+def test_view_is_oldest_first_after_wraparound():
+    points = PlotBuffer(4)
+    for t in range(10):
+        points.append(t, t * 10)
+    times, values = points.view()
+    assert len(points) == 4
+    assert list(times) == [6, 7, 8, 9]
+    assert list(values) == [60, 70, 80, 90]
+    assert np.shares_memory(times, points.times)
+
+
+def test_window_selects_time_range():
+    points = PlotBuffer(8)
+    for t in range(12):
+        points.append(t, t)
+    times, _ = points.window(6)
+    assert list(times) == [6, 7, 8, 9, 10, 11]
+    times, values = points.window(5, 8)
+    assert list(times) == [5, 6, 7]
+    assert list(values) == [5, 6, 7]
+    assert len(points.window(20)[0]) == 0
+
+
+def test_out_of_order_points_are_rejected():
+    points = PlotBuffer(4)
+    assert points.append(2, 1)
+    assert not points.append(1, 2)
+    assert points.out_of_order == 1
+    assert points.append(2, 3)
+    assert list(points.view()[1]) == [1, 3]
+
+
+def test_set_last_updates_both_copies():
+    points = PlotBuffer(3)
+    for t in range(5):
+        points.append(t, 0)
+    points.set_last(7)
+    assert points.last_time() == 4
+    assert points.last_value() == 7
+    assert list(points.view()[1]) == [0, 0, 7]
+
+
+def test_min_max_buckets_keep_spikes():
+    buckets = MinMaxBuffer(width=10, capacity=4)
+    for t, value in [(1, 2), (4, 50), (9, 2), (12, 1), (15, 3)]:
+        buckets.add(t, value)
+    times, means, mins, maxs = buckets.window(0)
+    assert list(times) == [5, 15]
+    assert list(means) == [18, 2]
+    assert list(mins) == [2, 1]
+    assert list(maxs) == [50, 3]
+
+
+def test_min_max_wraparound_and_window():
+    buckets = MinMaxBuffer(width=1, capacity=3)
+    for t in range(6):
+        buckets.add(t + 0.2, t)
+    assert len(buckets) == 3
+    times, means, _, _ = buckets.window(0)
+    assert list(times) == [3.5, 4.5, 5.5]
+    assert list(means) == [3, 4, 5]
+    assert list(buckets.window(4, 5)[0]) == [4.5]
+
+
+def test_min_max_rejects_older_buckets():
+    buckets = MinMaxBuffer(width=1, capacity=3)
+    assert buckets.add(5.5, 1)
+    assert not buckets.add(4.9, 2)
+    assert buckets.add(5.1, 3)
+    assert buckets.out_of_order == 1
+    assert list(buckets.window(0)[1]) == [2]
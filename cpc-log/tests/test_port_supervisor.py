@@ -0,0 +1,86 @@
+import random
+
+from cpcfnc.PortSupervisor import PortStale, PortSupervisor
+
+CONFIG = {
+    "cpc_name": "Outdoor",
+    "reconnect_backoff_min": 1.0,
+    "reconnect_backoff_max": 8.0,
+    "stale_timeout": 10.0,
+    "restart_commands_interval": 30.0,
+}
+
+
+def fail(supervisor, error, now=0.0):
+    try:
+        raise error
+    except Exception as e:
+        return supervisor.failed(e, now)
+
+
+def test_backoff_grows_to_its_maximum(monkeypatch):
+    # Jitter takes 50-100 % of the delay, 1.0 gives the full delay
+    monkeypatch.setattr(random, "random", lambda: 1.0)
+    supervisor = PortSupervisor(CONFIG)
+    delays = [fail(supervisor, OSError("no port")) for _ in range(6)]
+    assert delays == [1.0, 2.0, 4.0, 8.0, 8.0, 8.0]
+    assert (supervisor.state, supervisor.failures) == ("backoff", 6)
+
+
+def test_backoff_jitter_stays_within_half_the_delay():
+    supervisor = PortSupervisor(CONFIG)
+    for _ in range(3):
+        fail(supervisor, OSError("no port"))
+    delays = [fail(supervisor, OSError("no port")) for _ in range(50)]
+    assert all(4.0 <= delay <= 8.0 for delay in delays)
+
+
+def test_connect_resets_the_backoff(monkeypatch):
+    monkeypatch.setattr(random, "random", lambda: 1.0)
+    supervisor = PortSupervisor(CONFIG)
+    for _ in range(3):
+        fail(supervisor, OSError("no port"))
+    supervisor.connected(now=10.0)
+    assert supervisor.streak == 0
+    assert fail(supervisor, OSError("no port"), now=15.0) == 1.0
+
+    # Uptime counts the connected stretch, reconnects the second connect
+    supervisor.connected(now=20.0)
+    stats = supervisor.stats()
+    assert (stats["connects"], stats["reconnects"]) == (2, 1)
+    assert supervisor.uptime(now=22.0) == 7.0
+
+
+def test_stale_and_restart_follow_their_intervals():
+    supervisor = PortSupervisor(CONFIG)
+    assert not supervisor.is_stale(now=100.0)
+    assert not supervisor.restart_due(now=100.0)
+
+    supervisor.connected(now=0.0)
+    supervisor.record_received(now=5.0)
+    assert not supervisor.is_stale(now=15.0)
+    assert supervisor.is_stale(now=15.5)
+
+    assert not supervisor.restart_due(now=29.0)
+    assert supervisor.restart_due(now=30.0)
+    assert not supervisor.restart_due(now=31.0)
+    assert supervisor.restart_due(now=60.0)
+
+    # Both are off with a zero interval
+    off = PortSupervisor(dict(CONFIG, stale_timeout=0, restart_commands_interval=0))
+    off.connected(now=0.0)
+    assert not off.is_stale(now=1e6)
+    assert not off.restart_due(now=1e6)
+
+
+def test_traceback_is_printed_once_per_error_kind(capsys):
+    supervisor = PortSupervisor(CONFIG)
+    for _ in range(3):
+        fail(supervisor, OSError("no port"))
+    fail(supervisor, PortStale("no data for 10.0 s"))
+    fail(supervisor, OSError("no port"))
+    out = capsys.readouterr().out
+    assert out.count("Traceback") == 2
+    assert out.count("Error: Outdoor") == 2
+    assert out.count("Reconnecting: Outdoor") == 5
+    assert supervisor.stats()["last_error"] == "OSError: no port"
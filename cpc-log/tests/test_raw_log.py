@@ -0,0 +1,116 @@
+from cpcfnc import RawLog
+
+
+def test_records_come_back_in_order(tmp_path):
+    path = str(tmp_path / "Outdoor.ring")
+    log = RawLog.RawLog(path, capacity=4096)
+    log.append(b"rd\r", RawLog.SENT, monotonic=1.0, wall=100.0)
+    log.append(b"1234.5", RawLog.RECEIVED, monotonic=1.1, wall=100.1)
+    log.close()
+    assert list(RawLog.read_records(path)) == [
+        (RawLog.SENT, 1.0, 100.0, b"rd\r"),
+        (RawLog.RECEIVED, 1.1, 100.1, b"1234.5"),
+    ]
+
+
+def test_wraparound_keeps_the_newest_records(tmp_path):
+    path = str(tmp_path / "Outdoor.ring")
+    log = RawLog.RawLog(path, capacity=1024)
+    for i in range(200):
+        log.append(b"line %03d" % i)
+    assert log.overwritten > 0
+    log.close()
+
+    lines = [data for _, _, _, data in RawLog.read_records(path)]
+    assert lines[-1] == b"line 199"
+    assert lines == [b"line %03d" % i for i in range(200 - len(lines), 200)]
+
+    # A reopened ring goes on where it stopped
+    log = RawLog.RawLog(path, capacity=1 << 20)
+    assert log.capacity == 1024
+    log.append(b"line 200")
+    log.close()
+    lines = [data for _, _, _, data in RawLog.read_records(path)]
+    assert lines[-1] == b"line 200"
+    assert lines[-2] == b"line 199"
+
+
+def test_read_stops_at_a_record_with_a_bad_checksum(tmp_path):
+    path = str(tmp_path / "Outdoor.ring")
+    log = RawLog.RawLog(path, capacity=4096)
+    for i in range(3):
+        log.append(b"line %d" % i)
+    log.close()
+
+    # Corrupt the payload of the second record
+    offset = RawLog.HEADER_SIZE + RawLog.aligned(RawLog.RECORD.size + 6)
+    with open(path, "r+b") as f:
+        f.seek(offset + RawLog.RECORD.size)
+        f.write(b"X")
+    lines = [data for _, _, _, data in RawLog.read_records(path)]
+    assert lines == [b"line 0"]
+
+
+POLLED = {
+    "cpc_name": "3025",
+    "cpc_header": ["cpc name", "datetime", "concentration", "flow", "saturator"],
+    "serial_commands": ["RD", "R1", "R2"],
+    "serial_timeout": 1.0,
+}
+
+
+def write_capture(path, events):
+    log = RawLog.RawLog(path, capacity=1 << 16)
+    for at, kind, data in events:
+        log.append(data, kind, monotonic=at, wall=1e9 + at)
+    log.close()
+
+
+def decoded(path):
+    return [record.raw[2:] for record in RawLog.decode(path, POLLED)]
+
+
+def test_decode_pairs_replies_with_their_commands(tmp_path):
+    path = str(tmp_path / "3025.ring")
+    sent, received = RawLog.SENT, RawLog.RECEIVED
+    write_capture(
+        path,
+        [
+            # R1 gets no reply, R2 is sent once it timed out
+            (0.0, sent, b"RD\r"),
+            (0.1, received, b"100"),
+            (0.2, sent, b"R1\r"),
+            (1.3, sent, b"R2\r"),
+            (1.4, received, b"39.0"),
+            # The late R1 reply, captured when the next cycle discarded it
+            (2.0, received, b"37.0"),
+            (2.0, sent, b"RD\r"),
+            (2.1, received, b"200"),
+            (2.2, sent, b"R1\r"),
+            (2.3, received, b"37.1"),
+            (2.4, sent, b"R2\r"),
+            (2.5, received, b"39.1"),
+        ],
+    )
+    assert decoded(path) == [["100", "", "39.0"], ["200", "37.1", "39.1"]]
+
+
+def test_decode_drops_a_misaligned_pipelined_batch(tmp_path):
+    path = str(tmp_path / "3025.ring")
+    sent, received = RawLog.SENT, RawLog.RECEIVED
+    write_capture(
+        path,
+        [
+            # One reply of the batch is missing, the poller polls again
+            (0.0, sent, b"RD\rR1\rR2\r"),
+            (0.1, received, b"300"),
+            (0.2, received, b"39.2"),
+            (1.3, sent, b"RD\r"),
+            (1.4, received, b"301"),
+            (1.5, sent, b"R1\r"),
+            (1.6, received, b"37.3"),
+            (1.7, sent, b"R2\r"),
+            (1.8, received, b"39.3"),
+        ],
+    )
+    assert decoded(path) == [["301", "37.3", "39.3"]]
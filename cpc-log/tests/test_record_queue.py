@@ -0,0 +1,65 @@
+import threading
+
+import pytest
+
+from cpcfnc.RecordQueue import RecordQueue, make_queue
+
+
+def test_block_drops_after_timeout():
+    records = RecordQueue(maxsize=2, policy="block", block_timeout=0.01)
+    for i in range(3):
+        records.put(i)
+    assert records.drain() == [0, 1]
+    assert records.stats()["puts"] == 2
+    assert records.stats()["dropped"] == 1
+    assert records.stats()["max_depth"] == 2
+
+
+def test_block_waits_for_space():
+    records = RecordQueue(maxsize=1, policy="block", block_timeout=5.0)
+    records.put(0)
+    threading.Timer(0.05, records.get).start()
+    records.put(1)
+    assert records.drain() == [1]
+    assert records.stats()["dropped"] == 0
+
+
+def test_drop_oldest_keeps_newest():
+    records = RecordQueue(maxsize=3, policy="drop_oldest")
+    for i in range(5):
+        records.put(i, block=False)
+    assert records.drain() == [2, 3, 4]
+    stats = records.stats()
+    assert (stats["puts"], stats["dropped"], stats["max_depth"]) == (5, 2, 3)
+
+
+def test_latest_coalesces_to_newest():
+    records = RecordQueue(maxsize=10, policy="latest")
+    for i in range(4):
+        records.put(i, block=False)
+    assert records.depth() == 1
+    assert records.get_nowait() == 3
+    assert records.stats()["dropped"] == 3
+
+
+def test_drain_limit_and_consumer_wakeup():
+    records = RecordQueue(policy="drop_oldest")
+    got = []
+    consumer = threading.Thread(target=lambda: got.append(records.get(timeout=5)))
+    consumer.start()
+    records.put("a")
+    consumer.join(5)
+    assert got == ["a"]
+    for i in range(5):
+        records.put(i)
+    assert records.drain(max_items=2) == [0, 1]
+    assert records.drain() == [2, 3, 4]
+    assert records.drain() == []
+
+
+def test_make_queue_and_unknown_policy():
+    records = make_queue({"queue_size": 4, "queue_policy": "latest"})
+    assert (records.maxsize, records.policy) == (4, "latest")
+    assert make_queue({}).stats()["maxsize"] == 0
+    with pytest.raises(ValueError):
+        RecordQueue(policy="newest")
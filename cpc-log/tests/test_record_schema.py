@@ -0,0 +1,63 @@
+from datetime import datetime
+import math
+
+import numpy as np
+
+from cpcfnc.RecordSchema import RecordSchema
+
+STAMP = datetime(2024, 5, 1, 12, 0, 0)
+HEADER = [
+    "cpc name",
+    "datetime",
+    "concentration",
+    "flow",
+    "ready environment",
+    "1 second counts",
+]
+
+
+def make_schema(**config):
+    return RecordSchema(dict({"cpc_name": "3025", "cpc_header": HEADER}, **config))
+
+
+def test_parse_types_fields():
+    record = make_schema().parse(["15650", "0.50", "READY", "299"], STAMP)
+    assert record["concentration"] == 15650.0
+    assert record["ready environment"] == "READY"
+    assert record["datetime"] == STAMP
+    assert record.keys() == HEADER
+
+
+def test_missing_and_bad_fields():
+    record = make_schema().parse(["abc"], STAMP)
+    assert math.isnan(record["concentration"])
+    assert math.isnan(record["flow"])
+    assert record["ready environment"] == ""
+
+
+def test_csv_keeps_instrument_text():
+    record = make_schema().parse(["15650", "0.50", "READY", "299"], STAMP)
+    assert record.csv_values() == ["3025", STAMP, "15650", "0.50", "READY", "299"]
+
+
+def test_csv_missing_fields_are_empty():
+    record = make_schema().parse(["", "0.50"], STAMP)
+    assert record.csv_values() == ["3025", STAMP, "", "0.50", "", ""]
+
+
+def test_computed_concentration_has_two_decimals():
+    schema = make_schema(default_flow=False, cpc_flowrate=0.7833)
+    record = schema.parse(["0", "0.50", "READY", "15650"], STAMP)
+    assert record["concentration"] == 15650 / 0.7833
+    assert record.csv_values()[2] == "19979.57"
+    assert schema.parse(["0", "0.50", "READY", ""], STAMP).csv_values()[2] == ""
+
+
+def test_csv_without_source_text():
+    schema = make_schema()
+    record = schema.parse(["15650", "0.5", "READY", ""], STAMP)
+    array = np.zeros(1, dtype=schema.numpy_dtype())
+    schema.fill_row(array, 0, record)
+    copy = schema.from_row(array[0])
+    assert copy.raw is None
+    assert copy.csv_values() == ["3025", STAMP, "15650", "0.5", "READY", ""]
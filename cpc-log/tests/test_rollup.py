@@ -0,0 +1,109 @@
+from datetime import datetime
+import math
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+from cpcfnc import Rollup
+from cpcfnc.Rollup import Bucket, RollupLogger, read_rollups
+
+CONFIG = {
+    "cpc_name": "Outdoor",
+    "cpc_header": ["cpc name", "datetime", "concentration", "flags"],
+}
+
+
+def test_merged_buckets_match_one_pass():
+    values = [random.uniform(0, 1e4) for _ in range(100)]
+    whole = Bucket(0, 1)
+    parts = [Bucket(0, 1) for _ in range(3)]
+    for i, value in enumerate(values):
+        whole.add([value], False)
+        parts[i % 3].add([value], i % 7 == 0)
+    merged = Bucket(0, 1)
+    for part in parts:
+        merged.merge(part)
+
+    assert merged.records == 100
+    assert merged.flagged == 15
+    assert merged.count == [100]
+    assert math.isclose(merged.mean[0], statistics.fmean(values))
+    assert math.isclose(merged.std(0), statistics.stdev(values))
+    assert math.isclose(whole.std(0), merged.std(0))
+    assert (merged.min[0], merged.max[0]) == (min(values), max(values))
+
+
+def test_missing_values_are_not_counted():
+    bucket = Bucket(0, 2)
+    bucket.add([1.0, math.nan], False)
+    bucket.add([3.0, None], False)
+    row = bucket.row(datetime(2024, 5, 1))
+    assert row[1:8] == [2, 0, 2, 2.0, 1.0, 3.0, math.sqrt(2)]
+    assert row[8] == 0 and all(math.isnan(v) for v in row[9:])
+
+
+def test_rollups_close_into_the_coarser_resolution(tmp_path):
+    logger = RollupLogger([CONFIG], str(tmp_path), resolutions=(60, 3600))
+    schema = logger.schemas[0]
+    records = [
+        schema.parse([str(value), "0000"], datetime(2024, 5, 1, 10, minute, second))
+        for minute, second, value in [(0, 0, 1), (0, 30, 3), (1, 0, 5), (59, 59, 7)]
+    ]
+    records.append(schema.parse(["9", "0001"], datetime(2024, 5, 1, 11, 0, 0)))
+    logger.add(0, records)
+
+    # Everything is over and the CPC has gone quiet
+    logger.advance(datetime(2024, 5, 2).timestamp(), time.monotonic() + 10)
+    logger.write_pending()
+
+    names, rows = read_rollups(
+        str(tmp_path), "Outdoor", 60, datetime(2024, 5, 1), datetime(2024, 5, 2)
+    )
+    assert names == ["start", "records", "flagged"] + [
+        f"concentration_{stat}" for stat in Rollup.STATS
+    ]
+    assert [(row[0].minute, row[1], float(row[4])) for row in rows] == [
+        (0, 2, 2.0),
+        (1, 1, 5.0),
+        (59, 1, 7.0),
+        (0, 1, 9.0),
+    ]
+
+    _, hours = read_rollups(
+        str(tmp_path), "Outdoor", 3600, datetime(2024, 5, 1), datetime(2024, 5, 2)
+    )
+    assert [(row[0].hour, row[1], row[2], float(row[4])) for row in hours] == [
+        (10, 4, 0, 4.0),
+        (11, 1, 1, 9.0),
+    ]
+
+
+def test_rows_written_by_two_runs_are_merged(tmp_path):
+    for values in (["2"], ["4"]):
+        logger = RollupLogger([CONFIG], str(tmp_path), resolutions=(60,))
+        schema = logger.schemas[0]
+        logger.add(0, [schema.parse([values[0], "0"], datetime(2024, 5, 1, 10, 0, 1))])
+        logger.close_bucket(0, 0)
+        logger.write_pending()
+
+    _, rows = read_rollups(
+        str(tmp_path), "Outdoor", 60, datetime(2024, 5, 1), datetime(2024, 5, 2)
+    )
+    assert len(rows) == 1
+    assert rows[0][1] == 2
+    assert float(rows[0][4]) == 3.0
+
+
+def test_rollups_do_not_load_pyarrow():
+    code = "import sys, cpcfnc.Rollup; print('pyarrow' in sys.modules)"
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip() == "False"
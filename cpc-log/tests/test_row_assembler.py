@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+import math
+
+from cpcfnc.RowAssembler import RowAssembler
+
+START = datetime(2024, 5, 1, 12, 0, 0)
+T0 = START.timestamp()
+
+
+class FakeRecord(dict):
+    def __init__(self, seconds, value):
+        super().__init__(datetime=START + timedelta(seconds=seconds))
+        self.value = value
+
+    def csv_values(self):
+        return [self.value]
+
+
+def row_values(rows):
+    return [["nan" if math.isnan(v) else v for v in row] for row in rows]
+
+
+def test_bins_wait_for_lateness():
+    rows = RowAssembler([["a"], ["b"]], bin_width=1.0, lateness=1.0)
+    rows.add(0, [FakeRecord(0.2, 1)])
+    rows.add(1, [FakeRecord(0.7, 2)])
+    assert rows.emit(T0 + 1.5) == []
+    assert rows.emit(T0 + 2.0) == [[1, 2]]
+    assert rows.stats()["pending_bins"] == 0
+
+
+def test_lagging_cpc_leaves_gaps_in_its_columns():
+    rows = RowAssembler([["a"], ["b", "c"]])
+    rows.add(0, [FakeRecord(0.1, 1)])
+    assert row_values(rows.emit(T0 + 5)) == [[1, "nan", "nan"]]
+    assert rows.stats()["padded"] == 1
+
+
+def test_several_records_in_a_bin_are_merged():
+    rows = RowAssembler([["a"], ["b"]])
+    rows.add(0, [FakeRecord(0.1, 1), FakeRecord(0.6, 2)])
+    rows.add(1, [FakeRecord(0.5, 9)])
+    assert row_values(rows.emit_all()) == [[1, 9], [2, "nan"]]
+    stats = rows.stats()
+    assert (stats["merged"], stats["max_merged_per_bin"], stats["rows"]) == (1, 1, 2)
+
+
+def test_late_records_come_back_in_their_own_rows():
+    rows = RowAssembler([["a"], ["b"]])
+    rows.add(0, [FakeRecord(2.1, 1)])
+    assert row_values(rows.emit(T0 + 4)) == [[1, "nan"]]
+    late = rows.add(1, [FakeRecord(2.5, 7), FakeRecord(3.2, 8)])
+    assert row_values(late) == [["nan", 7]]
+    assert rows.stats()["late"] == 1
+    assert row_values(rows.emit_all()) == [["nan", 8]]
+
+
+def test_bins_come_out_in_time_order():
+    rows = RowAssembler([["a"]], bin_width=0.5, lateness=0.0)
+    rows.add(0, [FakeRecord(t, t) for t in (1.2, 0.1, 0.7)])
+    assert rows.emit(T0 + 10) == [[0.1], [0.7], [1.2]]
+
+
+def test_emitted_records_when_tracking():
+    rows = RowAssembler([["a"]], track=True)
+    records = [FakeRecord(0.1, 1), FakeRecord(1.1, 2)]
+    rows.add(0, records)
+    rows.emit_all()
+    assert rows.emitted_records() == records
+    assert rows.emitted_records() == []
@@ -0,0 +1,18 @@
+from cpcfnc.SampleClock import SampleClock
+
+
+def test_streaming_arrivals_are_timed_against_the_grid(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("cpcfnc.SampleClock.time.monotonic", lambda: now[0])
+    monkeypatch.setattr("cpcfnc.SampleClock.time.time", lambda: 5000.0)
+    clock = SampleClock(1.0)
+
+    # One record per second, 0.2 s after the tick, then one missed second
+    for at in (0.2, 1.2, 2.25, 4.2):
+        now[0] = 1000.0 + at
+        clock.arrived("Outdoor")
+    stats = clock.stats("Outdoor")["Outdoor"]
+    assert stats["ticks"] == 4
+    assert stats["skipped"] == 1
+    assert abs(stats["lateness"]["max"] - 0.25) < 1e-9
+    assert abs(stats["jitter"]["max"] - 0.05) < 1e-9
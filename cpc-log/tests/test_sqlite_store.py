@@ -0,0 +1,87 @@
+from datetime import datetime
+
+from cpcfnc import SQLiteStore
+from cpcfnc.RecordSchema import RecordSchema
+
+HEADER = ["cpc name", "datetime", "concentration"]
+DAY = (datetime(2024, 5, 1), datetime(2024, 5, 2))
+
+
+def config(name):
+    return {"cpc_name": name, "cpc_header": HEADER}
+
+
+def records(name, values):
+    schema = RecordSchema(config(name))
+    return [
+        schema.parse([str(value)], datetime(2024, 5, 1, 0, 0, i))
+        for i, value in enumerate(values)
+    ]
+
+
+def concentrations(path, name):
+    _, rows = SQLiteStore.query(path, name, *DAY, columns=["concentration"])
+    return [row[1] for row in rows]
+
+
+def test_names_with_the_same_table_name_get_their_own_tables(tmp_path):
+    path = str(tmp_path / "store.db")
+    store = SQLiteStore.SQLiteStore([config("CPC-1"), config("CPC 1")], path)
+    store.setup()
+    store.add(0, records("CPC-1", [1, 2]))
+    store.add(1, records("CPC 1", [3]))
+    store.flush()
+    store.finish()
+    assert concentrations(path, "CPC-1") == [1.0, 2.0]
+    assert concentrations(path, "CPC 1") == [3.0]
+
+    # A later run keeps each CPC on its registered table
+    store = SQLiteStore.SQLiteStore([config("CPC 1")], path)
+    store.setup()
+    store.add(0, records("CPC 1", [4]))
+    store.flush()
+    store.finish()
+    assert concentrations(path, "CPC-1") == [1.0, 2.0]
+    assert concentrations(path, "CPC 1") == [3.0, 4.0]
+
+
+def test_store_that_cannot_open_drops_records(tmp_path):
+    path = str(tmp_path / "missing" / "store.db")
+    store = SQLiteStore.SQLiteStore([config("Outdoor")], path)
+    store.start()
+    store.thread.join(5)
+    assert not store.thread.is_alive()
+    assert store.down
+    assert store.errors == 1
+
+    store.write_records(0, records("Outdoor", [1, 2]))
+    store.close(5)
+    assert store.stats()["dropped"] == 2
+
+
+def test_rows_that_can_never_be_written_are_dropped(tmp_path):
+    path = str(tmp_path / "store.db")
+    store = SQLiteStore.SQLiteStore([config("Good"), config("Bad")], path)
+    store.setup()
+    bad = records("Bad", [1])
+    bad[0]["concentration"] = [1.0]
+    store.add(0, records("Good", [5]))
+    store.add(1, bad)
+
+    for _ in range(store.max_attempts - 1):
+        store.flush()
+        assert store.stats()["pending"] == 2
+    store.flush()
+    store.finish()
+    stats = store.stats()
+    assert (stats["pending"], stats["dropped"], stats["rows"]) == (0, 1, 1)
+    assert concentrations(path, "Good") == [5.0]
+
+
+def test_pending_records_are_capped(tmp_path):
+    store = SQLiteStore.SQLiteStore([config("Outdoor")], str(tmp_path / "s.db"))
+    store.max_pending = 3
+    store.add(0, records("Outdoor", [1, 2]))
+    store.add(0, records("Outdoor", [3, 4]))
+    assert [r["concentration"] for r in store.pending[0]] == [2.0, 3.0, 4.0]
+    assert store.dropped == 1